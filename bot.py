@@ -5,15 +5,27 @@ Corrige problemas de loop de eventos e garante estabilidade
 """
 
 import os
+import re
 import sys
+import time
+import asyncio
+import math
 import logging
-from datetime import datetime, timedelta
-import pytz
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
-from telegram import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
+import functools
+from collections import ChainMap, Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from operator import attrgetter
+from zoneinfo import ZoneInfo
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
+from telegram import CallbackQuery, Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.error import BadRequest, TelegramError
+from telegram.request import HTTPXRequest
+from asyncpg import InterfaceError, PostgresError
 
 # Configurar timezone brasileiro
-TIMEZONE_BR = pytz.timezone('America/Sao_Paulo')
+TIMEZONE_BR = ZoneInfo('America/Sao_Paulo')
 
 
 def agora_br():
@@ -21,40 +33,75 @@ def agora_br():
     return datetime.now(TIMEZONE_BR)
 
 
+def hoje_br():
+    """Retorna o horário atual de Brasília sem tzinfo, como as datas do banco"""
+    return datetime.now(TIMEZONE_BR).replace(tzinfo=None)
+
+
 def converter_para_br(dt):
     """Converte datetime para timezone brasileiro"""
     if dt.tzinfo is None:
         # Se não tem timezone, assume UTC
-        dt = pytz.utc.localize(dt)
+        dt = dt.replace(tzinfo=timezone.utc)
     return dt.astimezone(TIMEZONE_BR)
 
 
+@functools.lru_cache(maxsize=4096)
+def _parse_ymd(data_str):
+    """Converte 'AAAA-MM-DD' em datetime (cacheado, datas se repetem muito)"""
+    # fromisoformat é feito em C e evita reinterpretar o formato do strptime
+    return datetime.fromisoformat(data_str)
+
+
+def _validar_ymd(data_str):
+    """Valida data digitada pelo usuário no formato estrito 'AAAA-MM-DD'"""
+    # fromisoformat aceitaria também '20250315', semanas ISO e fuso horário
+    return datetime.strptime(data_str, '%Y-%m-%d')
+
+
 def formatar_data_br(dt):
     """Formata data/hora no padrão brasileiro"""
     if isinstance(dt, str):
-        dt = datetime.strptime(dt, '%Y-%m-%d')
+        dt = _parse_ymd(dt)
     return dt.strftime('%d/%m/%Y')
 
 
 def formatar_datetime_br(dt):
     """Formata data/hora completa no padrão brasileiro"""
     if dt.tzinfo is None:
-        dt = TIMEZONE_BR.localize(dt)
+        dt = dt.replace(tzinfo=TIMEZONE_BR)
     return dt.strftime('%d/%m/%Y às %H:%M')
 
 
+# Tabela de escape HTML aplicada em uma única passada com str.translate
+_HTML_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;'
+})
+
+
 def escapar_html(text):
     """Escapa caracteres especiais para HTML do Telegram"""
     if text is None:
         return ""
-    text = str(text)
-    # Escapar caracteres especiais do HTML
-    text = text.replace('&', '&amp;')
-    text = text.replace('<', '&lt;')
-    text = text.replace('>', '&gt;')
-    text = text.replace('"', '&quot;')
-    text = text.replace("'", '&#x27;')
-    return text
+    return str(text).translate(_HTML_ESCAPE_TABLE)
+
+
+_MD_ESPECIAIS = re.compile(r'([_*`\[])')
+
+
+def _md(text):
+    """Escapa texto do usuário para o Markdown legado do Telegram"""
+    return _MD_ESPECIAIS.sub(r'\\\1', str(text))
+
+
+# Markdown legado do Telegram: cada *, _ ou ` abre uma entidade que vai até o
+# próximo marcador igual. O texto só é aceito se todas as entidades fecham.
+_markdown_balanceado = re.compile(r'(?:[^*_`]|\*[^*]*\*|_[^_]*_|`[^`]*`)*').fullmatch
+_SEM_MARKDOWN = str.maketrans('', '', '*_`')
 
 
 # Configurar logging
@@ -63,6 +110,254 @@ logging.basicConfig(
     level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=1)
+def get_db():
+    """Retorna a instância única do DatabaseManager, criada no primeiro uso"""
+    # Import adiado: falha no banco cai no aviso "⚠️ Database" do main()
+    from database import DatabaseManager
+    return DatabaseManager()
+
+
+# Erros esperados nos callbacks de cliente (Telegram, timeout de envio e
+# falhas do banco/conexão); o que não estiver aqui sobe para o error_handler
+_ERROS_CALLBACK = (TelegramError, asyncio.TimeoutError, PostgresError,
+                   InterfaceError, OSError)
+
+_WS = None
+_WS_LOCK = asyncio.Lock()
+
+
+async def get_ws():
+    """Retorna o WhatsAppHybridService único, iniciado no primeiro uso"""
+    global _WS
+    if _WS is None:
+        async with _WS_LOCK:
+            if _WS is None:
+                from whatsapp_hybrid_service import WhatsAppHybridService
+                ws = WhatsAppHybridService()
+                # Abre a sessão HTTP persistente quando o serviço a oferece
+                start = getattr(ws, 'start', None)
+                if start is not None:
+                    await start()
+                _WS = ws
+    return _WS
+
+
+async def _enviar_whatsapp(telefone, mensagem):
+    """Envia uma mensagem pelo WhatsApp, com timeout e limite de envios
+    simultâneos (a espera na fila não conta no timeout)"""
+    async with _SEMAFORO_WHATSAPP:
+        ws = await get_ws()
+        return await asyncio.wait_for(ws.enviar_mensagem(telefone, mensagem),
+                                      timeout=_TIMEOUT_WHATSAPP)
+
+
+# Thread única para as chamadas síncronas ao banco, fora do event loop: o
+# DatabaseManager é compartilhado e não é seguro entre threads
+_DB_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+
+
+async def db_call(func, *args, **kwargs):
+    """Executa uma chamada síncrona ao banco no pool de threads do banco"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _DB_POOL, functools.partial(func, *args, **kwargs))
+
+
+class LogBuffer:
+    """Fila dos logs de mensagens, gravados em segundo plano fora dos
+    callbacks (um lote por ida à thread do banco)"""
+
+    def __init__(self, intervalo, maximo):
+        self.intervalo = intervalo
+        self.maximo = maximo
+        self._fila = asyncio.Queue()
+        self._tarefa = None
+
+    def iniciar(self):
+        """Sobe a tarefa que grava os lotes (se ainda não estiver rodando)"""
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._flush_loop())
+
+    def put_nowait(self, **linha):
+        """Enfileira um log; a gravação acontece no próximo lote"""
+        self._fila.put_nowait(linha)
+        self.iniciar()
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            linhas = [await self._fila.get()]
+            prazo = loop.time() + self.intervalo
+            try:
+                while len(linhas) < self.maximo:
+                    restante = prazo - loop.time()
+                    if restante <= 0:
+                        break
+                    try:
+                        linhas.append(await asyncio.wait_for(
+                            self._fila.get(), restante))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Encerrando: não perder o lote que estava sendo montado
+                await self._gravar(linhas)
+                raise
+            await self._gravar(linhas)
+
+    async def flush(self):
+        """Para a tarefa de lotes e grava imediatamente o que estiver na fila"""
+        if self._tarefa is not None and not self._tarefa.done():
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+        linhas = []
+        while not self._fila.empty():
+            linhas.append(self._fila.get_nowait())
+        if linhas:
+            await self._gravar(linhas)
+
+    async def _gravar(self, linhas):
+        try:
+            await db_call(_gravar_logs_mensagem, linhas)
+        except Exception as e:
+            logger.warning(f"Erro ao salvar {len(linhas)} logs: {e}")
+
+
+def _gravar_logs_mensagem(linhas):
+    """Grava um lote de logs, linha a linha, numa única ida à thread do banco"""
+    db = get_db()
+    for linha in linhas:
+        db.registrar_log_mensagem(**linha)
+
+
+def _env_num(nome, padrao, tipo=float):
+    """Lê um número positivo do ambiente, caindo no padrão se inválido"""
+    try:
+        valor = tipo(os.getenv(nome, padrao))
+    except ValueError:
+        return padrao
+    return valor if math.isfinite(valor) and valor > 0 else padrao
+
+
+# Tempo máximo de espera por um envio no WhatsApp (WHATSAPP_TIMEOUT, em s)
+_TIMEOUT_WHATSAPP = _env_num('WHATSAPP_TIMEOUT', 15.0)
+
+# Máximo de envios simultâneos ao WhatsApp (WHATSAPP_CONCORRENCIA)
+_SEMAFORO_WHATSAPP = asyncio.Semaphore(
+    _env_num('WHATSAPP_CONCORRENCIA', 5, int))
+
+# Logs de envio agrupados a cada LOG_BATCH_INTERVAL s ou LOG_BATCH_MAX linhas
+_LOG_BUFFER = LogBuffer(intervalo=_env_num('LOG_BATCH_INTERVAL', 3.0),
+                        maximo=_env_num('LOG_BATCH_MAX', 50, int))
+
+# Cache curto das listas de clientes e templates (apenas_ativos ->
+# (expira_em, lista, índice por id)), para que os callbacks sobre o mesmo
+# registro não reconsultem o banco a cada clique
+_CACHE_TTL = 30
+_clientes_cache = {}
+_templates_cache = {}
+_configuracoes_cache = {}
+
+
+def _ler_cache(cache, apenas_ativos, carregar):
+    """Retorna a entrada do cache, recarregando do banco se expirada"""
+    agora = time.monotonic()
+    entrada = cache.get(apenas_ativos)
+    if entrada is None or entrada[0] <= agora:
+        itens = carregar(apenas_ativos=apenas_ativos)
+        entrada = (agora + _CACHE_TTL, itens, {i['id']: i for i in itens})
+        cache[apenas_ativos] = entrada
+    return entrada
+
+
+def _carregar_clientes(apenas_ativos):
+    """Consulta os clientes já convertendo o vencimento em date uma única vez
+
+    A lista fica ordenada por vencimento (datas inválidas no fim), então quem
+    lê do cache não precisa reordenar a cada clique.
+    """
+    clientes = get_db().listar_clientes(apenas_ativos=apenas_ativos)
+    for cliente in clientes:
+        try:
+            cliente['vencimento_obj'] = _parse_ymd(cliente['vencimento']).date()
+        except (ValueError, KeyError, TypeError):
+            cliente['vencimento_obj'] = None
+    clientes.sort(key=lambda c: (c['vencimento_obj'] is None,
+                                 c['vencimento_obj'] or date.min))
+    return clientes
+
+
+def listar_clientes_cache(apenas_ativos=True):
+    """Lista clientes reaproveitando a consulta por alguns segundos"""
+    return _ler_cache(_clientes_cache, apenas_ativos, _carregar_clientes)[1]
+
+
+def obter_cliente(cliente_id, apenas_ativos=False):
+    """Busca um cliente pelo id usando o cache de clientes"""
+    return _ler_cache(_clientes_cache, apenas_ativos,
+                      _carregar_clientes)[2].get(cliente_id)
+
+
+def invalidar_cache_clientes():
+    """Descarta o cache de clientes após cadastro, edição ou exclusão"""
+    _clientes_cache.clear()
+
+
+def listar_templates_cache(apenas_ativos=True):
+    """Lista templates reaproveitando a consulta por alguns segundos"""
+    return _ler_cache(_templates_cache, apenas_ativos,
+                      get_db().listar_templates)[1]
+
+
+def obter_template_cache(template_id, apenas_ativos=False):
+    """Busca um template pelo id usando o cache de templates"""
+    return _ler_cache(_templates_cache, apenas_ativos,
+                      get_db().listar_templates)[2].get(template_id)
+
+
+# apenas_ativos -> (entrada do cache de templates, {nome em minúsculas: template})
+_templates_por_nome = {}
+
+
+def obter_template_por_nome_cache(nome, apenas_ativos=False):
+    """Busca um template pelo nome, sem diferenciar maiúsculas, no cache"""
+    entrada = _ler_cache(_templates_cache, apenas_ativos,
+                         get_db().listar_templates)
+    indice = _templates_por_nome.get(apenas_ativos)
+    # O índice é refeito sempre que o cache de templates recarrega
+    if indice is None or indice[0] is not entrada:
+        # reversed: com nomes repetidos vale o primeiro da lista
+        indice = (entrada, {t['nome'].lower(): t
+                            for t in reversed(entrada[1])})
+        _templates_por_nome[apenas_ativos] = indice
+    return indice[1].get(nome.lower())
+
+
+def invalidar_cache_templates():
+    """Descarta o cache de templates após criação, edição ou exclusão"""
+    _templates_cache.clear()
+    _templates_por_nome.clear()
+
+
+def obter_configuracoes_cache():
+    """Configurações do sistema (empresa, suporte, PIX) com o cache curto"""
+    agora = time.monotonic()
+    entrada = _configuracoes_cache.get(None)
+    if entrada is None or entrada[0] <= agora:
+        entrada = (agora + _CACHE_TTL, get_db().get_configuracoes() or {})
+        _configuracoes_cache[None] = entrada
+    return entrada[1]
+
+
+def invalidar_cache_configuracoes():
+    """Descarta o cache de configurações após uma alteração"""
+    _configuracoes_cache.clear()
+
+
 # Estados da conversação para cadastro de cliente
 NOME, TELEFONE, PACOTE, VALOR, SERVIDOR, VENCIMENTO, CONFIRMAR = range(7)
 
@@ -189,12 +484,25 @@ def criar_teclado_valores():
                                one_time_keyboard=True)
 
 
+# Teclados fixos montados uma única vez na importação
+TECLADO_PRINCIPAL = criar_teclado_principal()
+TECLADO_CANCELAR = criar_teclado_cancelar()
+TECLADO_CONFIRMAR = criar_teclado_confirmar()
+TECLADO_PLANOS = criar_teclado_planos()
+TECLADO_VENCIMENTO = criar_teclado_vencimento()
+TECLADO_VALORES = criar_teclado_valores()
+
+
+# ID do admin lido uma única vez (variáveis de ambiente não mudam em execução)
+ADMIN_ID = int(os.getenv('ADMIN_CHAT_ID', '0'))
+
+
 def verificar_admin(func):
     """Decorator para verificar se é admin"""
 
+    @functools.wraps(func)
     async def wrapper(update, context):
-        admin_id = int(os.getenv('ADMIN_CHAT_ID', '0'))
-        if update.effective_chat.id != admin_id:
+        if update.effective_chat.id != ADMIN_ID:
             await update.message.reply_text(
                 "❌ Acesso negado. Apenas o admin pode usar este bot.")
             return
@@ -203,52 +511,118 @@ def verificar_admin(func):
     return wrapper
 
 
+def tratar_erros(mensagem, reply_markup=None):
+    """Decorator que registra a exceção do handler e avisa o usuário
+
+    Serve tanto para handlers (update, context) quanto para os callbacks que
+    recebem a CallbackQuery, editando a mensagem nesse caso.
+    """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        async def wrapper(alvo, context, *args):
+            try:
+                return await func(alvo, context, *args)
+            except Exception:
+                logger.exception("Erro em %s", func.__name__)
+                if isinstance(alvo, CallbackQuery):
+                    await alvo.edit_message_text(mensagem,
+                                                 reply_markup=reply_markup)
+                else:
+                    await alvo.effective_message.reply_text(
+                        mensagem, reply_markup=reply_markup)
+
+        return wrapper
+
+    return decorator
+
+
+def _contar_clientes_ativos(db):
+    """Conta os clientes ativos"""
+    return len(db.listar_clientes(apenas_ativos=True))
+
+
 @verificar_admin
 async def start(update, context):
     """Comando /start"""
     nome_admin = update.effective_user.first_name
 
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        total_clientes = len(db.listar_clientes(apenas_ativos=True))
+        db = get_db()
+        total_clientes = await db_call(_contar_clientes_ativos, db)
     except:
         total_clientes = 0
 
-    mensagem = f"""🤖 *Bot de Gestão de Clientes*
+    mensagem = f"""🤖 <b>Bot de Gestão de Clientes</b>
 
-Olá *{nome_admin}*! 
+Olá <b>{escapar_html(nome_admin)}</b>! 
 
 ✅ Sistema inicializado com sucesso!
 📊 Total de clientes: {total_clientes}
 
 Use os botões abaixo para navegar:
-👥 *Listar Clientes* - Ver todos os clientes
-➕ *Adicionar Cliente* - Cadastrar novo cliente
-📊 *Relatórios* - Estatísticas do sistema
-🔍 *Buscar Cliente* - Encontrar cliente específico
-⚙️ *Configurações* - Configurar empresa
-❓ *Ajuda* - Ajuda completa
+👥 <b>Listar Clientes</b> - Ver todos os clientes
+➕ <b>Adicionar Cliente</b> - Cadastrar novo cliente
+📊 <b>Relatórios</b> - Estatísticas do sistema
+🔍 <b>Buscar Cliente</b> - Encontrar cliente específico
+⚙️ <b>Configurações</b> - Configurar empresa
+❓ <b>Ajuda</b> - Ajuda completa
 
 🚀 Sistema 100% operacional!"""
 
     await update.message.reply_text(mensagem,
-                                    parse_mode='Markdown',
-                                    reply_markup=criar_teclado_principal())
+                                    parse_mode='HTML',
+                                    reply_markup=TECLADO_PRINCIPAL)
 
 
 # === SISTEMA DE CADASTRO ESCALONÁVEL ===
 
+# Tabelas de limpeza da entrada do usuário (uma passada com str.translate)
+_PHONE_STRIP = str.maketrans('', '', ' -()')
+_PHONE_RE = re.compile(r'^\+?(\d{10,15})$')
+_VALOR_NORMALIZAR = str.maketrans({',': '.', ' ': None})
+
+# Planos predefinidos: botão -> (nome do pacote, dias, aviso de duração)
+_PACOTE_MAP = {
+    "📅 1 mês": ("Plano 1 mês", 30, " (vence em 30 dias)"),
+    "📅 3 meses": ("Plano 3 meses", 90, " (vence em 90 dias)"),
+    "📅 6 meses": ("Plano 6 meses", 180, " (vence em 180 dias)"),
+    "📅 1 ano": ("Plano 1 ano", 365, " (vence em 1 ano)"),
+}
+_DURACAO_PADRAO = (30, " (vencimento padrão: 30 dias)")
+
+# Valores predefinidos: botão -> valor
+_VALOR_MAP = {
+    "💰 R$ 30,00": 30.00,
+    "💰 R$ 35,00": 35.00,
+    "💰 R$ 40,00": 40.00,
+    "💰 R$ 45,00": 45.00,
+    "💰 R$ 50,00": 50.00,
+    "💰 R$ 60,00": 60.00,
+    "💰 R$ 70,00": 70.00,
+    "💰 R$ 90,00": 90.00,
+    "💰 R$ 135,00": 135.00,
+}
+
+
+def _duracao_pacote(pacote):
+    """Retorna (dias, aviso) de um pacote digitado com base nos planos predefinidos"""
+    for nome_plano, dias, duracao_msg in _PACOTE_MAP.values():
+        if nome_plano.removeprefix("Plano ") in pacote:
+            return dias, duracao_msg
+    return _DURACAO_PADRAO
+
 
 @verificar_admin
 async def iniciar_cadastro(update, context):
     """Inicia o processo de cadastro de cliente"""
     await update.message.reply_text(
-        "📝 *Cadastro de Novo Cliente*\n\n"
+        "📝 <b>Cadastro de Novo Cliente</b>\n\n"
         "Vamos cadastrar um cliente passo a passo.\n\n"
-        "**Passo 1/6:** Digite o *nome completo* do cliente:",
-        parse_mode='Markdown',
-        reply_markup=criar_teclado_cancelar())
+        "<b>Passo 1/6:</b> Digite o <b>nome completo</b> do cliente:",
+        parse_mode='HTML',
+        reply_markup=TECLADO_CANCELAR)
     return NOME
 
 
@@ -261,17 +635,20 @@ async def receber_nome(update, context):
     if len(nome) < 2:
         await update.message.reply_text(
             "❌ Nome muito curto. Digite um nome válido:",
-            reply_markup=criar_teclado_cancelar())
+            reply_markup=TECLADO_CANCELAR)
         return NOME
 
     context.user_data['nome'] = nome
 
+    if context.user_data.get('editando'):
+        return await _enviar_resumo_cadastro(update, context)
+
     await update.message.reply_text(
-        f"✅ Nome: *{nome}*\n\n"
-        "**Passo 2/6:** Digite o *telefone* (apenas números):\n\n"
-        "*Exemplo:* 11999999999",
-        parse_mode='Markdown',
-        reply_markup=criar_teclado_cancelar())
+        f"✅ Nome: <b>{escapar_html(nome)}</b>\n\n"
+        "<b>Passo 2/6:</b> Digite o <b>telefone</b> (apenas números):\n\n"
+        "<b>Exemplo:</b> 11999999999",
+        parse_mode='HTML',
+        reply_markup=TECLADO_CANCELAR)
     return TELEFONE
 
 
@@ -280,23 +657,25 @@ async def receber_telefone(update, context):
     if update.message.text == "❌ Cancelar":
         return await cancelar_cadastro(update, context)
 
-    telefone = update.message.text.strip().replace(' ', '').replace(
-        '-', '').replace('(', '').replace(')', '')
-
-    if not telefone.isdigit() or len(telefone) < 10:
+    m = _PHONE_RE.match(update.message.text.strip().translate(_PHONE_STRIP))
+    if not m:
         await update.message.reply_text(
             "❌ Telefone inválido. Digite apenas números (ex: 11999999999):",
-            reply_markup=criar_teclado_cancelar())
+            reply_markup=TECLADO_CANCELAR)
         return TELEFONE
 
+    telefone = m.group(1)
     context.user_data['telefone'] = telefone
 
+    if context.user_data.get('editando'):
+        return await _enviar_resumo_cadastro(update, context)
+
     await update.message.reply_text(
-        f"✅ Telefone: *{telefone}*\n\n"
-        "**Passo 3/6:** Escolha o *plano de duração*:\n\n"
+        f"✅ Telefone: <b>{telefone}</b>\n\n"
+        "<b>Passo 3/6:</b> Escolha o <b>plano de duração</b>:\n\n"
         "Selecione uma das opções ou digite um plano personalizado:",
-        parse_mode='Markdown',
-        reply_markup=criar_teclado_planos())
+        parse_mode='HTML',
+        reply_markup=TECLADO_PLANOS)
     return PACOTE
 
 
@@ -308,20 +687,15 @@ async def receber_pacote(update, context):
     texto = update.message.text.strip()
 
     # Processar botões de planos predefinidos
-    if texto == "📅 1 mês":
-        pacote = "Plano 1 mês"
-    elif texto == "📅 3 meses":
-        pacote = "Plano 3 meses"
-    elif texto == "📅 6 meses":
-        pacote = "Plano 6 meses"
-    elif texto == "📅 1 ano":
-        pacote = "Plano 1 ano"
+    plano = _PACOTE_MAP.get(texto)
+    if plano:
+        pacote, dias, duracao_msg = plano
     elif texto == "✏️ Personalizado":
         await update.message.reply_text(
             "✏️ Digite o nome do seu plano personalizado:\n\n"
-            "*Exemplos:* Netflix Premium, Disney+ 4K, Combo Streaming",
-            parse_mode='Markdown',
-            reply_markup=criar_teclado_cancelar())
+            "<b>Exemplos:</b> Netflix Premium, Disney+ 4K, Combo Streaming",
+            parse_mode='HTML',
+            reply_markup=TECLADO_CANCELAR)
         return PACOTE
     else:
         # Plano personalizado digitado diretamente
@@ -329,40 +703,36 @@ async def receber_pacote(update, context):
         if len(pacote) < 2:
             await update.message.reply_text(
                 "❌ Nome do pacote muito curto. Digite um nome válido:",
-                reply_markup=criar_teclado_planos())
+                reply_markup=TECLADO_PLANOS)
             return PACOTE
+        dias, duracao_msg = _duracao_pacote(pacote)
 
     context.user_data['pacote'] = pacote
 
     # Calcular data de vencimento automática baseada no plano
-    hoje = agora_br().replace(tzinfo=None)
-    duracao_msg = ""
-
-    if "1 mês" in pacote:
-        vencimento_auto = hoje + timedelta(days=30)
-        duracao_msg = " (vence em 30 dias)"
-    elif "3 meses" in pacote:
-        vencimento_auto = hoje + timedelta(days=90)
-        duracao_msg = " (vence em 90 dias)"
-    elif "6 meses" in pacote:
-        vencimento_auto = hoje + timedelta(days=180)
-        duracao_msg = " (vence em 180 dias)"
-    elif "1 ano" in pacote:
-        vencimento_auto = hoje + timedelta(days=365)
-        duracao_msg = " (vence em 1 ano)"
-    else:
-        vencimento_auto = hoje + timedelta(days=30)  # Padrão: 30 dias
-        duracao_msg = " (vencimento padrão: 30 dias)"
+    hoje = hoje_br()
+    vencimento_auto = hoje + timedelta(days=dias)
 
     # Salvar data calculada automaticamente
     context.user_data['vencimento_auto'] = vencimento_auto.strftime('%Y-%m-%d')
 
+    if context.user_data.get('editando'):
+        # Novo pacote muda a duração: oferecer de novo a data automática
+        await update.message.reply_text(
+            f"✅ Pacote: <b>{escapar_html(pacote)}</b>{duracao_msg}\n\n"
+            f"📅 <b>Nova data automática:</b> "
+            f"{vencimento_auto.strftime('%d/%m/%Y')}\n\n"
+            "Deseja usar esta data ou personalizar?",
+            parse_mode='HTML',
+            reply_markup=TECLADO_VENCIMENTO)
+        return VENCIMENTO
+
     await update.message.reply_text(
-        f"✅ Pacote: *{pacote}*{duracao_msg}\n\n"
-        "**Passo 4/6:** Escolha o *valor mensal*:\n\n"
+        f"✅ Pacote: <b>{escapar_html(pacote)}</b>{duracao_msg}\n\n"
+        "<b>Passo 4/6:</b> Escolha o <b>valor mensal</b>:\n\n"
         "Selecione um valor ou digite um personalizado:",
-        parse_mode='Markdown',
-        reply_markup=criar_teclado_valores())
+        parse_mode='HTML',
+        reply_markup=TECLADO_VALORES)
     return VALOR
 
 
@@ -374,53 +744,39 @@ async def receber_valor(update, context):
     texto = update.message.text.strip()
 
     # Processar botões de valores predefinidos
-    if texto == "💰 R$ 30,00":
-        valor = 30.00
-    elif texto == "💰 R$ 35,00":
-        valor = 35.00
-    elif texto == "💰 R$ 40,00":
-        valor = 40.00
-    elif texto == "💰 R$ 45,00":
-        valor = 45.00
-    elif texto == "💰 R$ 50,00":
-        valor = 50.00
-    elif texto == "💰 R$ 60,00":
-        valor = 60.00
-    elif texto == "💰 R$ 70,00":
-        valor = 70.00
-    elif texto == "💰 R$ 90,00":
-        valor = 90.00
-    elif texto == "💰 R$ 135,00":
-        valor = 135.00
-    elif texto == "✏️ Valor personalizado":
-        await update.message.reply_text(
-            "✏️ Digite o valor personalizado:\n\n"
-            "*Exemplos:* 25.90, 85, 149.99",
-            parse_mode='Markdown',
-            reply_markup=criar_teclado_cancelar())
-        return VALOR
-    else:
+    valor = _VALOR_MAP.get(texto)
+    if valor is None:
+        if texto == "✏️ Valor personalizado":
+            await update.message.reply_text(
+                "✏️ Digite o valor personalizado:\n\n"
+                "<b>Exemplos:</b> 25.90, 85, 149.99",
+                parse_mode='HTML',
+                reply_markup=TECLADO_CANCELAR)
+            return VALOR
+
         # Valor personalizado digitado diretamente
         try:
-            valor_str = texto.replace(',', '.').replace('R$',
-                                                        '').replace(' ', '')
+            valor_str = texto.replace('R$', '').translate(_VALOR_NORMALIZAR)
             valor = float(valor_str)
             if valor <= 0:
                 raise ValueError("Valor deve ser positivo")
         except ValueError:
             await update.message.reply_text(
                 "❌ Valor inválido. Digite um número válido (ex: 25.90):",
-                reply_markup=criar_teclado_valores())
+                reply_markup=TECLADO_VALORES)
             return VALOR
 
     context.user_data['valor'] = valor
 
+    if context.user_data.get('editando'):
+        return await _enviar_resumo_cadastro(update, context)
+
     await update.message.reply_text(
-        f"✅ Valor: *R$ {valor:.2f}*\n\n"
-        "**Passo 5/6:** Digite o *servidor*:\n\n"
-        "*Exemplos:* Servidor 1, Premium Server, Fast Play",
-        parse_mode='Markdown',
-        reply_markup=criar_teclado_cancelar())
+        f"✅ Valor: <b>R$ {valor:.2f}</b>\n\n"
+        "<b>Passo 5/6:</b> Digite o <b>servidor</b>:\n\n"
+        "<b>Exemplos:</b> Servidor 1, Premium Server, Fast Play",
+        parse_mode='HTML',
+        reply_markup=TECLADO_CANCELAR)
     return SERVIDOR
 
 
@@ -433,31 +789,33 @@ async def receber_servidor(update, context):
     if len(servidor) < 2:
         await update.message.reply_text(
             "❌ Nome do servidor muito curto. Digite um nome válido:",
-            reply_markup=criar_teclado_cancelar())
+            reply_markup=TECLADO_CANCELAR)
         return SERVIDOR
 
     context.user_data['servidor'] = servidor
 
+    if context.user_data.get('editando'):
+        return await _enviar_resumo_cadastro(update, context)
+
     # Mostrar opção de vencimento automático se disponível
     vencimento_auto = context.user_data.get('vencimento_auto')
     if vencimento_auto:
-        data_formatada = datetime.strptime(vencimento_auto,
-                                           '%Y-%m-%d').strftime('%d/%m/%Y')
+        data_formatada = _parse_ymd(vencimento_auto).strftime('%d/%m/%Y')
         await update.message.reply_text(
-            f"✅ Servidor: *{servidor}*\n\n"
-            f"**Passo 6/6:** *Data de vencimento*\n\n"
-            f"📅 *Data automática calculada:* {data_formatada}\n\n"
+            f"✅ Servidor: <b>{escapar_html(servidor)}</b>\n\n"
+            f"<b>Passo 6/6:</b> <b>Data de vencimento</b>\n\n"
+            f"📅 <b>Data automática calculada:</b> {data_formatada}\n\n"
             "Deseja usar esta data ou personalizar?",
-            parse_mode='Markdown',
-            reply_markup=criar_teclado_vencimento())
+            parse_mode='HTML',
+            reply_markup=TECLADO_VENCIMENTO)
     else:
         await update.message.reply_text(
-            f"✅ Servidor: *{servidor}*\n\n"
-            "**Passo 6/6:** Digite a *data de vencimento*:\n\n"
-            "*Formato:* AAAA-MM-DD\n"
-            "*Exemplo:* 2025-03-15",
-            parse_mode='Markdown',
-            reply_markup=criar_teclado_cancelar())
+            f"✅ Servidor: <b>{escapar_html(servidor)}</b>\n\n"
+            "<b>Passo 6/6:</b> Digite a <b>data de vencimento</b>:\n\n"
+            "<b>Formato:</b> AAAA-MM-DD\n"
+            "<b>Exemplo:</b> 2025-03-15",
+            parse_mode='HTML',
+            reply_markup=TECLADO_CANCELAR)
     return VENCIMENTO
 
 
@@ -474,54 +832,59 @@ async def receber_vencimento(update, context):
         if not data_str:
             await update.message.reply_text(
                 "❌ Erro: data automática não encontrada. Digite manualmente:",
-                reply_markup=criar_teclado_cancelar())
+                reply_markup=TECLADO_CANCELAR)
             return VENCIMENTO
     elif texto == "📅 Data personalizada":
         await update.message.reply_text(
             "📅 Digite a data de vencimento personalizada:\n\n"
-            "*Formato:* AAAA-MM-DD\n"
-            "*Exemplo:* 2025-03-15",
-            parse_mode='Markdown',
-            reply_markup=criar_teclado_cancelar())
+            "<b>Formato:</b> AAAA-MM-DD\n"
+            "<b>Exemplo:</b> 2025-03-15",
+            parse_mode='HTML',
+            reply_markup=TECLADO_CANCELAR)
         return VENCIMENTO
     else:
         # Data digitada manualmente
         data_str = texto
 
         try:
-            data_obj = datetime.strptime(data_str, '%Y-%m-%d')
-            if data_obj < agora_br().replace(tzinfo=None):
+            data_obj = _validar_ymd(data_str)
+            if data_obj < hoje_br():
                 await update.message.reply_text(
                     "❌ Data não pode ser no passado. Digite uma data futura:",
-                    reply_markup=criar_teclado_cancelar())
+                    reply_markup=TECLADO_CANCELAR)
                 return VENCIMENTO
         except ValueError:
             await update.message.reply_text(
                 "❌ Data inválida. Use o formato AAAA-MM-DD (ex: 2025-03-15):",
-                reply_markup=criar_teclado_vencimento())
+                reply_markup=TECLADO_VENCIMENTO)
             return VENCIMENTO
 
     context.user_data['vencimento'] = data_str
-    data_obj = datetime.strptime(data_str, '%Y-%m-%d')
+    return await _enviar_resumo_cadastro(update, context)
+
+
+async def _enviar_resumo_cadastro(update, context):
+    """Mostra o resumo do cadastro para confirmação"""
+    # Após editar um campo volta direto ao resumo, sem refazer os passos
+    context.user_data.pop('editando', None)
 
-    # Mostrar resumo para confirmação
     dados = context.user_data
-    data_formatada = data_obj.strftime('%d/%m/%Y')
+    data_formatada = _parse_ymd(dados['vencimento']).strftime('%d/%m/%Y')
 
-    resumo = f"""📋 *CONFIRMAR CADASTRO*
+    resumo = f"""📋 <b>CONFIRMAR CADASTRO</b>
 
-📝 *Nome:* {dados['nome']}
-📱 *Telefone:* {dados['telefone']}
-📦 *Pacote:* {dados['pacote']}
-💰 *Valor:* R$ {dados['valor']:.2f}
-🖥️ *Servidor:* {dados['servidor']}
-📅 *Vencimento:* {data_formatada}
+📝 <b>Nome:</b> {escapar_html(dados['nome'])}
+📱 <b>Telefone:</b> {escapar_html(dados['telefone'])}
+📦 <b>Pacote:</b> {escapar_html(dados['pacote'])}
+💰 <b>Valor:</b> R$ {dados['valor']:.2f}
+🖥️ <b>Servidor:</b> {escapar_html(dados['servidor'])}
+📅 <b>Vencimento:</b> {data_formatada}
 
 Os dados estão corretos?"""
 
     await update.message.reply_text(resumo,
-                                    parse_mode='Markdown',
-                                    reply_markup=criar_teclado_confirmar())
+                                    parse_mode='HTML',
+                                    reply_markup=TECLADO_CONFIRMAR)
     return CONFIRMAR
 
 
@@ -531,7 +894,7 @@ async def confirmar_cadastro(update, context):
         return await cancelar_cadastro(update, context)
     elif update.message.text == "✏️ Editar":
         await update.message.reply_text(
-            "✏️ *Qual campo deseja editar?*\n\n"
+            "✏️ <b>Qual campo deseja editar?</b>\n\n"
             "Digite o número:\n"
             "1 - Nome\n"
             "2 - Telefone\n"
@@ -539,39 +902,39 @@ async def confirmar_cadastro(update, context):
             "4 - Valor\n"
             "5 - Servidor\n"
             "6 - Vencimento",
-            parse_mode='Markdown',
-            reply_markup=criar_teclado_cancelar())
+            parse_mode='HTML',
+            reply_markup=TECLADO_CANCELAR)
         return CONFIRMAR
     elif update.message.text == "✅ Confirmar":
         # Salvar no banco
         try:
-            from database import DatabaseManager
-            db = DatabaseManager()
+            db = get_db()
             dados = context.user_data
 
-            sucesso = db.adicionar_cliente(dados['nome'], dados['telefone'],
-                                           dados['pacote'], dados['valor'],
-                                           dados['vencimento'],
-                                           dados['servidor'])
+            sucesso = await db_call(db.adicionar_cliente, dados['nome'],
+                                    dados['telefone'], dados['pacote'],
+                                    dados['valor'], dados['vencimento'],
+                                    dados['servidor'])
+            invalidar_cache_clientes()
 
             if sucesso:
-                data_formatada = datetime.strptime(
-                    dados['vencimento'], '%Y-%m-%d').strftime('%d/%m/%Y')
+                data_formatada = _parse_ymd(
+                    dados['vencimento']).strftime('%d/%m/%Y')
                 await update.message.reply_text(
-                    f"✅ *CLIENTE CADASTRADO COM SUCESSO!*\n\n"
-                    f"📝 {dados['nome']}\n"
-                    f"📱 {dados['telefone']}\n"
-                    f"📦 {dados['pacote']}\n"
+                    f"✅ <b>CLIENTE CADASTRADO COM SUCESSO!</b>\n\n"
+                    f"📝 {escapar_html(dados['nome'])}\n"
+                    f"📱 {escapar_html(dados['telefone'])}\n"
+                    f"📦 {escapar_html(dados['pacote'])}\n"
                     f"💰 R$ {dados['valor']:.2f}\n"
-                    f"🖥️ {dados['servidor']}\n"
+                    f"🖥️ {escapar_html(dados['servidor'])}\n"
                     f"📅 {data_formatada}\n\n"
                     "Cliente adicionado ao sistema!",
-                    parse_mode='Markdown',
-                    reply_markup=criar_teclado_principal())
+                    parse_mode='HTML',
+                    reply_markup=TECLADO_PRINCIPAL)
             else:
                 await update.message.reply_text(
                     "❌ Erro ao salvar cliente. Tente novamente.",
-                    reply_markup=criar_teclado_principal())
+                    reply_markup=TECLADO_PRINCIPAL)
 
             # Limpar dados temporários
             context.user_data.clear()
@@ -581,46 +944,48 @@ async def confirmar_cadastro(update, context):
             logger.error(f"Erro ao cadastrar cliente: {e}")
             await update.message.reply_text(
                 "❌ Erro interno. Tente novamente mais tarde.",
-                reply_markup=criar_teclado_principal())
+                reply_markup=TECLADO_PRINCIPAL)
             context.user_data.clear()
             return ConversationHandler.END
 
     # Se chegou aqui, é um número para editar
     try:
         opcao = int(update.message.text)
+        if 1 <= opcao <= 6:
+            context.user_data['editando'] = True
         if opcao == 1:
             await update.message.reply_text(
-                "Digite o novo nome:", reply_markup=criar_teclado_cancelar())
+                "Digite o novo nome:", reply_markup=TECLADO_CANCELAR)
             return NOME
         elif opcao == 2:
             await update.message.reply_text(
                 "Digite o novo telefone:",
-                reply_markup=criar_teclado_cancelar())
+                reply_markup=TECLADO_CANCELAR)
             return TELEFONE
         elif opcao == 3:
             await update.message.reply_text(
-                "Digite o novo pacote:", reply_markup=criar_teclado_cancelar())
+                "Digite o novo pacote:", reply_markup=TECLADO_CANCELAR)
             return PACOTE
         elif opcao == 4:
             await update.message.reply_text(
-                "Digite o novo valor:", reply_markup=criar_teclado_cancelar())
+                "Digite o novo valor:", reply_markup=TECLADO_CANCELAR)
             return VALOR
         elif opcao == 5:
             await update.message.reply_text(
                 "Digite o novo servidor:",
-                reply_markup=criar_teclado_cancelar())
+                reply_markup=TECLADO_CANCELAR)
             return SERVIDOR
         elif opcao == 6:
             await update.message.reply_text(
                 "Digite a nova data (AAAA-MM-DD):",
-                reply_markup=criar_teclado_cancelar())
+                reply_markup=TECLADO_CANCELAR)
             return VENCIMENTO
     except ValueError:
         pass
 
     await update.message.reply_text(
         "❌ Opção inválida. Use os botões ou digite um número de 1 a 6:",
-        reply_markup=criar_teclado_confirmar())
+        reply_markup=TECLADO_CONFIRMAR)
     return CONFIRMAR
 
 
@@ -628,7 +993,7 @@ async def cancelar_cadastro(update, context):
     """Cancela o processo de cadastro"""
     context.user_data.clear()
     await update.message.reply_text("❌ Cadastro cancelado.",
-                                    reply_markup=criar_teclado_principal())
+                                    reply_markup=TECLADO_PRINCIPAL)
     return ConversationHandler.END
 
 
@@ -645,8 +1010,8 @@ async def add_cliente(update, context):
         if len(partes) != 6:
             await update.message.reply_text(
                 "❌ Formato incorreto!\n\n"
-                "Use: `/add Nome | Telefone | Pacote | Valor | Vencimento | Servidor`",
-                parse_mode='Markdown')
+                "Use: <code>/add Nome | Telefone | Pacote | Valor | Vencimento | Servidor</code>",
+                parse_mode='HTML')
             return
 
         nome, telefone, pacote, valor_str, vencimento, servidor = partes
@@ -659,28 +1024,28 @@ async def add_cliente(update, context):
             return
 
         try:
-            datetime.strptime(vencimento, '%Y-%m-%d')
+            _validar_ymd(vencimento)
         except ValueError:
             await update.message.reply_text(
                 "❌ Data deve estar no formato AAAA-MM-DD!")
             return
 
-        from database import DatabaseManager
-        db = DatabaseManager()
+        db = get_db()
 
-        sucesso = db.adicionar_cliente(nome, telefone, pacote, valor,
-                                       vencimento, servidor)
+        sucesso = await db_call(db.adicionar_cliente, nome, telefone,
+                                pacote, valor, vencimento, servidor)
+        invalidar_cache_clientes()
 
         if sucesso:
             await update.message.reply_text(
-                f"✅ *Cliente adicionado com sucesso!*\n\n"
-                f"📝 Nome: {nome}\n"
-                f"📱 Telefone: {telefone}\n"
-                f"📦 Pacote: {pacote}\n"
+                f"✅ <b>Cliente adicionado com sucesso!</b>\n\n"
+                f"📝 Nome: {escapar_html(nome)}\n"
+                f"📱 Telefone: {escapar_html(telefone)}\n"
+                f"📦 Pacote: {escapar_html(pacote)}\n"
                 f"💰 Valor: R$ {valor:.2f}\n"
-                f"📅 Vencimento: {vencimento}\n"
-                f"🖥️ Servidor: {servidor}",
-                parse_mode='Markdown')
+                f"📅 Vencimento: {escapar_html(vencimento)}\n"
+                f"🖥️ Servidor: {escapar_html(servidor)}",
+                parse_mode='HTML')
         else:
             await update.message.reply_text("❌ Erro ao adicionar cliente!")
 
@@ -689,106 +1054,129 @@ async def add_cliente(update, context):
         await update.message.reply_text("❌ Erro interno do sistema!")
 
 
+@dataclass(slots=True)
+class ClienteResumo:
+    """Dados tipados de um cliente usados para montar a lista de botões"""
+    id: int
+    nome: str
+    valor: float
+    vencimento: date
+    dias_restantes: int
+
+
+def _trunc(s, n, _sfx="…"):
+    """Corta o texto em n caracteres, com reticências, para caber no botão"""
+    return s if len(s) <= n else s[:n] + _sfx
+
+
+def _emoji_status(dias_restantes):
+    """Retorna o emoji de status conforme os dias até o vencimento"""
+    if dias_restantes < 0:
+        return "🔴"
+    if dias_restantes == 0:
+        return "⚠️"
+    if dias_restantes <= 3:
+        return "🟡"
+    return "🟢"
+
+
+def _texto_botao_cliente(cliente):
+    """Monta o texto do botão de um ClienteResumo na lista de clientes"""
+    return (f"{_emoji_status(cliente.dias_restantes)} "
+            f"{_trunc(cliente.nome, 18)} - "
+            f"R${cliente.valor:.0f} - {cliente.vencimento:%d/%m}")
+
+
+# Máximo de linhas de botões montadas nas listas de clientes e templates
+_MAX_BOTOES_LISTA = 50
+
+# Botões de ação geral no fim da lista de clientes
+_RODAPE_LISTA_CLIENTES = [
+    InlineKeyboardButton("🔄 Atualizar Lista", callback_data="atualizar_lista"),
+    InlineKeyboardButton("📊 Relatório", callback_data="gerar_relatorio")
+]
+
+
+def _teclado_lista_clientes(clientes_ordenados):
+    """Monta os botões da lista de clientes (limitado a 50) e o rodapé"""
+    keyboard = [[
+        InlineKeyboardButton(_texto_botao_cliente(cliente),
+                             callback_data=_cb("cliente", cliente.id))
+    ] for cliente in clientes_ordenados[:_MAX_BOTOES_LISTA]]
+    keyboard.append(_RODAPE_LISTA_CLIENTES)
+    return InlineKeyboardMarkup(keyboard)
+
+
 @verificar_admin
 async def listar_clientes(update, context):
     """Lista todos os clientes com botões interativos ordenados por vencimento"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(apenas_ativos=True)
+        db = get_db()
+        clientes = await db_call(db.listar_clientes, apenas_ativos=True)
 
         if not clientes:
             await update.message.reply_text(
                 "📋 Nenhum cliente cadastrado ainda.\n\n"
                 "Use ➕ Adicionar Cliente para começar!",
-                reply_markup=criar_teclado_principal())
+                reply_markup=TECLADO_PRINCIPAL)
             return
 
-        # Ordenar clientes por data de vencimento (mais próximo primeiro)
+        # Calcular dias restantes e contar status em uma única passada
+        hoje = agora_br().date()
         clientes_ordenados = []
+        vencidos = vencendo_hoje = vencendo_breve = 0
         for cliente in clientes:
             try:
-                vencimento = datetime.strptime(cliente['vencimento'],
-                                               '%Y-%m-%d')
-                cliente['vencimento_obj'] = vencimento
-                cliente['dias_restantes'] = (
-                    vencimento - agora_br().replace(tzinfo=None)).days
-                clientes_ordenados.append(cliente)
+                vencimento = _parse_ymd(cliente['vencimento']).date()
+                dias_restantes = (vencimento - hoje).days
+                clientes_ordenados.append(
+                    ClienteResumo(cliente['id'], cliente['nome'],
+                                  cliente['valor'], vencimento,
+                                  dias_restantes))
             except (ValueError, KeyError) as e:
                 logger.error(f"Erro ao processar cliente {cliente}: {e}")
                 continue
 
+            if dias_restantes < 0:
+                vencidos += 1
+            elif dias_restantes == 0:
+                vencendo_hoje += 1
+            elif dias_restantes <= 3:
+                vencendo_breve += 1
+
         # Ordenar por data de vencimento (mais próximo primeiro)
-        clientes_ordenados.sort(key=lambda x: x['vencimento_obj'])
+        clientes_ordenados.sort(key=attrgetter('vencimento'))
 
-        # Contar clientes por status para resumo
         total_clientes = len(clientes_ordenados)
-        hoje = agora_br().replace(tzinfo=None)
-        vencidos = len(
-            [c for c in clientes_ordenados if c['dias_restantes'] < 0])
-        vencendo_hoje = len(
-            [c for c in clientes_ordenados if c['dias_restantes'] == 0])
-        vencendo_breve = len(
-            [c for c in clientes_ordenados if 0 < c['dias_restantes'] <= 3])
         ativos = total_clientes - vencidos
 
-        mensagem = f"""👥 *LISTA DE CLIENTES*
+        mensagem = f"""👥 <b>LISTA DE CLIENTES</b>
 
-📊 *Resumo:* {total_clientes} clientes
+📊 <b>Resumo:</b> {total_clientes} clientes
 🔴 {vencidos} vencidos • ⚠️ {vencendo_hoje} hoje • 🟡 {vencendo_breve} em breve • 🟢 {ativos} ativos
 
-💡 *Clique em um cliente para ver detalhes:*"""
-
-        # Criar apenas botões inline para cada cliente
-        keyboard = []
-
-        for cliente in clientes_ordenados[:50]:  # Limitado a 50 botões
-            dias_restantes = cliente['dias_restantes']
-            vencimento = cliente['vencimento_obj']
-
-            # Definir status e emoji
-            if dias_restantes < 0:
-                status_emoji = "🔴"
-            elif dias_restantes == 0:
-                status_emoji = "⚠️"
-            elif dias_restantes <= 3:
-                status_emoji = "🟡"
-            else:
-                status_emoji = "🟢"
-
-            # Texto do botão com informações principais
-            nome_curto = cliente['nome'][:18] + "..." if len(
-                cliente['nome']) > 18 else cliente['nome']
-            botao_texto = f"{status_emoji} {nome_curto} - R${cliente['valor']:.0f} - {vencimento.strftime('%d/%m')}"
-
-            # Criar botão inline para cada cliente
-            keyboard.append([
-                InlineKeyboardButton(botao_texto,
-                                     callback_data=f"cliente_{cliente['id']}")
-            ])
+💡 <b>Clique em um cliente para ver detalhes:</b>"""
 
         # Mostrar aviso se há mais clientes
-        if total_clientes > 50:
-            mensagem += f"\n\n⚠️ *Mostrando primeiros 50 de {total_clientes} clientes*\nUse 🔍 Buscar Cliente para encontrar outros."
-
-        # Adicionar botões de ação geral
-        keyboard.append([
-            InlineKeyboardButton("🔄 Atualizar Lista",
-                                 callback_data="atualizar_lista"),
-            InlineKeyboardButton("📊 Relatório",
-                                 callback_data="gerar_relatorio")
-        ])
+        if total_clientes > _MAX_BOTOES_LISTA:
+            mensagem += f"\n\n⚠️ <b>Mostrando primeiros {_MAX_BOTOES_LISTA} de {total_clientes} clientes</b>\nUse 🔍 Buscar Cliente para encontrar outros."
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # Criar apenas botões inline para cada cliente
+        reply_markup = _teclado_lista_clientes(clientes_ordenados)
 
         await update.message.reply_text(mensagem,
-                                        parse_mode='Markdown',
+                                        parse_mode='HTML',
                                         reply_markup=reply_markup)
 
     except Exception as e:
         logger.error(f"Erro ao listar clientes: {e}")
         await update.message.reply_text("❌ Erro ao listar clientes!",
-                                        reply_markup=criar_teclado_principal())
+                                        reply_markup=TECLADO_PRINCIPAL)
+
+
+def _tail_int(data):
+    """Id numérico no fim do callback_data (ex: "template_testar_5" -> 5)"""
+    return int(data.rpartition("_")[2])
 
 
 async def callback_cliente(update, context):
@@ -798,193 +1186,317 @@ async def callback_cliente(update, context):
 
     data = query.data
 
-    try:
-        if data.startswith("cliente_"):
-            # Mostrar detalhes do cliente específico
-            cliente_id = int(data.split("_")[1])
-            await mostrar_detalhes_cliente(query, context, cliente_id)
-
-        elif data == "atualizar_lista":
-            # Atualizar a lista de clientes
-            await atualizar_lista_clientes(query, context)
-
-        elif data == "gerar_relatorio":
-            # Gerar relatório rápido
-            await gerar_relatorio_inline(query, context)
-
-        elif data == "voltar_lista":
-            # Voltar para a lista de clientes
-            await atualizar_lista_clientes(query, context)
-
-        elif data.startswith("cobrar_"):
-            # Enviar cobrança via WhatsApp
-            cliente_id = int(data.split("_")[1])
-            await enviar_cobranca_cliente(query, context, cliente_id)
-
-        elif data.startswith("mensagem_"):
-            # Mostrar templates disponíveis para envio
-            cliente_id = int(data.split("_")[1])
-            await mostrar_templates_cliente(query, context, cliente_id)
-
-        elif data.startswith("renovar_") and len(
-                data.split("_")) == 3 and data.split("_")[1].isdigit():
-            # Processar renovação por dias (formato: renovar_30_123)
-            partes = data.split("_")
-            dias = int(partes[1])
-            cliente_id = int(partes[2])
-            await processar_renovacao_cliente(query, context, cliente_id, dias)
-
-        elif data.startswith("renovar_"):
-            # Mostrar opções de renovação (formato: renovar_123)
-            cliente_id = int(data.split("_")[1])
-            await renovar_cliente_inline(query, context, cliente_id)
-
-        elif data.startswith("editar_"):
-            # Editar cliente
-            cliente_id = int(data.split("_")[1])
-            await editar_cliente_inline(query, context, cliente_id)
-
-        elif data.startswith("excluir_"):
-            # Excluir cliente
-            cliente_id = int(data.split("_")[1])
-            await excluir_cliente_inline(query, context, cliente_id)
-
-        elif data.startswith("confirmar_excluir_"):
-            # Confirmar exclusão
-            cliente_id = int(data.split("_")[2])
-            await confirmar_exclusao_cliente(query, context, cliente_id)
-
-        elif data.startswith("template_enviar_"):
-            # Enviar template específico para cliente
-            partes = data.split("_")
-            if len(partes) == 4:
-                template_id = int(partes[2])
-                cliente_id = int(partes[3])
-                await enviar_template_cliente(query, context, cliente_id, template_id)
-
-        elif data.startswith("historico_"):
-            # Mostrar histórico de mensagens do cliente
-            cliente_id = int(data.split("_")[1])
-            await mostrar_historico_cliente(query, context, cliente_id)
-
-        elif data.startswith("edit_"):
-            # Processar edição de campos específicos
-            partes = data.split("_")
-            if len(partes) == 3:
-                campo = partes[1]
-                cliente_id = int(partes[2])
-                await iniciar_edicao_campo(query, context, cliente_id, campo)
-
-        # --- TEMPLATE CALLBACKS ADICIONADOS ---
-        # Callbacks dos templates
-        elif data == "templates_listar":
-            from callbacks_templates import callback_templates_listar
-            await callback_templates_listar(query, context)
-        elif data == "template_ver":
-            from callbacks_templates import callback_templates_ver
-            await callback_templates_ver(query, context)
-        elif data == "template_editar_escolher":
-            from callbacks_templates import callback_templates_editar
-            await callback_templates_editar(query, context)
-        elif data == "template_testar_escolher":
-            from callbacks_templates import callback_templates_testar
-            await callback_templates_testar(query, context)
-        elif data == "template_criar":
-            from callbacks_templates import callback_templates_criar
-            await callback_templates_criar(query, context)
-        elif data == "template_excluir_escolher":
-            from callbacks_templates import callback_templates_excluir
-            await callback_templates_excluir(query, context)
-
-        # Callbacks específicos de templates (mostrar, testar, editar, excluir por ID)
-        elif data.startswith("template_mostrar_"):
-            template_id = int(data.split("_")[2])
-            from callbacks_templates import callback_template_mostrar
-            await callback_template_mostrar(query, context, template_id)
-        elif data.startswith("template_testar_"):
-            template_id = int(data.split("_")[2])
-            from callbacks_templates import callback_template_testar
-            await callback_template_testar(query, context, template_id)
-        elif data.startswith("template_editar_"):
-            template_id = int(data.split("_")[2])
-            # Assumindo que existe uma função para editar diretamente
-            from callbacks_templates import callback_template_editar_direto
-            await callback_template_editar_direto(query, context, template_id)
-        elif data.startswith("template_excluir_"):
-            template_id = int(data.split("_")[2])
-            # Assumindo que existe uma função para excluir diretamente
-            from callbacks_templates import callback_template_excluir_direto
-            await callback_template_excluir_direto(query, context, template_id)
-
-        elif data == "voltar_menu":
-            # Voltar ao menu principal do bot
-            await query.edit_message_text(
-                "🤖 *BOT DE GESTÃO DE CLIENTES*\n\n"
-                "Escolha uma opção abaixo:",
-                parse_mode='Markdown',
-                reply_markup=criar_teclado_principal()
-            )
-        elif data == "voltar_templates":
-            # Recarregar a lista de templates
-            from database import DatabaseManager
-            db = DatabaseManager()
-            templates = db.listar_templates(apenas_ativos=True)
+    # Callbacks sem parâmetros (ex: "voltar_lista")
+    handler = _CALLBACKS_EXATOS.get(data)
+    if handler:
+        await handler(query, context)
+        return
 
-            mensagem = f"📄 *SISTEMA DE TEMPLATES*\n\n"
-            mensagem += f"📊 Templates disponíveis: {len(templates)}\n\n"
+    # Separar o prefixo uma única vez (ex: "cobrar_12" -> "cobrar", "12")
+    prefixo, _, resto = data.partition("_")
 
-            keyboard = []
+    handler = _CALLBACKS_CLIENTE.get(prefixo)
+    if handler:
+        # Ações sobre um cliente específico (formato: acao_123); outros
+        # formatos com o mesmo prefixo pertencem a outros handlers
+        if resto.isdigit():
+            await handler(query, context, int(resto))
+        return
 
-            for template in templates:
-                template_id = template['id']
-                nome_display = template['nome'][:20] + ('...' if len(template['nome']) > 20 else '')
+    roteador = _CALLBACKS_PREFIXO.get(prefixo)
+    if roteador:
+        # Callbacks com mais de um parâmetro (ex: renovar_30_123)
+        await roteador(query, context, resto)
 
-                keyboard.append([
-                    InlineKeyboardButton(f"📝 {nome_display}",
-                                       callback_data=f"template_mostrar_{template_id}"),
-                    InlineKeyboardButton("✏️ Editar",
-                                       callback_data=f"template_editar_{template_id}")
-                ])
 
-            keyboard.append([
-                InlineKeyboardButton("➕ Novo Template", callback_data="template_criar"),
-                InlineKeyboardButton("🧪 Testar Template", callback_data="template_testar")
-            ])
-            keyboard.append([
-                InlineKeyboardButton("⬅️ Menu Principal", callback_data="voltar_menu")
-            ])
+async def _callback_renovar(query, context, resto):
+    """renovar_30_123 processa a renovação, renovar_123 mostra opções"""
+    dias, _, cliente_id = resto.partition("_")
+    if cliente_id:
+        await processar_renovacao_cliente(query, context, int(cliente_id),
+                                          int(dias))
+    else:
+        await renovar_cliente_inline(query, context, int(dias))
+
+
+async def _callback_confirmar(query, context, resto):
+    """Confirmar exclusão (formato: confirmar_excluir_123)"""
+    # confirmar_excluir_template_5 é tratado pelo handler de templates
+    cliente_id = resto[len("excluir_"):]
+    if resto.startswith("excluir_") and cliente_id.isdigit():
+        await confirmar_exclusao_cliente(query, context, int(cliente_id))
+
+
+async def _callback_edit(query, context, resto):
+    """Processar edição de campos específicos (formato: edit_campo_123)"""
+    campo, _, cliente_id = resto.partition("_")
+    if cliente_id.isdigit():
+        await iniciar_edicao_campo(query, context, int(cliente_id), campo)
+
+
+@functools.lru_cache(maxsize=1)
+def _modulo_callbacks_templates():
+    """Importa o módulo callbacks_templates uma única vez, no primeiro uso"""
+    # Import adiado: o módulo fica fora deste arquivo e pode importar o bot
+    import callbacks_templates
+    return callbacks_templates
+
+
+@functools.lru_cache(maxsize=1)
+def _callbacks_templates():
+    """Carrega uma única vez os handlers do módulo callbacks_templates"""
+    ct = _modulo_callbacks_templates()
+    return {
+        "templates_listar": ct.callback_templates_listar,
+        "template_ver": ct.callback_templates_ver,
+        "template_editar_escolher": ct.callback_templates_editar,
+        "template_testar_escolher": ct.callback_templates_testar,
+        "template_criar": ct.callback_templates_criar,
+        "template_excluir_escolher": ct.callback_templates_excluir,
+    }
+
+
+async def _callback_template_exato(query, context):
+    """Callbacks de templates sem parâmetros (ex: template_criar)"""
+    await _callbacks_templates()[query.data](query, context)
+
+
+# Ações template_<acao>_<id> -> função do módulo callbacks_templates
+# (resolvida no uso, pois nem todas as versões do módulo têm todas)
+_ACOES_TEMPLATE = {
+    "mostrar": "callback_template_mostrar",
+    "testar": "callback_template_testar",
+    "editar": "callback_template_editar_direto",
+    "excluir": "callback_template_excluir_direto",
+}
+
+
+async def _callback_template(query, context, resto):
+    """Callbacks de templates com ids (ex: template_mostrar_5)"""
+    acao, _, parametros = resto.partition("_")
+    if acao == "enviar":
+        # Enviar template específico para cliente (template_enviar_5_12)
+        template_id, _, cliente_id = parametros.partition("_")
+        if cliente_id:
+            await enviar_template_cliente(query, context, int(cliente_id),
+                                          int(template_id))
+        return
 
-            if not templates:
-                mensagem += "📭 **Nenhum template encontrado**\n\n"
-                mensagem += "Crie seu primeiro template."
+    nome_handler = _ACOES_TEMPLATE.get(acao)
+    if nome_handler and parametros.isdigit():
+        handler = getattr(_modulo_callbacks_templates(), nome_handler)
+        await handler(query, context, int(parametros))
+
+
+# Teclados inline de um botão só, reaproveitados por vários callbacks
+_MARKUP_VOLTAR_LISTA = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Voltar à Lista", callback_data="voltar_lista")
+]])
+_MARKUP_VOLTAR_TEMPLATES = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
+]])
+_MARKUP_VOLTAR_TEMPLATE_VER = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Voltar", callback_data="template_ver")
+]])
+_MARKUP_VER_TEMPLATES = InlineKeyboardMarkup([[
+    InlineKeyboardButton("📋 Ver Templates", callback_data="templates_listar")
+]])
+_MARKUP_MENU_TEMPLATES = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
+]])
+_MARKUP_VOLTAR_MENU_TEMPLATES = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_templates")
+]])
+
+
+@dataclass(slots=True)
+class TelaFixa:
+    """Tela estática de callback (texto e teclado montados uma única vez)"""
+    texto: str
+    parse_mode: str
+    reply_markup: InlineKeyboardMarkup
+    # Texto como o Telegram o devolve após a primeira edição (sem marcação)
+    renderizado: str | None = None
+
+    async def mostrar(self, query):
+        """Edita a mensagem para esta tela, sem chamar a API se ela já estiver
+        sendo exibida"""
+        atual = query.message
+        if (self.renderizado is not None and atual is not None
+                and atual.text == self.renderizado
+                and atual.reply_markup == self.reply_markup):
+            return
+        try:
+            enviada = await query.edit_message_text(
+                self.texto, parse_mode=self.parse_mode,
+                reply_markup=self.reply_markup)
+        except BadRequest as e:
+            # Clique repetido antes de conhecermos o texto renderizado
+            if "not modified" not in str(e):
+                raise
+            return
+        if isinstance(enviada, Message):
+            self.renderizado = enviada.text
 
-            reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await query.edit_message_text(
-                mensagem,
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
+_TELA_EDITAR_TEMPLATES = TelaFixa(
+    """✏️ <b>EDITAR TEMPLATES</b>
 
-    except Exception as e:
-        logger.error(f"Erro no callback: {e}")
-        await query.edit_message_text("❌ Erro ao processar ação!")
+Para editar templates, use os comandos:
+
+<code>/template_editar [ID] [campo] [novo_valor]</code>
+
+<b>Campos disponíveis:</b>
+• <code>titulo</code> - Título do template
+• <code>conteudo</code> - Conteúdo do template
+• <code>tipo</code> - Tipo do template
+• <code>descricao</code> - Descrição do template
+• <code>ativo</code> - true/false para ativar/desativar
+
+<b>Exemplo:</b>
+<code>/template_editar 1 titulo "Novo Título"</code>
+
+Ou use os botões de visualização para editar templates específicos.""",
+    'HTML',
+    InlineKeyboardMarkup([[
+        InlineKeyboardButton("👁️ Ver Templates", callback_data="template_ver"),
+        InlineKeyboardButton("📋 Listar Todos", callback_data="templates_listar")
+    ], [
+        InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
+    ]]))
+
+_TELA_CRIAR_TEMPLATE = TelaFixa(
+    """➕ **CRIAR NOVO TEMPLATE**
+
+Para criar um template, use o comando:
+
+`/template_novo "Nome" tipo "Descrição"`
+
+**Tipos disponíveis:**
+• `boas_vindas` - Mensagem de boas-vindas
+• `aviso_vencimento` - Avisos de vencimento  
+• `renovacao` - Confirmação de renovação
+• `cobranca` - Cobrança de vencidos
+• `sistema` - Templates do sistema
+
+**Exemplo:**
+`/template_novo "Lembrete Vencimento" aviso_vencimento "Template para avisar sobre vencimento"`
+
+**Variáveis disponíveis:**
+• `{nome}` - Nome do cliente
+• `{telefone}` - Telefone do cliente  
+• `{pacote}` - Pacote/plano do cliente
+• `{valor}` - Valor do plano
+• `{servidor}` - Servidor/login
+• `{vencimento}` - Data de vencimento""",
+    'Markdown',
+    InlineKeyboardMarkup([[
+        InlineKeyboardButton("📋 Ver Templates", callback_data="voltar_templates"),
+        InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_templates")
+    ]]))
+
+_TELA_TESTAR_TEMPLATE = TelaFixa(
+    "🧪 *TESTAR TEMPLATE*\n\n"
+    "Para testar um template, use:\n"
+    "`/template_testar nome_template`\n\n"
+    "*Exemplo:*\n"
+    "`/template_testar boas_vindas`\n\n"
+    "O teste será feito com dados de exemplo.",
+    'Markdown', _MARKUP_MENU_TEMPLATES)
+
+_TELA_TESTAR_TEMPLATE_ID = TelaFixa(
+    "🧪 **TESTAR TEMPLATE**\n\n"
+    "Para testar um template, use:\n"
+    "`/template_testar [ID]`\n\n"
+    "**Exemplo:**\n"
+    "`/template_testar 1`\n\n"
+    "O teste será feito com dados de exemplo.",
+    'Markdown', _MARKUP_VOLTAR_MENU_TEMPLATES)
+
+# Textos fixos dos callbacks, montados uma única vez no carregamento
+_MENU_MSG = "🤖 *BOT DE GESTÃO DE CLIENTES*\n\nEscolha uma opção abaixo:"
+
+_TEMPLATES_CABECALHO = ("📄 *SISTEMA DE TEMPLATES*\n\n"
+                        "📊 Templates disponíveis: {total}\n\n")
+_TEMPLATES_VAZIO = ("📭 **Nenhum template encontrado**\n\n"
+                    "Crie seu primeiro template.")
+
+_DETALHES_TMPL = """👤 *DETALHES DO CLIENTE*
+
+📝 *Nome:* {nome}
+📱 *Telefone:* {telefone}
+📦 *Pacote:* {pacote}
+💰 *Valor:* R$ {valor:.2f}
+🖥️ *Servidor:* {servidor}
+📅 *Vencimento:* {vencimento_obj:%d/%m/%Y}
+
+📊 *Status:* {status}"""
+
+
+async def _voltar_menu(query, context):
+    """Voltar ao menu principal do bot"""
+    await query.edit_message_text(
+        _MENU_MSG,
+        parse_mode='Markdown',
+        reply_markup=TECLADO_PRINCIPAL
+    )
+
+
+# Botões fixos no fim da lista de templates
+_RODAPE_TEMPLATES = (
+    [
+        InlineKeyboardButton("➕ Novo Template", callback_data="template_criar"),
+        InlineKeyboardButton("🧪 Testar Template", callback_data="template_testar")
+    ],
+    [InlineKeyboardButton("⬅️ Menu Principal", callback_data="voltar_menu")],
+)
+
+
+def _menu_templates(templates):
+    """Texto e teclado do menu de templates (um botão por template, até o
+    limite da lista, seguidos do rodapé fixo)"""
+    mensagem = _TEMPLATES_CABECALHO.format(total=len(templates))
+
+    keyboard = [[
+        InlineKeyboardButton(f"📝 {_trunc(template['nome'], 20)}",
+                             callback_data=f"template_mostrar_{template['id']}"),
+        InlineKeyboardButton("✏️ Editar",
+                             callback_data=f"template_editar_{template['id']}")
+    ] for template in templates[:_MAX_BOTOES_LISTA]]
+    keyboard.extend(_RODAPE_TEMPLATES)
+
+    if not templates:
+        mensagem += _TEMPLATES_VAZIO
+
+    return mensagem, InlineKeyboardMarkup(keyboard)
+
+
+async def _voltar_templates(query, context):
+    """Recarregar a lista de templates"""
+    templates = await db_call(listar_templates_cache, apenas_ativos=True)
+    mensagem, reply_markup = _menu_templates(templates)
+
+    await query.edit_message_text(
+        mensagem,
+        parse_mode='Markdown',
+        reply_markup=reply_markup
+    )
 
 
 async def mostrar_detalhes_cliente(query, context, cliente_id):
     """Mostra detalhes completos de um cliente específico"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(apenas_ativos=True)
-
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        cliente = await db_call(obter_cliente, cliente_id, apenas_ativos=True)
         if not cliente:
             await query.edit_message_text("❌ Cliente não encontrado!")
             return
 
-        vencimento = datetime.strptime(cliente['vencimento'], '%Y-%m-%d')
-        dias_restantes = (vencimento - agora_br().replace(tzinfo=None)).days
+        vencimento = cliente['vencimento_obj']
+        if vencimento is None:
+            await query.edit_message_text(
+                "❌ Data de vencimento inválida no cadastro do cliente!")
+            return
+        dias_restantes = (vencimento - agora_br().date()).days
 
         # Status do cliente
         if dias_restantes < 0:
@@ -996,36 +1508,28 @@ async def mostrar_detalhes_cliente(query, context, cliente_id):
         else:
             status = f"🟢 ATIVO ({dias_restantes} dias restantes)"
 
-        mensagem = f"""👤 *DETALHES DO CLIENTE*
-
-📝 *Nome:* {cliente['nome']}
-📱 *Telefone:* {cliente['telefone']}
-📦 *Pacote:* {cliente['pacote']}
-💰 *Valor:* R$ {cliente['valor']:.2f}
-🖥️ *Servidor:* {cliente['servidor']}
-📅 *Vencimento:* {vencimento.strftime('%d/%m/%Y')}
-
-📊 *Status:* {status}"""
+        mensagem = _DETALHES_TMPL.format_map(
+            ChainMap({'status': status}, cliente))
 
         # Criar botões de ação para o cliente
         keyboard = [
             [
                 InlineKeyboardButton("📧 Enviar Cobrança",
-                                     callback_data=f"cobrar_{cliente_id}"),
+                                     callback_data=_cb("cobrar", cliente_id)),
                 InlineKeyboardButton("💬 Enviar Mensagem",
-                                     callback_data=f"mensagem_{cliente_id}")
+                                     callback_data=_cb("mensagem", cliente_id))
             ],
             [
                 InlineKeyboardButton("🔄 Renovar",
-                                     callback_data=f"renovar_{cliente_id}"),
+                                     callback_data=_cb("renovar", cliente_id)),
                 InlineKeyboardButton("📊 Histórico",
-                                     callback_data=f"historico_{cliente_id}")
+                                     callback_data=_cb("historico", cliente_id))
             ],
             [
                 InlineKeyboardButton("✏️ Editar",
-                                     callback_data=f"editar_{cliente_id}"),
+                                     callback_data=_cb("editar", cliente_id)),
                 InlineKeyboardButton("🗑️ Excluir",
-                                     callback_data=f"excluir_{cliente_id}")
+                                     callback_data=_cb("excluir", cliente_id))
             ],
             [
                 InlineKeyboardButton("⬅️ Voltar à Lista",
@@ -1039,46 +1543,45 @@ async def mostrar_detalhes_cliente(query, context, cliente_id):
                                       parse_mode='Markdown',
                                       reply_markup=reply_markup)
 
-    except Exception as e:
-        logger.error(f"Erro ao mostrar detalhes: {e}")
+    except _ERROS_CALLBACK as e:
+        logger.error("Erro ao mostrar detalhes: %s", e)
         await query.edit_message_text("❌ Erro ao carregar detalhes!")
 
 
 async def atualizar_lista_clientes(query, context):
     """Atualiza a lista de clientes inline"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(apenas_ativos=True)
+        clientes = listar_clientes_cache(apenas_ativos=True)
 
         if not clientes:
             await query.edit_message_text("📋 Nenhum cliente cadastrado ainda.")
             return
 
-        # Recriar a lista ordenada (mesmo código da função listar_clientes)
+        # Contar status em uma única passada e montar só os clientes que
+        # viram botão (o cache já vem ordenado por vencimento e com a data
+        # convertida, então os primeiros são os que aparecem)
+        hoje = agora_br().date()
         clientes_ordenados = []
+        total_clientes = vencidos = vencendo_hoje = vencendo_breve = 0
         for cliente in clientes:
-            try:
-                vencimento = datetime.strptime(cliente['vencimento'],
-                                               '%Y-%m-%d')
-                cliente['vencimento_obj'] = vencimento
-                cliente['dias_restantes'] = (
-                    vencimento - agora_br().replace(tzinfo=None)).days
-                clientes_ordenados.append(cliente)
-            except (ValueError, KeyError):
+            vencimento = cliente['vencimento_obj']
+            if vencimento is None:
                 continue
+            total_clientes += 1
+            dias_restantes = (vencimento - hoje).days
+            if len(clientes_ordenados) < _MAX_BOTOES_LISTA:
+                clientes_ordenados.append(
+                    ClienteResumo(cliente['id'], cliente['nome'],
+                                  cliente['valor'], vencimento,
+                                  dias_restantes))
 
-        clientes_ordenados.sort(key=lambda x: x['vencimento_obj'])
+            if dias_restantes < 0:
+                vencidos += 1
+            elif dias_restantes == 0:
+                vencendo_hoje += 1
+            elif dias_restantes <= 3:
+                vencendo_breve += 1
 
-        # Contar clientes por status para resumo
-        total_clientes = len(clientes_ordenados)
-        hoje = agora_br().replace(tzinfo=None)
-        vencidos = len(
-            [c for c in clientes_ordenados if c['dias_restantes'] < 0])
-        vencendo_hoje = len(
-            [c for c in clientes_ordenados if c['dias_restantes'] == 0])
-        vencendo_breve = len(
-            [c for c in clientes_ordenados if 0 < c['dias_restantes'] <= 3])
         ativos = total_clientes - vencidos
 
         mensagem = f"""👥 *LISTA DE CLIENTES*
@@ -1088,75 +1591,43 @@ async def atualizar_lista_clientes(query, context):
 
 💡 *Clique em um cliente para ver detalhes:*"""
 
-        keyboard = []
-
         # Mostrar apenas botões, sem texto da lista
-        for cliente in clientes_ordenados[:50]:  # Limitado a 50 botões
-            dias_restantes = cliente['dias_restantes']
-            vencimento = cliente['vencimento_obj']
-
-            if dias_restantes < 0:
-                status_emoji = "🔴"
-            elif dias_restantes == 0:
-                status_emoji = "⚠️"
-            elif dias_restantes <= 3:
-                status_emoji = "🟡"
-            else:
-                status_emoji = "🟢"
-
-            nome_curto = cliente['nome'][:18] + "..." if len(
-                cliente['nome']) > 18 else cliente['nome']
-            botao_texto = f"{status_emoji} {nome_curto} - R${cliente['valor']:.0f} - {vencimento.strftime('%d/%m')}"
-
-            keyboard.append([
-                InlineKeyboardButton(botao_texto,
-                                     callback_data=f"cliente_{cliente['id']}")
-            ])
-
-        keyboard.append([
-            InlineKeyboardButton("🔄 Atualizar Lista",
-                                 callback_data="atualizar_lista"),
-            InlineKeyboardButton("📊 Relatório",
-                                 callback_data="gerar_relatorio")
-        ])
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _teclado_lista_clientes(clientes_ordenados)
 
         await query.edit_message_text(mensagem,
                                       parse_mode='Markdown',
                                       reply_markup=reply_markup)
 
-    except Exception as e:
-        logger.error(f"Erro ao atualizar lista: {e}")
+    except _ERROS_CALLBACK as e:
+        logger.error("Erro ao atualizar lista: %s", e)
         await query.edit_message_text("❌ Erro ao atualizar lista!")
 
 
 async def gerar_relatorio_inline(query, context):
     """Gera relatório rápido inline"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(apenas_ativos=True)
+        clientes = listar_clientes_cache(apenas_ativos=True)
 
         total_clientes = len(clientes)
-        receita_total = sum(float(c['valor']) for c in clientes)
-
-        hoje = agora_br().replace(tzinfo=None)
-        vencidos = [
-            c for c in clientes
-            if datetime.strptime(c['vencimento'], '%Y-%m-%d') < hoje
-        ]
-        vencendo_hoje = [
-            c for c in clientes if c['vencimento'] == hoje.strftime('%Y-%m-%d')
-        ]
-        vencendo_3_dias = [
-            c for c in clientes
-            if 0 <= (datetime.strptime(c['vencimento'], '%Y-%m-%d') -
-                     hoje).days <= 3
-        ]
 
-        # Usar horário brasileiro para o relatório
+        # Somar receita e contar status em uma única passada, comparando
+        # apenas os dias restantes (datas já convertidas no cache); o horário
+        # brasileiro é lido uma vez só, para o cálculo e para o rodapé
         agora_brasilia = agora_br()
+        hoje = agora_brasilia.date()
+        receita_total = 0.0
+        vencidos = vencendo_hoje = vencendo_3_dias = 0
+        for c in clientes:
+            receita_total += float(c['valor'])
+            if c['vencimento_obj'] is None:
+                continue
+            d = (c['vencimento_obj'] - hoje).days
+            if d < 0:
+                vencidos += 1
+            elif d <= 3:
+                vencendo_3_dias += 1
+                if d == 0:
+                    vencendo_hoje += 1
 
         mensagem = f"""📊 *RELATÓRIO RÁPIDO*
 
@@ -1164,37 +1635,52 @@ async def gerar_relatorio_inline(query, context):
 💰 *Receita mensal:* R$ {receita_total:.2f}
 
 📈 *Status dos Clientes:*
-🔴 Vencidos: {len(vencidos)}
-⚠️ Vencem hoje: {len(vencendo_hoje)}
-🟡 Vencem em 3 dias: {len(vencendo_3_dias)}
-🟢 Ativos: {total_clientes - len(vencidos)}
+🔴 Vencidos: {vencidos}
+⚠️ Vencem hoje: {vencendo_hoje}
+🟡 Vencem em 3 dias: {vencendo_3_dias}
+🟢 Ativos: {total_clientes - vencidos}
 
 📅 *Atualizado:* {formatar_datetime_br(agora_brasilia)} (Brasília)"""
 
-        keyboard = [[
-            InlineKeyboardButton("⬅️ Voltar à Lista",
-                                 callback_data="voltar_lista")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         await query.edit_message_text(mensagem,
                                       parse_mode='Markdown',
-                                      reply_markup=reply_markup)
+                                      reply_markup=_MARKUP_VOLTAR_LISTA)
 
-    except Exception as e:
-        logger.error(f"Erro no relatório: {e}")
+    except _ERROS_CALLBACK as e:
+        logger.error("Erro no relatório: %s", e)
         await query.edit_message_text("❌ Erro ao gerar relatório!")
 
 
+# Mensagens de cobrança usadas quando não há template no banco
+_TEMPLATE_COBRANCA_PADRAO = '⚠️ ATENÇÃO {nome}!\n\nSeu plano vence em breve:\n\n📦 Pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nRenove agora para não perder o acesso!'
+_TEMPLATE_VENCIDO_PADRAO = '🔴 PLANO VENCIDO - {nome}\n\nSeu plano venceu em {vencimento}.\n\n📦 Pacote: {pacote}\n💰 Valor para renovação: R$ {valor}\n\nRenove urgentemente para reativar o serviço!'
+_TEMPLATE_BOAS_VINDAS_PADRAO = 'Olá {nome}! 👋\n\nSeja bem-vindo ao nosso serviço!\n\n📦 Seu pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nQualquer dúvida, estamos aqui para ajudar!'
+
+# Templates padrão do sistema (nome -> título e conteúdo), montados uma única
+# vez para as telas de templates e para a carga inicial no banco
+_TEMPLATES_PADRAO = {
+    'boas_vindas': {
+        'titulo': 'Mensagem de Boas-vindas',
+        'conteudo': _TEMPLATE_BOAS_VINDAS_PADRAO,
+        'tipo': 'Padrão'
+    },
+    'cobranca': {
+        'titulo': 'Cobrança de Renovação',
+        'conteudo': _TEMPLATE_COBRANCA_PADRAO,
+        'tipo': 'Padrão'
+    },
+    'vencido': {
+        'titulo': 'Plano Vencido',
+        'conteudo': _TEMPLATE_VENCIDO_PADRAO,
+        'tipo': 'Padrão'
+    }
+}
+
+
 async def enviar_cobranca_cliente(query, context, cliente_id):
     """Envia cobrança via WhatsApp para cliente específico usando templates do sistema"""
     try:
-        from database import DatabaseManager
-        from datetime import datetime
-
-        db = DatabaseManager()
-        clientes = db.listar_clientes(apenas_ativos=False)  # Incluir clientes inativos
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        cliente = await db_call(obter_cliente, cliente_id)  # Incluir clientes inativos
 
         if not cliente:
             await query.edit_message_text(
@@ -1202,15 +1688,17 @@ async def enviar_cobranca_cliente(query, context, cliente_id):
                 f"Cliente ID: {cliente_id}\n"
                 "O cliente pode ter sido excluído ou não existe no sistema.",
                 parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Voltar à Lista", callback_data="voltar_lista")
-                ]])
+                reply_markup=_MARKUP_VOLTAR_LISTA
             )
             return
 
         # Preparar dados para envio
-        vencimento = datetime.strptime(cliente['vencimento'], '%Y-%m-%d')
-        dias_restantes = (vencimento - agora_br().replace(tzinfo=None)).days
+        vencimento = cliente['vencimento_obj']
+        if vencimento is None:
+            await query.edit_message_text(
+                "❌ Data de vencimento inválida no cadastro do cliente!")
+            return
+        dias_restantes = (vencimento - agora_br().date()).days
 
         # Criar mensagem baseada no status
         if dias_restantes < 0:
@@ -1226,37 +1714,26 @@ async def enviar_cobranca_cliente(query, context, cliente_id):
             status_msg = f"Vence em {dias_restantes} dias"
             urgencia = "🔔 LEMBRETE"
 
-        # Buscar templates do banco de dados ou usar padrão
+        # Buscar templates (cache curto da lista do banco) ou usar padrão
         try:
-            templates_db = db.listar_templates()
-            template_cobranca = None
-            template_vencido = None
-
-            # Procurar por templates específicos
-            for template in templates_db:
-                if template['nome'].lower() == 'cobranca':
-                    template_cobranca = template['conteudo']
-                elif template['nome'].lower() == 'vencido':
-                    template_vencido = template['conteudo']
+            por_nome = {t['nome'].lower(): t['conteudo']
+                        for t in await db_call(listar_templates_cache)}
+            template_cobranca = por_nome.get('cobranca')
+            template_vencido = por_nome.get('vencido')
 
-            logger.info(f"Templates carregados - Cobrança: {'✓' if template_cobranca else '✗'}, Vencido: {'✓' if template_vencido else '✗'}")
+            logger.info("Templates carregados - Cobrança: %s, Vencido: %s", '✓' if template_cobranca else '✗', '✓' if template_vencido else '✗')
         except Exception as e:
-            logger.warning(f"Erro ao buscar templates do DB, usando padrão: {e}")
+            logger.warning("Erro ao buscar templates do DB, usando padrão: %s", e)
             template_cobranca = None
             template_vencido = None
 
-        # Templates padrão caso não existam no DB
-        templates_sistema = {
-            'cobranca': template_cobranca or '⚠️ ATENÇÃO {nome}!\n\nSeu plano vence em breve:\n\n📦 Pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nRenove agora para não perder o acesso!',
-            'vencido': template_vencido or '🔴 PLANO VENCIDO - {nome}\n\nSeu plano venceu em {vencimento}.\n\n📦 Pacote: {pacote}\n💰 Valor para renovação: R$ {valor}\n\nRenove urgentemente para reativar o serviço!'
-        }
-
-        # Selecionar template baseado no status do cliente
+        # Selecionar template baseado no status do cliente (padrão caso
+        # não exista no DB)
         if dias_restantes < 0:
-            template_usar = templates_sistema['vencido']
+            template_usar = template_vencido or _TEMPLATE_VENCIDO_PADRAO
             tipo_template = "vencido"
         else:
-            template_usar = templates_sistema['cobranca']
+            template_usar = template_cobranca or _TEMPLATE_COBRANCA_PADRAO
             tipo_template = "cobrança"
 
         # Formatar data de vencimento para exibição
@@ -1264,118 +1741,128 @@ async def enviar_cobranca_cliente(query, context, cliente_id):
 
         # Aplicar dados do cliente ao template
         try:
-            mensagem_whatsapp = template_usar.format(
-                nome=cliente['nome'],
-                telefone=cliente['telefone'],
-                pacote=cliente['pacote'],
-                valor=f"{cliente['valor']:.2f}",
-                vencimento=vencimento_formatado,
-                servidor=cliente['servidor']
-            )
-            logger.info(f"Template aplicado com sucesso - Cliente: {cliente['nome']}, Tipo: {tipo_template}")
+            mensagem_whatsapp = template_usar.format_map({
+                'nome': cliente['nome'],
+                'telefone': cliente['telefone'],
+                'pacote': cliente['pacote'],
+                'valor': f"{cliente['valor']:.2f}",
+                'vencimento': vencimento_formatado,
+                'servidor': cliente['servidor'],
+            })
+            logger.info("Template aplicado com sucesso - Cliente: %s, Tipo: %s", cliente['nome'], tipo_template)
         except Exception as e:
-            logger.error(f"Erro ao aplicar template: {e}")
+            logger.error("Erro ao aplicar template: %s", e)
             mensagem_whatsapp = f"Olá {cliente['nome']}!\n\nSeu plano {cliente['pacote']} vence em {vencimento_formatado}.\nValor: R$ {cliente['valor']:.2f}\nServidor: {cliente['servidor']}\n\nRenove para continuar usando nossos serviços."
 
+        # Responder na hora e concluir o envio pelo WhatsApp em segundo plano
+        await query.edit_message_text(
+            f"⏳ Enviando cobrança para {cliente['nome']}...")
+        context.application.create_task(
+            _concluir_envio_cobranca(query, cliente, mensagem_whatsapp,
+                                     tipo_template, status_msg))
+
+    except _ERROS_CALLBACK as e:
+        logger.error("Erro ao enviar cobrança: %s", e)
+        keyboard = [[
+            InlineKeyboardButton("⬅️ Voltar ao Cliente",
+                                 callback_data=_cb("cliente", cliente_id))
+        ]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        await query.edit_message_text(
+            f"❌ *Erro interno ao enviar cobrança!*\n\nDetalhes: {str(e)[:100]}",
+            parse_mode='Markdown',
+            reply_markup=reply_markup)
+
+
+async def _concluir_envio_cobranca(query, cliente, mensagem_whatsapp,
+                                   tipo_template, status_msg):
+    """Envia a cobrança pelo WhatsApp e mostra o resultado (em segundo plano)"""
+    cliente_id = cliente['id']
+    try:
         # Enviar via WhatsApp híbrido com timeout
         try:
-            from whatsapp_hybrid_service import WhatsAppHybridService
-            ws = WhatsAppHybridService()
-
-            # Usar asyncio.wait_for para timeout de 15 segundos
-            import asyncio
-            sucesso = await asyncio.wait_for(ws.enviar_mensagem(
-                cliente['telefone'], mensagem_whatsapp),
-                                             timeout=15.0)
+            sucesso = await _enviar_whatsapp(cliente['telefone'],
+                                             mensagem_whatsapp)
 
             if sucesso:
                 # Log de sucesso
-                logger.info(f"✅ Cobrança enviada com sucesso - Cliente: {cliente['nome']} ({cliente['telefone']}), Template: {tipo_template}")
+                logger.info("✅ Cobrança enviada com sucesso - Cliente: %s (%s), Template: %s", cliente['nome'], cliente['telefone'], tipo_template)
 
                 # Salvar log no banco de dados
-                try:
-                    db.registrar_log_mensagem(
-                        cliente_id=cliente['id'],
-                        tipo=tipo_template,
-                        telefone=cliente['telefone'],
-                        status='enviado',
-                        conteudo=mensagem_whatsapp[:500]
-                    )
-                except Exception as log_err:
-                    logger.warning(f"Erro ao salvar log: {log_err}")
+                _LOG_BUFFER.put_nowait(
+                    cliente_id=cliente['id'],
+                    tipo=tipo_template,
+                    telefone=cliente['telefone'],
+                    status='enviado',
+                    conteudo=mensagem_whatsapp[:500]
+                )
 
                 mensagem = f"✅ **COBRANÇA ENVIADA COM SUCESSO**\n\n"
-                mensagem += f"**Cliente:** {cliente['nome']}\n"
-                mensagem += f"**WhatsApp:** {cliente['telefone']}\n"
-                mensagem += f"**Template:** {tipo_template.title()}\n"
-                mensagem += f"**Enviado:** {agora_br().replace(tzinfo=None).strftime('%d/%m/%Y %H:%M')}\n\n"
+                mensagem += f"**Cliente:** {_md(cliente['nome'])}\n"
+                mensagem += f"**WhatsApp:** {_md(cliente['telefone'])}\n"
+                mensagem += f"**Template:** {_md(tipo_template.title())}\n"
+                mensagem += f"**Enviado:** {agora_br():%d/%m/%Y %H:%M}\n\n"
                 mensagem += f"**Status:** {status_msg}\n"
-                mensagem += f"**Pacote:** {cliente['pacote']}\n"
+                mensagem += f"**Pacote:** {_md(cliente['pacote'])}\n"
                 mensagem += f"**Valor:** R$ {cliente['valor']:.2f}\n\n"
-                mensagem += f"📝 **Prévia da mensagem enviada:**\n`{mensagem_whatsapp[:100]}{'...' if len(mensagem_whatsapp) > 100 else ''}`"
+                # Crase na prévia fecharia o bloco de código antes da hora
+                previa = mensagem_whatsapp[:100].replace('`', "'")
+                mensagem += f"📝 **Prévia da mensagem enviada:**\n`{previa}{'...' if len(mensagem_whatsapp) > 100 else ''}`"
             else:
                 # Log de falha
-                logger.error(f"❌ Falha no envio - Cliente: {cliente['nome']} ({cliente['telefone']})")
+                logger.error("❌ Falha no envio - Cliente: %s (%s)", cliente['nome'], cliente['telefone'])
 
-                try:
-                    db.registrar_log_mensagem(
-                        cliente_id=cliente['id'],
-                        tipo=tipo_template,
-                        telefone=cliente['telefone'],
-                        status='falha',
-                        conteudo='Erro: WhatsApp não confirmou o envio'
-                    )
-                except Exception as log_err:
-                    logger.warning(f"Erro ao salvar log: {log_err}")
+                _LOG_BUFFER.put_nowait(
+                    cliente_id=cliente['id'],
+                    tipo=tipo_template,
+                    telefone=cliente['telefone'],
+                    status='falha',
+                    conteudo='Erro: WhatsApp não confirmou o envio'
+                )
 
                 mensagem = f"❌ **FALHA NO ENVIO**\n\n"
                 mensagem += f"O WhatsApp não confirmou o envio.\n"
-                mensagem += f"**Cliente:** {cliente['nome']}\n"
-                mensagem += f"**Telefone:** {cliente['telefone']}\n"
-                mensagem += f"**Template:** {tipo_template.title()}\n\n"
+                mensagem += f"**Cliente:** {_md(cliente['nome'])}\n"
+                mensagem += f"**Telefone:** {_md(cliente['telefone'])}\n"
+                mensagem += f"**Template:** {_md(tipo_template.title())}\n\n"
                 mensagem += f"**Possíveis causas:**\n"
                 mensagem += f"• Número incorreto ou inexistente\n"
                 mensagem += f"• WhatsApp desconectado\n"
                 mensagem += f"• Problemas na API Evolution/Baileys"
 
         except asyncio.TimeoutError:
-            logger.warning(f"⏱️ Timeout no envio - Cliente: {cliente['nome']} ({cliente['telefone']})")
+            logger.warning("⏱️ Timeout no envio - Cliente: %s (%s)", cliente['nome'], cliente['telefone'])
 
-            try:
-                db.registrar_log_mensagem(
-                    cliente_id=cliente['id'],
-                    tipo=tipo_template,
-                    telefone=cliente['telefone'],
-                    status='timeout',
-                    conteudo='Erro: Timeout após 15 segundos'
-                )
-            except Exception as log_err:
-                logger.warning(f"Erro ao salvar log: {log_err}")
+            _LOG_BUFFER.put_nowait(
+                cliente_id=cliente['id'],
+                tipo=tipo_template,
+                telefone=cliente['telefone'],
+                status='timeout',
+                conteudo=f'Erro: Timeout após {_TIMEOUT_WHATSAPP:.0f} segundos'
+            )
 
             mensagem = f"⏱️ **TIMEOUT NO ENVIO**\n\n"
             mensagem += f"A mensagem pode ter sido enviada mas demorou para responder.\n\n"
-            mensagem += f"**Cliente:** {cliente['nome']}\n"
-            mensagem += f"**Template:** {tipo_template.title()}\n"
-            mensagem += f"**Tempo limite:** 15 segundos\n\n"
+            mensagem += f"**Cliente:** {_md(cliente['nome'])}\n"
+            mensagem += f"**Template:** {_md(tipo_template.title())}\n"
+            mensagem += f"**Tempo limite:** {_TIMEOUT_WHATSAPP:.0f} segundos\n\n"
             mensagem += f"**Ação recomendada:** Verificar manualmente no WhatsApp"
         except Exception as e:
-            logger.error(f"❌ Erro específico ao enviar WhatsApp: {e}")
+            logger.error("❌ Erro específico ao enviar WhatsApp: %s", e)
 
-            try:
-                db.registrar_log_mensagem(
-                    cliente_id=cliente['id'],
-                    tipo=tipo_template,
-                    telefone=cliente['telefone'],
-                    status='erro',
-                    conteudo=f'Erro: {str(e)[:200]}'
-                )
-            except Exception as log_err:
-                logger.warning(f"Erro ao salvar log: {log_err}")
+            _LOG_BUFFER.put_nowait(
+                cliente_id=cliente['id'],
+                tipo=tipo_template,
+                telefone=cliente['telefone'],
+                status='erro',
+                conteudo=f'Erro: {str(e)[:200]}'
+            )
 
             mensagem = f"❌ **ERRO NO ENVIO**\n\n"
-            mensagem += f"**Cliente:** {cliente['nome']}\n"
-            mensagem += f"**Template:** {tipo_template.title()}\n"
-            mensagem += f"**Erro técnico:** {str(e)[:150]}\n\n"
+            mensagem += f"**Cliente:** {_md(cliente['nome'])}\n"
+            mensagem += f"**Template:** {_md(tipo_template.title())}\n"
+            mensagem += f"**Erro técnico:** {_md(str(e)[:150])}\n\n"
             mensagem += f"**Diagnóstico sugerido:**\n"
             mensagem += f"• Verificar configuração da Evolution API\n"
             mensagem += f"• Confirmar se Baileys está conectado\n"
@@ -1383,7 +1870,7 @@ async def enviar_cobranca_cliente(query, context, cliente_id):
 
         keyboard = [[
             InlineKeyboardButton("⬅️ Voltar ao Cliente",
-                                 callback_data=f"cliente_{cliente_id}")
+                                 callback_data=_cb("cliente", cliente_id))
         ]]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -1392,42 +1879,35 @@ async def enviar_cobranca_cliente(query, context, cliente_id):
                                       reply_markup=reply_markup)
 
     except Exception as e:
-        logger.error(f"Erro ao enviar cobrança: {e}")
-        keyboard = [[
-            InlineKeyboardButton("⬅️ Voltar ao Cliente",
-                                 callback_data=f"cliente_{cliente_id}")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        logger.error("Erro ao concluir envio de cobrança: %s", e)
 
-        await query.edit_message_text(
-            f"❌ *Erro interno ao enviar cobrança!*\n\nDetalhes: {str(e)[:100]}",
-            parse_mode='Markdown',
-            reply_markup=reply_markup)
+
+def _contar_envios_por_template(db, cliente_id):
+    """Envios do cliente por template (logs antigos sem template_id contam
+    em None); só a contagem sai da thread do banco"""
+    return Counter(log.get('template_id')
+                   for log in db.obter_historico_cliente_template(cliente_id))
 
 
 async def mostrar_templates_cliente(query, context, cliente_id):
     """Mostra templates disponíveis para envio ao cliente"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
+        db = get_db()
 
         # Buscar cliente
-        clientes = db.listar_clientes(apenas_ativos=False)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        cliente = await db_call(obter_cliente, cliente_id)
 
         if not cliente:
             await query.edit_message_text(
                 "❌ **CLIENTE NÃO ENCONTRADO**\n\n"
                 f"Cliente ID: {cliente_id}",
                 parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Voltar à Lista", callback_data="voltar_lista")
-                ]])
+                reply_markup=_MARKUP_VOLTAR_LISTA
             )
             return
 
         # Buscar templates
-        templates = db.listar_templates(apenas_ativos=True)
+        templates = await db_call(listar_templates_cache, apenas_ativos=True)
 
         if not templates:
             await query.edit_message_text(
@@ -1436,7 +1916,7 @@ async def mostrar_templates_cliente(query, context, cliente_id):
                 "Crie templates primeiro usando o menu principal.",
                 parse_mode='Markdown',
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Voltar ao Cliente", callback_data=f"cliente_{cliente_id}")
+                    InlineKeyboardButton("⬅️ Voltar ao Cliente", callback_data=_cb("cliente", cliente_id))
                 ]])
             )
             return
@@ -1446,15 +1926,18 @@ async def mostrar_templates_cliente(query, context, cliente_id):
         mensagem += f"**WhatsApp:** {cliente['telefone']}\n\n"
         mensagem += f"📋 **Selecione um template para enviar:**\n"
 
+        # Estatísticas de uso: uma única consulta do histórico do cliente,
+        # contada por template na thread do banco
+        envios_por_template = await db_call(_contar_envios_por_template, db,
+                                            cliente_id)
+
         # Criar botões para cada template com informações de uso
         keyboard = []
-        for template in templates:
-            # Buscar estatísticas do template para este cliente
-            historico_template = db.obter_historico_cliente_template(cliente_id, template['id'])
-            total_envios = len(historico_template)
+        for template in templates[:_MAX_BOTOES_LISTA]:
+            total_envios = envios_por_template[template['id']]
 
             # Limitar nome do template para botão
-            nome_template = template['nome'][:20] + ('...' if len(template['nome']) > 20 else '')
+            nome_template = _trunc(template['nome'], 20)
 
             # Adicionar contador se já foi usado
             if total_envios > 0:
@@ -1465,67 +1948,176 @@ async def mostrar_templates_cliente(query, context, cliente_id):
             keyboard.append([
                 InlineKeyboardButton(
                     nome_botao,
-                    callback_data=f"template_enviar_{template['id']}_{cliente_id}"
+                    callback_data=_cb("template", "enviar", template['id'], cliente_id)
                 )
             ])
 
         # Botão para voltar
         keyboard.append([
-            InlineKeyboardButton("⬅️ Voltar ao Cliente", callback_data=f"cliente_{cliente_id}")
+            InlineKeyboardButton("⬅️ Voltar ao Cliente", callback_data=_cb("cliente", cliente_id))
         ])
 
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        try:
-            await query.edit_message_text(
-                mensagem,
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
-        except Exception as parse_error:
-            logger.warning(f"Erro de parsing Markdown ao mostrar templates, enviando texto simples: {parse_error}")
-            await query.edit_message_text(
-                mensagem.replace('**', '').replace('*', ''),
-                reply_markup=reply_markup
-            )
+        # Nome/telefone do cliente podem desbalancear o Markdown: decidir o
+        # modo antes de enviar em vez de tentar de novo após o erro
+        if _markdown_balanceado(mensagem):
+            parse_mode = 'Markdown'
+        else:
+            logger.warning("Markdown desbalanceado ao mostrar templates, enviando texto simples")
+            parse_mode = None
+            mensagem = mensagem.translate(_SEM_MARKDOWN)
 
-    except Exception as e:
-        logger.error(f"Erro ao mostrar templates: {e}")
+        await query.edit_message_text(
+            mensagem,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+
+    except _ERROS_CALLBACK as e:
+        logger.error("Erro ao mostrar templates: %s", e)
         await query.edit_message_text(
             f"❌ **ERRO AO CARREGAR TEMPLATES**\n\n"
             f"Erro técnico: {str(e)[:100]}",
             parse_mode='Markdown',
             reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Voltar ao Cliente", callback_data=f"cliente_{cliente_id}")
+                InlineKeyboardButton("⬅️ Voltar ao Cliente", callback_data=_cb("cliente", cliente_id))
             ]])
         )
 
 
+def _cb(acao, *params):
+    """Monta o callback_data "acao_param_id" que o callback_cliente separa
+    por prefixo (ex: _cb("renovar", 30, 12) -> "renovar_30_12")"""
+    return "_".join((acao, *map(str, params)))
+
+
+# Teclados por cliente: só o id muda no callback_data, então cada um é
+# montado uma vez por cliente e reaproveitado nos cliques seguintes
+@functools.lru_cache(maxsize=2048)
+def _kb_voltar_cliente(cliente_id):
+    """Botão único de volta aos detalhes do cliente"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("⬅️ Voltar ao Cliente",
+                             callback_data=_cb("cliente", cliente_id))
+    ]])
+
+
+@functools.lru_cache(maxsize=2048)
+def _kb_historico(cliente_id):
+    """Ações do histórico de mensagens do cliente"""
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("💬 Enviar Mensagem",
+                                 callback_data=_cb("mensagem", cliente_id)),
+            InlineKeyboardButton("📧 Enviar Cobrança",
+                                 callback_data=_cb("cobrar", cliente_id))
+        ],
+        [
+            InlineKeyboardButton("⬅️ Voltar ao Cliente",
+                                 callback_data=_cb("cliente", cliente_id))
+        ]
+    ])
+
+
+@functools.lru_cache(maxsize=2048)
+def _kb_renovar(cliente_id):
+    """Períodos de renovação do cliente"""
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("📅 +30 dias",
+                                 callback_data=_cb("renovar", 30, cliente_id)),
+            InlineKeyboardButton("📅 +60 dias",
+                                 callback_data=_cb("renovar", 60, cliente_id))
+        ],
+        [
+            InlineKeyboardButton("📅 +90 dias",
+                                 callback_data=_cb("renovar", 90, cliente_id)),
+            InlineKeyboardButton("📅 +365 dias",
+                                 callback_data=_cb("renovar", 365, cliente_id))
+        ],
+        [
+            InlineKeyboardButton("⬅️ Voltar ao Cliente",
+                                 callback_data=_cb("cliente", cliente_id))
+        ]
+    ])
+
+
+@functools.lru_cache(maxsize=2048)
+def _kb_editar(cliente_id):
+    """Campos editáveis do cliente"""
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("📝 Nome",
+                                 callback_data=_cb("edit", "nome", cliente_id)),
+            InlineKeyboardButton("📱 Telefone",
+                                 callback_data=_cb("edit", "telefone", cliente_id))
+        ],
+        [
+            InlineKeyboardButton("📦 Pacote",
+                                 callback_data=_cb("edit", "pacote", cliente_id)),
+            InlineKeyboardButton("💰 Valor",
+                                 callback_data=_cb("edit", "valor", cliente_id))
+        ],
+        [
+            InlineKeyboardButton("🖥️ Servidor",
+                                 callback_data=_cb("edit", "servidor", cliente_id)),
+            InlineKeyboardButton("📅 Vencimento",
+                                 callback_data=_cb("edit", "vencimento", cliente_id))
+        ],
+        [
+            InlineKeyboardButton("⬅️ Voltar ao Cliente",
+                                 callback_data=_cb("cliente", cliente_id))
+        ]
+    ])
+
+
+@functools.lru_cache(maxsize=2048)
+def _kb_excluir(cliente_id):
+    """Confirmação de exclusão do cliente"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🗑️ SIM, EXCLUIR",
+                             callback_data=_cb("confirmar", "excluir", cliente_id)),
+        InlineKeyboardButton("❌ Cancelar",
+                             callback_data=_cb("cliente", cliente_id))
+    ]])
+
+
+@functools.lru_cache(maxsize=2048)
+def _kb_renovado(cliente_id):
+    """Saídas após a renovação do cliente"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("⬅️ Voltar ao Cliente",
+                             callback_data=_cb("cliente", cliente_id)),
+        InlineKeyboardButton("📋 Ver Lista", callback_data="voltar_lista")
+    ]])
+
+
+class _VariaveisTemplate(dict):
+    """Variáveis do template; as ausentes voltam como {nome} no texto"""
+
+    def __missing__(self, chave):
+        return "{" + chave + "}"
+
+
 async def enviar_template_cliente(query, context, cliente_id, template_id):
     """Envia template específico para cliente usando WhatsApp híbrido"""
     try:
-        from database import DatabaseManager
-        from datetime import datetime
-
-        db = DatabaseManager()
+        db = get_db()
 
         # Buscar cliente
-        clientes = db.listar_clientes(apenas_ativos=False)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        cliente = await db_call(obter_cliente, cliente_id)
 
         if not cliente:
             await query.edit_message_text(
                 "❌ **CLIENTE NÃO ENCONTRADO**",
                 parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Voltar à Lista", callback_data="voltar_lista")
-                ]])
+                reply_markup=_MARKUP_VOLTAR_LISTA
             )
             return
 
         # Buscar template
-        templates = db.listar_templates(apenas_ativos=False)
-        template = next((t for t in templates if t['id'] == template_id), None)
+        template = await db_call(obter_template_cache, template_id)
 
         if not template:
             await query.edit_message_text(
@@ -1533,29 +2125,32 @@ async def enviar_template_cliente(query, context, cliente_id, template_id):
                 "O template pode ter sido excluído.",
                 parse_mode='Markdown',
                 reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Voltar ao Cliente", callback_data=f"cliente_{cliente_id}")
+                    InlineKeyboardButton("⬅️ Voltar ao Cliente", callback_data=_cb("cliente", cliente_id))
                 ]])
             )
             return
 
         # Preparar dados do cliente
-        vencimento = datetime.strptime(cliente['vencimento'], '%Y-%m-%d')
+        vencimento = cliente['vencimento_obj']
+        if vencimento is None:
+            await query.edit_message_text(
+                "❌ Data de vencimento inválida no cadastro do cliente!")
+            return
         vencimento_formatado = vencimento.strftime('%d/%m/%Y')
 
         # Obter configurações do sistema para variáveis adicionais
         try:
-            configuracoes = db.get_configuracoes()
+            configuracoes = await db_call(obter_configuracoes_cache)
         except:
             configuracoes = {}
 
         # Aplicar variáveis ao template com dados completos
         try:
             # Calcular dias restantes para vencimento
-            hoje = datetime.now()
+            hoje = agora_br().date()
             dias_restantes = (vencimento - hoje).days if vencimento > hoje else 0
 
             # Preparar novo vencimento (30 dias após atual)
-            from datetime import timedelta
             novo_vencimento = (vencimento + timedelta(days=30)).strftime('%d/%m/%Y')
 
             dados_template = {
@@ -1581,273 +2176,242 @@ async def enviar_template_cliente(query, context, cliente_id, template_id):
                 'novo_vencimento': novo_vencimento,
             }
 
-            mensagem_whatsapp = template['conteudo'].format(**dados_template)
-            logger.info(f"Template '{template['nome']}' aplicado - Cliente: {cliente['nome']}")
-        except KeyError as key_err:
-            logger.error(f"Erro: variável não encontrada no template: {key_err}")
-            # Tentar aplicar apenas as variáveis básicas
-            try:
-                mensagem_whatsapp = template['conteudo'].format(
-                    nome=cliente['nome'],
-                    telefone=cliente['telefone'],
-                    pacote=cliente['pacote'],
-                    valor=f"{cliente['valor']:.2f}",
-                    vencimento=vencimento_formatado,
-                    servidor=cliente['servidor']
-                )
-                logger.info(f"Template aplicado com variáveis básicas - Cliente: {cliente['nome']}")
-            except Exception:
-                logger.error(f"Erro ao aplicar variáveis básicas, enviando template original")
-                mensagem_whatsapp = template['conteudo']  # Usar template original se falhar
+            # Variáveis desconhecidas ficam como estão no texto em vez de
+            # derrubar a formatação inteira
+            mensagem_whatsapp = template['conteudo'].format_map(
+                _VariaveisTemplate(dados_template))
+            logger.info("Template '%s' aplicado - Cliente: %s", template['nome'], cliente['nome'])
         except Exception as template_err:
-            logger.error(f"Erro geral ao aplicar variáveis ao template: {template_err}")
+            logger.error("Erro geral ao aplicar variáveis ao template: %s", template_err)
             mensagem_whatsapp = template['conteudo']  # Usar template sem variáveis se falhar
 
+        # Responder na hora e concluir o envio pelo WhatsApp em segundo plano
+        await query.edit_message_text(
+            f"⏳ Enviando '{template['nome']}' para {cliente['nome']}...")
+        context.application.create_task(
+            _concluir_envio_template(query, cliente, template,
+                                     mensagem_whatsapp))
+
+    except _ERROS_CALLBACK as e:
+        logger.error("Erro ao enviar template: %s", e)
+        reply_markup = _kb_voltar_cliente(cliente_id)
+
+        await query.edit_message_text(
+            f"❌ **ERRO INTERNO**\n\nDetalhes: {_md(str(e)[:100])}",
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        )
+
+
+async def _concluir_envio_template(query, cliente, template,
+                                   mensagem_whatsapp):
+    """Envia o template pelo WhatsApp e mostra o resultado (em segundo plano)"""
+    cliente_id = cliente['id']
+    try:
         # Enviar via WhatsApp híbrido
         try:
-            from whatsapp_hybrid_service import WhatsAppHybridService
-            ws = WhatsAppHybridService()
-
-            import asyncio
-            sucesso = await asyncio.wait_for(ws.enviar_mensagem(
-                cliente['telefone'], mensagem_whatsapp),
-                                             timeout=15.0)
+            sucesso = await _enviar_whatsapp(cliente['telefone'],
+                                             mensagem_whatsapp)
 
             if sucesso:
                 # Log de sucesso
-                logger.info(f"✅ Template enviado com sucesso - Cliente: {cliente['nome']} ({cliente['telefone']}), Template: {template['nome']}")
+                logger.info("✅ Template enviado com sucesso - Cliente: %s (%s), Template: %s", cliente['nome'], cliente['telefone'], template['nome'])
 
                 # Registrar log no banco
-                try:
-                    db.registrar_log_mensagem(
-                        cliente_id=cliente['id'],
-                        tipo=f"template_{template['nome']}",
-                        telefone=cliente['telefone'],
-                        status='enviado',
-                        conteudo=mensagem_whatsapp[:500],
-                        template_id=template['id']
-                    )
-                except Exception as log_err:
-                    logger.warning(f"Erro ao salvar log: {log_err}")
+                _LOG_BUFFER.put_nowait(
+                    cliente_id=cliente['id'],
+                    tipo=f"template_{template['nome']}",
+                    telefone=cliente['telefone'],
+                    status='enviado',
+                    conteudo=mensagem_whatsapp[:500],
+                    template_id=template['id']
+                )
 
-                mensagem = f"✅ **MENSAGEM ENVIADA COM SUCESSO**\n\n"
-                mensagem += f"**Cliente:** {cliente['nome']}\n"
-                mensagem += f"**WhatsApp:** {cliente['telefone']}\n"
-                mensagem += f"**Template:** {template['nome']}\n"
-                mensagem += f"**Enviado:** {agora_br().replace(tzinfo=None).strftime('%d/%m/%Y %H:%M')}\n\n"
-                mensagem += f"📝 **Prévia da mensagem enviada:**\n"
-                mensagem += f"`{mensagem_whatsapp[:200]}{'...' if len(mensagem_whatsapp) > 200 else ''}`"
+                # A prévia vai num bloco de código: só a crase precisa sair
+                previa = _trunc(mensagem_whatsapp, 200, '...').replace('`', "'")
+                mensagem = (f"✅ **MENSAGEM ENVIADA COM SUCESSO**\n\n"
+                            f"**Cliente:** {_md(cliente['nome'])}\n"
+                            f"**WhatsApp:** {_md(cliente['telefone'])}\n"
+                            f"**Template:** {_md(template['nome'])}\n"
+                            f"**Enviado:** {agora_br():%d/%m/%Y %H:%M}\n\n"
+                            f"📝 **Prévia da mensagem enviada:**\n"
+                            f"`{previa}`")
 
             else:
                 # Log de falha
-                logger.error(f"❌ Falha no envio do template - Cliente: {cliente['nome']} ({cliente['telefone']})")
-
-                try:
-                    db.registrar_log_mensagem(
-                        cliente_id=cliente['id'],
-                        tipo=f"template_{template['nome']}",
-                        telefone=cliente['telefone'],
-                        status='falha',
-                        conteudo='Erro: WhatsApp não confirmou o envio',
-                        template_id=template['id']
-                    )
-                except Exception as log_err:
-                    logger.warning(f"Erro ao salvar log: {log_err}")
-
-                mensagem = f"❌ **FALHA NO ENVIO**\n\n"
-                mensagem += f"**Cliente:** {cliente['nome']}\n"
-                mensagem += f"**Template:** {template['nome']}\n"
-                mensagem += f"**Telefone:** {cliente['telefone']}\n\n"
-                mensagem += f"**Possíveis causas:**\n"
-                mensagem += f"• Número incorreto ou inexistente\n"
-                mensagem += f"• WhatsApp desconectado\n"
-                mensagem += f"• Problemas na API Evolution/Baileys"
-
-        except asyncio.TimeoutError:
-            logger.warning(f"⏱️ Timeout no envio do template - Cliente: {cliente['nome']} ({cliente['telefone']})")
+                logger.error("❌ Falha no envio do template - Cliente: %s (%s)", cliente['nome'], cliente['telefone'])
 
-            try:
-                db.registrar_log_mensagem(
+                _LOG_BUFFER.put_nowait(
                     cliente_id=cliente['id'],
                     tipo=f"template_{template['nome']}",
                     telefone=cliente['telefone'],
-                    status='timeout',
-                    conteudo='Erro: Timeout após 15 segundos',
+                    status='falha',
+                    conteudo='Erro: WhatsApp não confirmou o envio',
                     template_id=template['id']
                 )
-            except Exception as log_err:
-                logger.warning(f"Erro ao salvar log: {log_err}")
 
-            mensagem = f"⏱️ **TIMEOUT NO ENVIO**\n\n"
-            mensagem += f"**Cliente:** {cliente['nome']}\n"
-            mensagem += f"**Template:** {template['nome']}\n"
-            mensagem += f"**Tempo limite:** 15 segundos\n\n"
-            mensagem += f"A mensagem pode ter sido enviada.\n"
-            mensagem += f"**Ação recomendada:** Verificar manualmente no WhatsApp"
+                mensagem = (f"❌ **FALHA NO ENVIO**\n\n"
+                            f"**Cliente:** {_md(cliente['nome'])}\n"
+                            f"**Template:** {_md(template['nome'])}\n"
+                            f"**Telefone:** {_md(cliente['telefone'])}\n\n"
+                            "**Possíveis causas:**\n"
+                            "• Número incorreto ou inexistente\n"
+                            "• WhatsApp desconectado\n"
+                            "• Problemas na API Evolution/Baileys")
+
+        except asyncio.TimeoutError:
+            logger.warning("⏱️ Timeout no envio do template - Cliente: %s (%s)", cliente['nome'], cliente['telefone'])
+
+            _LOG_BUFFER.put_nowait(
+                cliente_id=cliente['id'],
+                tipo=f"template_{template['nome']}",
+                telefone=cliente['telefone'],
+                status='timeout',
+                conteudo=f'Erro: Timeout após {_TIMEOUT_WHATSAPP:.0f} segundos',
+                template_id=template['id']
+            )
+
+            mensagem = (f"⏱️ **TIMEOUT NO ENVIO**\n\n"
+                        f"**Cliente:** {_md(cliente['nome'])}\n"
+                        f"**Template:** {_md(template['nome'])}\n"
+                        f"**Tempo limite:** {_TIMEOUT_WHATSAPP:.0f} segundos\n\n"
+                        "A mensagem pode ter sido enviada.\n"
+                        "**Ação recomendada:** Verificar manualmente no WhatsApp")
 
         except Exception as e:
-            logger.error(f"❌ Erro específico ao enviar template: {e}")
+            logger.error("❌ Erro específico ao enviar template: %s", e)
 
-            try:
-                db.registrar_log_mensagem(
-                    cliente_id=cliente['id'],
-                    tipo=f"template_{template['nome']}",
-                    telefone=cliente['telefone'],
-                    status='erro',
-                    conteudo=f'Erro: {str(e)[:200]}',
-                    template_id=template['id']
-                )
-            except Exception as log_err:
-                logger.warning(f"Erro ao salvar log: {log_err}")
+            _LOG_BUFFER.put_nowait(
+                cliente_id=cliente['id'],
+                tipo=f"template_{template['nome']}",
+                telefone=cliente['telefone'],
+                status='erro',
+                conteudo=f'Erro: {str(e)[:200]}',
+                template_id=template['id']
+            )
 
-            mensagem = f"❌ **ERRO NO ENVIO**\n\n"
-            mensagem += f"**Cliente:** {cliente['nome']}\n"
-            mensagem += f"**Template:** {template['nome']}\n"
-            mensagem += f"**Erro técnico:** {str(e)[:150]}\n\n"
-            mensagem += f"**Diagnóstico sugerido:**\n"
-            mensagem += f"• Verificar configuração da Evolution API\n"
-            mensagem += f"• Confirmar se Baileys está conectado\n"
-            mensagem += f"• Testar conectividade da instância WhatsApp"
+            mensagem = (f"❌ **ERRO NO ENVIO**\n\n"
+                        f"**Cliente:** {_md(cliente['nome'])}\n"
+                        f"**Template:** {_md(template['nome'])}\n"
+                        f"**Erro técnico:** {_md(str(e)[:150])}\n\n"
+                        "**Diagnóstico sugerido:**\n"
+                        "• Verificar configuração da Evolution API\n"
+                        "• Confirmar se Baileys está conectado\n"
+                        "• Testar conectividade da instância WhatsApp")
 
         # Botões de ação
         keyboard = [
             [
                 InlineKeyboardButton("📝 Outros Templates",
-                                   callback_data=f"mensagem_{cliente_id}"),
+                                   callback_data=_cb("mensagem", cliente_id)),
                 InlineKeyboardButton("⬅️ Voltar ao Cliente",
-                                   callback_data=f"cliente_{cliente_id}")
+                                   callback_data=_cb("cliente", cliente_id))
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
-        # Escapar caracteres especiais do Markdown para evitar erros de parsing
-        try:
-            await query.edit_message_text(
-                mensagem,
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
-        except Exception as parse_error:
-            # Se falhar com Markdown, tentar sem parse_mode
-            logger.warning(f"Erro de parsing Markdown, enviando texto simples: {parse_error}")
-            await query.edit_message_text(
-                mensagem,
-                reply_markup=reply_markup
-            )
+        # Campos do usuário já vêm escapados, então o Markdown é sempre válido
+        await query.edit_message_text(
+            mensagem,
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        )
 
     except Exception as e:
-        logger.error(f"Erro ao enviar template: {e}")
-        keyboard = [[
-            InlineKeyboardButton("⬅️ Voltar ao Cliente",
-                                 callback_data=f"cliente_{cliente_id}")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        logger.error("Erro ao concluir envio de template: %s", e)
 
-        try:
-            await query.edit_message_text(
-                f"❌ **ERRO INTERNO**\n\nDetalhes: {str(e)[:100]}",
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
-        except Exception:
-            await query.edit_message_text(
-                f"❌ ERRO INTERNO\n\nDetalhes: {str(e)[:100]}",
-                reply_markup=reply_markup
-            )
+
+_STATUS_EMOJI = {
+    'enviado': '✅',
+    'falha': '❌',
+    'erro': '❌',
+    'timeout': '⏱️',
+    'pendente': '⏳'
+}
+
+
+def _linha_historico(i, log):
+    """Formata um envio do histórico do cliente (com o erro resumido)"""
+    try:
+        data_criacao = datetime.fromisoformat(log['criado_em'])
+        data_formatada = data_criacao.strftime('%d/%m %H:%M')
+    except:
+        data_formatada = log['criado_em'][:16] if log['criado_em'] else 'N/A'
+
+    status_emoji = _STATUS_EMOJI.get(log['status'], '❓')
+
+    # Nome do template, ou montado a partir do tipo do log
+    template_nome = log.get('template_nome', 'Template Removido')
+    if not template_nome or template_nome == 'None':
+        tipo = log['tipo']
+        if tipo and tipo.startswith('template_'):
+            template_nome = tipo[len('template_'):].title()
+        else:
+            template_nome = tipo or 'Manual'
+
+    linha = f"`{i}.` {status_emoji} **{_md(template_nome)}** - {data_formatada}\n"
+
+    if log['status'] != 'enviado':
+        erro = log.get('erro', log.get('conteudo', ''))
+        if erro and 'Erro:' in erro:
+            erro_resumido = erro.split('Erro:')[1][:30].strip()
+            # Sem itálico: o Markdown legado não aceita escapes dentro de _..._
+            linha += f"    💬 {_md(erro_resumido)}\n"
+
+    return linha + "\n"
+
+
+def _resumo_historico(db, cliente_id, limite=5):
+    """Totais por status e últimos envios do cliente, resumidos na thread do
+    banco para não copiar o histórico inteiro para o callback"""
+    logs = db.obter_historico_cliente_template(cliente_id)
+    return Counter(log['status'] for log in logs), logs[:limite]
 
 
 async def mostrar_historico_cliente(query, context, cliente_id):
     """Mostra histórico de templates e mensagens enviadas para um cliente"""
     try:
-        from database import DatabaseManager
-        from datetime import datetime
-
-        db = DatabaseManager()
+        db = get_db()
 
         # Buscar cliente
-        clientes = db.listar_clientes(apenas_ativos=False)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        cliente = await db_call(obter_cliente, cliente_id)
 
         if not cliente:
             await query.edit_message_text(
                 "❌ **CLIENTE NÃO ENCONTRADO**",
                 parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Voltar à Lista", callback_data="voltar_lista")
-                ]])
+                reply_markup=_MARKUP_VOLTAR_LISTA
             )
             return
 
-        # Buscar histórico de mensagens do cliente
-        logs = db.obter_historico_cliente_template(cliente_id)
+        # Buscar totais por status e os últimos envios do cliente
+        por_status, logs = await db_call(_resumo_historico, db, cliente_id)
+        total = sum(por_status.values())
 
-        mensagem = f"📊 **HISTÓRICO DE MENSAGENS**\n\n"
-        mensagem += f"**Cliente:** {cliente['nome']}\n"
-        mensagem += f"**Telefone:** {cliente['telefone']}\n\n"
+        cabecalho = (f"📊 **HISTÓRICO DE MENSAGENS**\n\n"
+                     f"**Cliente:** {_md(cliente['nome'])}\n"
+                     f"**Telefone:** {_md(cliente['telefone'])}\n\n")
 
-        if not logs:
-            mensagem += "📭 **Nenhuma mensagem enviada ainda**\n\n"
-            mensagem += "Este cliente ainda não recebeu nenhuma mensagem via template."
+        if not total:
+            mensagem = (f"{cabecalho}📭 **Nenhuma mensagem enviada ainda**\n\n"
+                        "Este cliente ainda não recebeu nenhuma mensagem via template.")
         else:
-            mensagem += f"📈 **Total de envios:** {len(logs)}\n\n"
-
             # Estatísticas rápidas
-            enviados = len([log for log in logs if log['status'] == 'enviado'])
-            falhas = len([log for log in logs if log['status'] in ['falha', 'erro', 'timeout']])
-
-            mensagem += f"✅ **Enviados:** {enviados}\n"
-            mensagem += f"❌ **Falhas:** {falhas}\n\n"
-
-            mensagem += "📋 **Últimos 5 envios:**\n"
+            enviados = por_status['enviado']
+            falhas = (por_status['falha'] + por_status['erro']
+                      + por_status['timeout'])
 
             # Mostrar últimos 5 envios
-            for i, log in enumerate(logs[:5]):
-                try:
-                    data_criacao = datetime.fromisoformat(log['criado_em'].replace('Z', '+00:00'))
-                    data_formatada = data_criacao.strftime('%d/%m %H:%M')
-                except:
-                    data_formatada = log['criado_em'][:16] if log['criado_em'] else 'N/A'
-
-                # Status emoji
-                status_emoji = {
-                    'enviado': '✅',
-                    'falha': '❌',
-                    'erro': '❌',
-                    'timeout': '⏱️',
-                    'pendente': '⏳'
-                }.get(log['status'], '❓')
-
-                template_nome = log.get('template_nome', 'Template Removido')
-                if not template_nome or template_nome == 'None':
-                    if log['tipo'] and 'template_' in log['tipo']:
-                        template_nome = log['tipo'].replace('template_', '').title()
-                    else:
-                        template_nome = log['tipo'] or 'Manual'
-
-                mensagem += f"`{i+1}.` {status_emoji} **{template_nome}** - {data_formatada}\n"
-
-                if log['status'] not in ['enviado']:
-                    erro = log.get('erro', log.get('conteudo', ''))
-                    if erro and 'Erro:' in erro:
-                        erro_resumido = erro.split('Erro:')[1][:30].strip()
-                        mensagem += f"    💬 _{erro_resumido}_\n"
-
-                mensagem += "\n"
+            ultimos = "".join(_linha_historico(i, log)
+                              for i, log in enumerate(logs, 1))
+
+            mensagem = (f"{cabecalho}📈 **Total de envios:** {total}\n\n"
+                        f"✅ **Enviados:** {enviados}\n"
+                        f"❌ **Falhas:** {falhas}\n\n"
+                        f"📋 **Últimos 5 envios:**\n{ultimos}")
 
         # Botões de ação
-        keyboard = [
-            [
-                InlineKeyboardButton("💬 Enviar Mensagem",
-                                   callback_data=f"mensagem_{cliente_id}"),
-                InlineKeyboardButton("📧 Enviar Cobrança",
-                                   callback_data=f"cobrar_{cliente_id}")
-            ],
-            [
-                InlineKeyboardButton("⬅️ Voltar ao Cliente",
-                                   callback_data=f"cliente_{cliente_id}")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _kb_historico(cliente_id)
 
         await query.edit_message_text(
             mensagem,
@@ -1857,14 +2421,10 @@ async def mostrar_historico_cliente(query, context, cliente_id):
 
     except Exception as e:
         logger.error(f"Erro ao mostrar histórico do cliente: {e}")
-        keyboard = [[
-            InlineKeyboardButton("⬅️ Voltar ao Cliente",
-                                 callback_data=f"cliente_{cliente_id}")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _kb_voltar_cliente(cliente_id)
 
         await query.edit_message_text(
-            f"❌ **ERRO AO CARREGAR HISTÓRICO**\n\nDetalhes: {str(e)[:100]}",
+            f"❌ **ERRO AO CARREGAR HISTÓRICO**\n\nDetalhes: {_md(str(e)[:100])}",
             parse_mode='Markdown',
             reply_markup=reply_markup
         )
@@ -1873,55 +2433,26 @@ async def mostrar_historico_cliente(query, context, cliente_id):
 async def renovar_cliente_inline(query, context, cliente_id):
     """Renova cliente por período específico"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(
-            ativo_apenas=False)  # Busca todos os clientes
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
-
-        # Debug: vamos ver se o cliente existe
-        logger.info(f"Procurando cliente ID: {cliente_id}")
-        logger.info(f"Total de clientes encontrados: {len(clientes)}")
-        if clientes:
-            logger.info(f"IDs dos clientes: {[c['id'] for c in clientes]}")
+        cliente = await db_call(obter_cliente, cliente_id)  # Busca todos os clientes
 
         if not cliente:
+            logger.info(f"Cliente ID {cliente_id} não encontrado para renovação")
             await query.edit_message_text(
-                f"❌ Cliente ID {cliente_id} não encontrado!\nTotal clientes: {len(clientes)}"
-            )
+                f"❌ Cliente ID {cliente_id} não encontrado!")
             return
 
-        vencimento_atual = datetime.strptime(cliente['vencimento'], '%Y-%m-%d')
+        vencimento_atual = cliente['vencimento_obj']
 
         mensagem = f"""🔄 *RENOVAR CLIENTE*
 
-👤 *Cliente:* {cliente['nome']}
+👤 *Cliente:* {_md(cliente['nome'])}
 📅 *Vencimento Atual:* {vencimento_atual.strftime('%d/%m/%Y')}
-📦 *Pacote:* {cliente['pacote']}
+📦 *Pacote:* {_md(cliente['pacote'])}
 💰 *Valor:* R$ {cliente['valor']:.2f}
 
 Escolha o período de renovação:"""
 
-        keyboard = [
-            [
-                InlineKeyboardButton("📅 +30 dias",
-                                     callback_data=f"renovar_30_{cliente_id}"),
-                InlineKeyboardButton("📅 +60 dias",
-                                     callback_data=f"renovar_60_{cliente_id}")
-            ],
-            [
-                InlineKeyboardButton("📅 +90 dias",
-                                     callback_data=f"renovar_90_{cliente_id}"),
-                InlineKeyboardButton("📅 +365 dias",
-                                     callback_data=f"renovar_365_{cliente_id}")
-            ],
-            [
-                InlineKeyboardButton("⬅️ Voltar ao Cliente",
-                                     callback_data=f"cliente_{cliente_id}")
-            ]
-        ]
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _kb_renovar(cliente_id)
 
         await query.edit_message_text(mensagem,
                                       parse_mode='Markdown',
@@ -1935,57 +2466,26 @@ Escolha o período de renovação:"""
 async def editar_cliente_inline(query, context, cliente_id):
     """Edita dados do cliente"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(ativo_apenas=False)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        cliente = await db_call(obter_cliente, cliente_id)
 
         if not cliente:
             await query.edit_message_text("❌ Cliente não encontrado!")
             return
 
-        vencimento = datetime.strptime(cliente['vencimento'], '%Y-%m-%d')
+        vencimento = cliente['vencimento_obj']
 
         mensagem = f"""✏️ *EDITAR CLIENTE*
 
-👤 *Cliente:* {cliente['nome']}
-📱 *Telefone:* {cliente['telefone']}
-📦 *Pacote:* {cliente['pacote']}
+👤 *Cliente:* {_md(cliente['nome'])}
+📱 *Telefone:* {_md(cliente['telefone'])}
+📦 *Pacote:* {_md(cliente['pacote'])}
 💰 *Valor:* R$ {cliente['valor']:.2f}
-🖥️ *Servidor:* {cliente['servidor']}
+🖥️ *Servidor:* {_md(cliente['servidor'])}
 📅 *Vencimento:* {vencimento.strftime('%d/%m/%Y')}
 
 Escolha o que deseja editar:"""
 
-        keyboard = [[
-            InlineKeyboardButton("📝 Nome",
-                                 callback_data=f"edit_nome_{cliente_id}"),
-            InlineKeyboardButton("📱 Telefone",
-                                 callback_data=f"edit_telefone_{cliente_id}")
-        ],
-                    [
-                        InlineKeyboardButton(
-                            "📦 Pacote",
-                            callback_data=f"edit_pacote_{cliente_id}"),
-                        InlineKeyboardButton(
-                            "💰 Valor",
-                            callback_data=f"edit_valor_{cliente_id}")
-                    ],
-                    [
-                        InlineKeyboardButton(
-                            "🖥️ Servidor",
-                            callback_data=f"edit_servidor_{cliente_id}"),
-                        InlineKeyboardButton(
-                            "📅 Vencimento",
-                            callback_data=f"edit_vencimento_{cliente_id}")
-                    ],
-                    [
-                        InlineKeyboardButton(
-                            "⬅️ Voltar ao Cliente",
-                            callback_data=f"cliente_{cliente_id}")
-                    ]]
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _kb_editar(cliente_id)
 
         await query.edit_message_text(mensagem,
                                       parse_mode='Markdown',
@@ -1999,38 +2499,27 @@ Escolha o que deseja editar:"""
 async def excluir_cliente_inline(query, context, cliente_id):
     """Confirma exclusão do cliente"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(ativo_apenas=False)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        cliente = await db_call(obter_cliente, cliente_id)
 
         if not cliente:
             await query.edit_message_text("❌ Cliente não encontrado!")
             return
 
-        vencimento = datetime.strptime(cliente['vencimento'], '%Y-%m-%d')
+        vencimento = cliente['vencimento_obj']
 
         mensagem = f"""🗑️ *EXCLUIR CLIENTE*
 
 ⚠️ *ATENÇÃO: Esta ação não pode ser desfeita!*
 
-👤 *Cliente:* {cliente['nome']}
-📱 *Telefone:* {cliente['telefone']}
-📦 *Pacote:* {cliente['pacote']}
+👤 *Cliente:* {_md(cliente['nome'])}
+📱 *Telefone:* {_md(cliente['telefone'])}
+📦 *Pacote:* {_md(cliente['pacote'])}
 💰 *Valor:* R$ {cliente['valor']:.2f}
 📅 *Vencimento:* {vencimento.strftime('%d/%m/%Y')}
 
 Tem certeza que deseja excluir este cliente?"""
 
-        keyboard = [[
-            InlineKeyboardButton(
-                "🗑️ SIM, EXCLUIR",
-                callback_data=f"confirmar_excluir_{cliente_id}"),
-            InlineKeyboardButton("❌ Cancelar",
-                                 callback_data=f"cliente_{cliente_id}")
-        ]]
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _kb_excluir(cliente_id)
 
         await query.edit_message_text(mensagem,
                                       parse_mode='Markdown',
@@ -2044,79 +2533,81 @@ Tem certeza que deseja excluir este cliente?"""
 async def confirmar_exclusao_cliente(query, context, cliente_id):
     """Executa a exclusão do cliente"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(ativo_apenas=False)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        db = get_db()
+        cliente = await db_call(obter_cliente, cliente_id)
 
         if not cliente:
             await query.edit_message_text("❌ Cliente não encontrado!")
             return
 
-        nome_cliente = cliente['nome']
+        nome_cliente = _md(cliente['nome'])
 
-        # Executar exclusão
-        sucesso = db.excluir_cliente(cliente_id)
+        # Executar exclusão (o cliente acima veio do cache, sem SELECT)
+        sucesso = await db_call(db.excluir_cliente, cliente_id)
+        invalidar_cache_clientes()
 
         if sucesso:
             mensagem = f"""✅ *CLIENTE EXCLUÍDO*
 
 👤 Cliente: {nome_cliente}
-🗑️ Removido do sistema em: {agora_br().strftime('%d/%m/%Y %H:%M')}
+🗑️ Removido do sistema em: {agora_br():%d/%m/%Y %H:%M}
 
 O cliente foi permanentemente excluído do banco de dados."""
         else:
             mensagem = f"❌ *ERRO AO EXCLUIR*\n\nNão foi possível excluir o cliente {nome_cliente}.\nTente novamente mais tarde."
 
-        keyboard = [[
-            InlineKeyboardButton("⬅️ Voltar à Lista",
-                                 callback_data="voltar_lista")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         await query.edit_message_text(mensagem,
                                       parse_mode='Markdown',
-                                      reply_markup=reply_markup)
+                                      reply_markup=_MARKUP_VOLTAR_LISTA)
 
     except Exception as e:
         logger.error(f"Erro ao excluir cliente: {e}")
         await query.edit_message_text("❌ Erro interno ao excluir cliente!")
 
 
+async def _gravar_em_segundo_plano(func, *args):
+    """Grava um registro de histórico fora do caminho da resposta"""
+    try:
+        await db_call(func, *args)
+    except Exception as e:
+        logger.warning(f"Erro ao salvar histórico ({func.__name__}): {e}")
+
+
 async def processar_renovacao_cliente(query, context, cliente_id, dias):
     """Processa a renovação do cliente por X dias"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(ativo_apenas=False)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        db = get_db()
+        cliente = await db_call(obter_cliente, cliente_id)
 
         if not cliente:
             await query.edit_message_text("❌ Cliente não encontrado!")
             return
 
-        # Calcular nova data de vencimento
-        from datetime import datetime, timedelta  # Import local para evitar conflitos
-        vencimento_atual = datetime.strptime(cliente['vencimento'], '%Y-%m-%d')
+        # Calcular nova data de vencimento (data já convertida no cache)
+        vencimento_atual = cliente['vencimento_obj']
+        hoje = agora_br().date()
 
         # Se já venceu, renovar a partir de hoje
-        if vencimento_atual < agora_br().replace(tzinfo=None):
-            nova_data = agora_br().replace(tzinfo=None) + timedelta(days=dias)
+        if vencimento_atual < hoje:
+            nova_data = hoje + timedelta(days=dias)
         else:
             # Se ainda não venceu, somar os dias ao vencimento atual
             nova_data = vencimento_atual + timedelta(days=dias)
 
         # Atualizar apenas a data de vencimento
-        sucesso = db.atualizar_cliente(cliente_id, 'vencimento',
-                                       nova_data.strftime('%Y-%m-%d'))
+        sucesso = await db_call(db.atualizar_cliente, cliente_id, 'vencimento',
+                                nova_data.strftime('%Y-%m-%d'))
+        invalidar_cache_clientes()
 
         if sucesso:
-            # Registrar renovação no histórico
-            db.registrar_renovacao(cliente_id, dias, cliente['valor'])
+            # Registrar renovação no histórico sem segurar a resposta
+            context.application.create_task(
+                _gravar_em_segundo_plano(db.registrar_renovacao, cliente_id,
+                                         dias, cliente['valor']))
 
             mensagem = f"""✅ *CLIENTE RENOVADO*
 
-👤 *Cliente:* {cliente['nome']}
+👤 *Cliente:* {_md(cliente['nome'])}
 ⏰ *Período adicionado:* {dias} dias
 📅 *Vencimento anterior:* {vencimento_atual.strftime('%d/%m/%Y')}
 🔄 *Novo vencimento:* {nova_data.strftime('%d/%m/%Y')}
@@ -2126,12 +2617,7 @@ Renovação registrada com sucesso!"""
         else:
             mensagem = f"❌ *ERRO NA RENOVAÇÃO*\n\nNão foi possível renovar o cliente.\nTente novamente mais tarde."
 
-        keyboard = [[
-            InlineKeyboardButton("⬅️ Voltar ao Cliente",
-                                 callback_data=f"cliente_{cliente_id}"),
-            InlineKeyboardButton("📋 Ver Lista", callback_data="voltar_lista")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _kb_renovado(cliente_id)
 
         await query.edit_message_text(mensagem,
                                       parse_mode='Markdown',
@@ -2145,10 +2631,7 @@ Renovação registrada com sucesso!"""
 async def iniciar_edicao_campo(query, context, cliente_id, campo):
     """Inicia a edição interativa de um campo específico do cliente"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(ativo_apenas=False)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
+        cliente = await db_call(obter_cliente, cliente_id)
 
         if not cliente:
             await query.edit_message_text("❌ Cliente não encontrado!")
@@ -2190,8 +2673,7 @@ async def iniciar_edicao_campo(query, context, cliente_id, campo):
                 'label':
                 'Vencimento',
                 'valor':
-                datetime.strptime(cliente['vencimento'],
-                                  '%Y-%m-%d').strftime('%d/%m/%Y'),
+                cliente['vencimento_obj'].strftime('%d/%m/%Y'),
                 'placeholder':
                 'Ex: 15/03/2025'
             }
@@ -2205,25 +2687,19 @@ async def iniciar_edicao_campo(query, context, cliente_id, campo):
 
         mensagem = f"""✏️ *EDITAR {info['label'].upper()}*
 
-👤 *Cliente:* {cliente['nome']}
+👤 *Cliente:* {_md(cliente['nome'])}
 📝 *Campo:* {info['label']}
 🔄 *Valor atual:* {info['valor']}
 
 💬 Digite o novo {info['label'].lower()}:
 {info['placeholder']}"""
 
-        # Criar teclado com cancelar
-        keyboard = [[KeyboardButton("❌ Cancelar")]]
-        reply_markup = ReplyKeyboardMarkup(keyboard,
-                                           resize_keyboard=True,
-                                           one_time_keyboard=True)
-
         # Remover mensagem inline e enviar nova mensagem de texto
         await query.delete_message()
         await context.bot.send_message(chat_id=query.message.chat_id,
                                        text=mensagem,
                                        parse_mode='Markdown',
-                                       reply_markup=reply_markup)
+                                       reply_markup=TECLADO_CANCELAR)
 
         # Mapear campo para estado
         estados_edicao = {
@@ -2242,6 +2718,45 @@ async def iniciar_edicao_campo(query, context, cliente_id, campo):
         await query.edit_message_text("❌ Erro ao preparar edição!")
 
 
+# Callbacks "acao_<cliente_id>" despachados por prefixo em callback_cliente
+_CALLBACKS_CLIENTE = {
+    "cliente": mostrar_detalhes_cliente,
+    "cobrar": enviar_cobranca_cliente,
+    "mensagem": mostrar_templates_cliente,
+    "editar": editar_cliente_inline,
+    "excluir": excluir_cliente_inline,
+    "historico": mostrar_historico_cliente,
+}
+
+# Callbacks sem parâmetros, comparados pelo texto completo
+_CALLBACKS_EXATOS = {
+    "atualizar_lista": atualizar_lista_clientes,
+    "voltar_lista": atualizar_lista_clientes,
+    "gerar_relatorio": gerar_relatorio_inline,
+    "voltar_menu": _voltar_menu,
+    "voltar_templates": _voltar_templates,
+    "templates_listar": _callback_template_exato,
+    "template_ver": _callback_template_exato,
+    "template_editar_escolher": _callback_template_exato,
+    "template_testar_escolher": _callback_template_exato,
+    "template_criar": _callback_template_exato,
+    "template_excluir_escolher": _callback_template_exato,
+}
+
+# Callbacks com vários parâmetros, roteados pelo prefixo antes do "_"
+_CALLBACKS_PREFIXO = {
+    "renovar": _callback_renovar,
+    "confirmar": _callback_confirmar,
+    "edit": _callback_edit,
+    "template": _callback_template,
+}
+
+
+# Colunas que o /editar pode alterar
+_CAMPOS_EDITAVEIS = ('nome', 'telefone', 'pacote', 'valor', 'servidor',
+                     'vencimento')
+
+
 @verificar_admin
 async def editar_cliente_cmd(update, context):
     """Comando para editar cliente via comando"""
@@ -2254,32 +2769,28 @@ async def editar_cliente_cmd(update, context):
                 "`/editar 1 nome João Silva`\n"
                 "`/editar 1 valor 35.00`",
                 parse_mode='Markdown',
-                reply_markup=criar_teclado_principal())
+                reply_markup=TECLADO_PRINCIPAL)
             return
 
         cliente_id = int(context.args[0])
         campo = context.args[1].lower()
         novo_valor = " ".join(context.args[2:])
 
-        from database import DatabaseManager
-        db = DatabaseManager()
-        clientes = db.listar_clientes(apenas_ativos=True)
-        cliente = next((c for c in clientes if c['id'] == cliente_id), None)
-
-        if not cliente:
+        # Validar o campo antes de buscar o cliente (só colunas conhecidas
+        # chegam ao atualizar_cliente)
+        if campo not in _CAMPOS_EDITAVEIS:
             await update.message.reply_text(
-                f"❌ Cliente com ID {cliente_id} não encontrado!",
-                reply_markup=criar_teclado_principal())
+                f"❌ Campo inválido! Use: {', '.join(_CAMPOS_EDITAVEIS)}",
+                reply_markup=TECLADO_PRINCIPAL)
             return
 
-        # Validar campo e atualizar
-        campos_validos = [
-            'nome', 'telefone', 'pacote', 'valor', 'servidor', 'vencimento'
-        ]
-        if campo not in campos_validos:
+        db = get_db()
+        cliente = await db_call(obter_cliente, cliente_id, apenas_ativos=True)
+
+        if not cliente:
             await update.message.reply_text(
-                f"❌ Campo inválido! Use: {', '.join(campos_validos)}",
-                reply_markup=criar_teclado_principal())
+                f"❌ Cliente com ID {cliente_id} não encontrado!",
+                reply_markup=TECLADO_PRINCIPAL)
             return
 
         # Preparar dados para atualização
@@ -2314,17 +2825,19 @@ async def editar_cliente_cmd(update, context):
             dados[campo] = novo_valor
 
         # Executar atualização
-        sucesso = db.atualizar_cliente(cliente_id, campo, dados[campo])
+        sucesso = await db_call(db.atualizar_cliente, cliente_id, campo,
+                                dados[campo])
+        invalidar_cache_clientes()
 
         if sucesso:
             mensagem = f"""✅ *Cliente Atualizado!*
 
-👤 *Nome:* {dados['nome']}
-📱 *Telefone:* {dados['telefone']}
-📦 *Pacote:* {dados['pacote']}
+👤 *Nome:* {_md(dados['nome'])}
+📱 *Telefone:* {_md(dados['telefone'])}
+📦 *Pacote:* {_md(dados['pacote'])}
 💰 *Valor:* R$ {dados['valor']:.2f}
-🖥️ *Servidor:* {dados['servidor']}
-📅 *Vencimento:* {datetime.strptime(dados['vencimento'], '%Y-%m-%d').strftime('%d/%m/%Y')}
+🖥️ *Servidor:* {_md(dados['servidor'])}
+📅 *Vencimento:* {date.fromisoformat(dados['vencimento']):%d/%m/%Y}
 
 🔄 *Campo alterado:* {campo.upper()}"""
         else:
@@ -2332,43 +2845,48 @@ async def editar_cliente_cmd(update, context):
 
         await update.message.reply_text(mensagem,
                                         parse_mode='Markdown',
-                                        reply_markup=criar_teclado_principal())
+                                        reply_markup=TECLADO_PRINCIPAL)
 
     except Exception as e:
         logger.error(f"Erro ao editar cliente: {e}")
         await update.message.reply_text("❌ Erro interno ao editar cliente!",
-                                        reply_markup=criar_teclado_principal())
+                                        reply_markup=TECLADO_PRINCIPAL)
+
+
+def _estatisticas_relatorio(db, hoje):
+    """Total de clientes ativos, receita e vencimentos do dia, em uma
+    única passada"""
+    total = vencendo = 0
+    receita = 0.0
+    for c in db.listar_clientes(apenas_ativos=True):
+        total += 1
+        receita += float(c['valor'])
+        if c['vencimento'] == hoje:
+            vencendo += 1
+    return total, receita, vencendo
 
 
 @verificar_admin
+@tratar_erros("❌ Erro ao gerar relatório!")
 async def relatorio(update, context):
     """Gera relatório básico"""
-    try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-
-        clientes = db.listar_clientes(apenas_ativos=True)
-        total_clientes = len(clientes)
-        receita_total = sum(float(c['valor']) for c in clientes)
+    db = get_db()
 
-        hoje = agora_br().replace(tzinfo=None).strftime('%Y-%m-%d')
-        vencendo_hoje = [c for c in clientes if c['vencimento'] == hoje]
+    agora = agora_br()
+    total_clientes, receita_total, vencendo_hoje = await db_call(
+        _estatisticas_relatorio, db, agora.strftime('%Y-%m-%d'))
 
-        mensagem = f"""📊 *RELATÓRIO GERAL*
+    mensagem = f"""📊 *RELATÓRIO GERAL*
 
 👥 Total de clientes: {total_clientes}
 💰 Receita mensal: R$ {receita_total:.2f}
-⚠️ Vencendo hoje: {len(vencendo_hoje)}
+⚠️ Vencendo hoje: {vencendo_hoje}
 
-📅 Data: {agora_br().replace(tzinfo=None).strftime('%d/%m/%Y %H:%M')}"""
+📅 Data: {agora:%d/%m/%Y %H:%M}"""
 
-        await update.message.reply_text(mensagem,
-                                        parse_mode='Markdown',
-                                      reply_markup=criar_teclado_principal())
-
-    except Exception as e:
-        logger.error(f"Erro no relatório: {e}")
-        await update.message.reply_text("❌ Erro ao gerar relatório!")
+    await update.message.reply_text(mensagem,
+                                    parse_mode='Markdown',
+                                    reply_markup=TECLADO_PRINCIPAL)
 
 
 @verificar_admin
@@ -2391,75 +2909,50 @@ async def help_cmd(update, context):
 
     await update.message.reply_text(mensagem,
                                     parse_mode='Markdown',
-                                    reply_markup=criar_teclado_principal())
+                                    reply_markup=TECLADO_PRINCIPAL)
+
+
+# Chaves de user_data que indicam uma conversa em andamento
+_CHAVES_CONVERSA = frozenset(('editando_cliente_id', 'cadastro_atual',
+                              'config_estado'))
 
 
 @verificar_admin
 async def lidar_com_botoes(update, context):
     """Lida com os botões pressionados - somente quando não há conversa ativa"""
-    texto = update.message.text
-
-    # Lista de botões reconhecidos
-    botoes_reconhecidos = [
-        "👥 Listar Clientes", "➕ Adicionar Cliente", "📊 Relatórios",
-        "🔍 Buscar Cliente", "🏢 Empresa", "💳 PIX", "📞 Suporte",
-        "📱 WhatsApp Status", "🧪 Testar WhatsApp", "📱 QR Code",
-        "⚙️ Gerenciar WhatsApp", "📄 Templates", "⏰ Agendador",
-        "📋 Fila de Mensagens", "📜 Logs de Envios", "❓ Ajuda"
-    ]
+    # Botões desconhecidos e os tratados por ConversationHandler (None) são
+    # ignorados aqui
+    acao = BOTOES_MENU.get(update.message.text)
+    if acao is None:
+        return
 
-    # Se não é um botão reconhecido, não fazer nada (evitar mensagem de ajuda)
-    if texto not in botoes_reconhecidos:
+    # Se há dados de conversa ativa (ConversationHandler em uso), não
+    # processar aqui
+    user_data = context.user_data
+    if user_data and not _CHAVES_CONVERSA.isdisjoint(user_data):
         return
 
-    # Verificar se há uma conversa ativa (ConversationHandler em uso)
-    if hasattr(context, 'user_data') and context.user_data:
-        # Se há dados de conversa ativa, não processar aqui
-        if any(key in context.user_data for key in
-               ['editando_cliente_id', 'cadastro_atual', 'config_estado']):
-            return
+    await acao(update, context)
 
-    if texto == "👥 Listar Clientes":
-        await listar_clientes(update, context)
-    elif texto == "➕ Adicionar Cliente":
-        # Este caso será tratado pelo ConversationHandler
-        pass
-    elif texto == "📊 Relatórios":
-        await relatorio(update, context)
-    elif texto == "🔍 Buscar Cliente":
-        await buscar_cliente_cmd(update, context)
-    elif texto == "🏢 Empresa":
-        # Este caso será tratado pelo ConversationHandler config_direct_handler
-        pass
-    elif texto == "💳 PIX":
-        # Este caso será tratado pelo ConversationHandler config_direct_handler
-        pass
-    elif texto == "📞 Suporte":
-        # Este caso será tratado pelo ConversationHandler config_direct_handler
-        pass
-    elif texto == "📱 WhatsApp Status":
-        await whatsapp_status_direct(update, context)
-    elif texto == "🧪 Testar WhatsApp":
-        await testar_whatsapp_direct(update, context)
-    elif texto == "📱 QR Code":
-        await qr_code_direct(update, context)
-    elif texto == "⚙️ Gerenciar WhatsApp":
-        await gerenciar_whatsapp_direct(update, context)
-    elif texto == "📄 Templates":
-        await menu_templates_direct(update, context)
-    elif texto == "⏰ Agendador":
-        from agendador_interface import mostrar_agendador_principal
-        await mostrar_agendador_principal(update, context)
-    elif texto == "📋 Fila de Mensagens":
-        await update.message.reply_text(
-            "📋 Sistema de fila de mensagens será implementado em breve!",
-            reply_markup=criar_teclado_principal())
-    elif texto == "📜 Logs de Envios":
-        await update.message.reply_text(
-            "📜 Sistema de logs de envios será implementado em breve!",
-            reply_markup=criar_teclado_principal())
-    elif texto == "❓ Ajuda":
-        await help_cmd(update, context)
+
+async def _abrir_agendador(update, context):
+    """Abre o menu do agendador"""
+    from agendador_interface import mostrar_agendador_principal
+    await mostrar_agendador_principal(update, context)
+
+
+async def _fila_mensagens_em_breve(update, context):
+    """Aviso da fila de mensagens ainda não disponível"""
+    await update.message.reply_text(
+        "📋 Sistema de fila de mensagens será implementado em breve!",
+        reply_markup=TECLADO_PRINCIPAL)
+
+
+async def _logs_envios_em_breve(update, context):
+    """Aviso dos logs de envios ainda não disponíveis"""
+    await update.message.reply_text(
+        "📜 Sistema de logs de envios será implementado em breve!",
+        reply_markup=TECLADO_PRINCIPAL)
 
 
 # Funções diretas para WhatsApp e Templates
@@ -2468,7 +2961,7 @@ async def whatsapp_status_direct(update, context):
     await update.message.reply_text(
         "📱 *Status WhatsApp*\n\nVerificando status...",
         parse_mode='Markdown',
-        reply_markup=criar_teclado_principal()
+        reply_markup=TECLADO_PRINCIPAL
     )
 
 async def testar_whatsapp_direct(update, context):
@@ -2476,7 +2969,7 @@ async def testar_whatsapp_direct(update, context):
     await update.message.reply_text(
         "🧪 *Teste WhatsApp*\n\nIniciando teste...",
         parse_mode='Markdown',
-        reply_markup=criar_teclado_principal()
+        reply_markup=TECLADO_PRINCIPAL
     )
 
 async def qr_code_direct(update, context):
@@ -2484,7 +2977,7 @@ async def qr_code_direct(update, context):
     await update.message.reply_text(
         "📱 *QR Code*\n\nGerando código QR...",
         parse_mode='Markdown',
-        reply_markup=criar_teclado_principal()
+        reply_markup=TECLADO_PRINCIPAL
     )
 
 async def gerenciar_whatsapp_direct(update, context):
@@ -2492,58 +2985,22 @@ async def gerenciar_whatsapp_direct(update, context):
     await update.message.reply_text(
         "⚙️ *Gerenciar WhatsApp*\n\nAbrindo gerenciamento...",
         parse_mode='Markdown',
-        reply_markup=criar_teclado_principal()
+        reply_markup=TECLADO_PRINCIPAL
     )
 
+
+@tratar_erros("❌ Erro ao carregar templates", TECLADO_PRINCIPAL)
 async def menu_templates_direct(update, context):
     """Menu de templates direto"""
-    try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        templates = db.listar_templates()
-        
-        mensagem = f"📄 *SISTEMA DE TEMPLATES*\n\n"
-        mensagem += f"📊 Templates disponíveis: {len(templates)}\n\n"
-        
-        keyboard = []
-        
-        for template in templates:
-            template_id = template['id']
-            nome_display = template['nome'][:20] + ('...' if len(template['nome']) > 20 else '')
-            
-            keyboard.append([
-                InlineKeyboardButton(f"📝 {nome_display}",
-                                   callback_data=f"template_mostrar_{template_id}"),
-                InlineKeyboardButton("✏️ Editar",
-                                   callback_data=f"template_editar_{template_id}")
-            ])
-        
-        keyboard.append([
-            InlineKeyboardButton("➕ Novo Template", callback_data="template_criar"),
-            InlineKeyboardButton("🧪 Testar Template", callback_data="template_testar")
-        ])
-        keyboard.append([
-            InlineKeyboardButton("⬅️ Menu Principal", callback_data="voltar_menu")
-        ])
-        
-        if not templates:
-            mensagem += "📭 **Nenhum template encontrado**\n\n"
-            mensagem += "Crie seu primeiro template."
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            mensagem,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro no menu templates: {e}")
-        await update.message.reply_text(
-            "❌ Erro ao carregar templates",
-            reply_markup=criar_teclado_principal()
-        )
+    db = get_db()
+    templates = await db_call(db.listar_templates)
+    mensagem, reply_markup = _menu_templates(templates)
+
+    await update.message.reply_text(
+        mensagem,
+        parse_mode='Markdown',
+        reply_markup=reply_markup
+    )
 
 @verificar_admin
 async def buscar_cliente_cmd(update, context):
@@ -2555,36 +3012,57 @@ async def buscar_cliente_cmd(update, context):
         "*Exemplo:*\n"
         "`/buscar 11999999999`",
         parse_mode='Markdown',
-        reply_markup=criar_teclado_principal())
+        reply_markup=TECLADO_PRINCIPAL)
+
+
+# Botões do teclado principal despachados por lidar_com_botoes; None marca
+# os que já são atendidos por um ConversationHandler
+BOTOES_MENU = {
+    "👥 Listar Clientes": listar_clientes,
+    "➕ Adicionar Cliente": None,
+    "📊 Relatórios": relatorio,
+    "🔍 Buscar Cliente": buscar_cliente_cmd,
+    "🏢 Empresa": None,
+    "💳 PIX": None,
+    "📞 Suporte": None,
+    "📱 WhatsApp Status": whatsapp_status_direct,
+    "🧪 Testar WhatsApp": testar_whatsapp_direct,
+    "📱 QR Code": qr_code_direct,
+    "⚙️ Gerenciar WhatsApp": gerenciar_whatsapp_direct,
+    "📄 Templates": menu_templates_direct,
+    "⏰ Agendador": _abrir_agendador,
+    "📋 Fila de Mensagens": _fila_mensagens_em_breve,
+    "📜 Logs de Envios": _logs_envios_em_breve,
+    "❓ Ajuda": help_cmd,
+}
 
 
 @verificar_admin
+@tratar_erros("❌ Erro ao buscar cliente!", TECLADO_PRINCIPAL)
 async def buscar_cliente(update, context):
     """Busca cliente por telefone"""
-    try:
-        if not context.args:
-            await update.message.reply_text(
-                "❌ Por favor, informe o telefone!\n\n"
-                "Exemplo: `/buscar 11999999999`",
-                parse_mode='Markdown',
-                reply_markup=criar_teclado_principal())
-            return
+    if not context.args:
+        await update.message.reply_text(
+            "❌ Por favor, informe o telefone!\n\n"
+            "Exemplo: `/buscar 11999999999`",
+            parse_mode='Markdown',
+            reply_markup=TECLADO_PRINCIPAL)
+        return
 
-        telefone = context.args[0]
+    telefone = context.args[0]
 
-        from database import DatabaseManager
-        db = DatabaseManager()
-        cliente = db.buscar_cliente_por_telefone(telefone)
+    db = get_db()
+    cliente = await db_call(db.buscar_cliente_por_telefone, telefone)
 
-        if not cliente:
-            await update.message.reply_text(
-                f"❌ Cliente com telefone {telefone} não encontrado.",
-                reply_markup=criar_teclado_principal())
-            return
+    if not cliente:
+        await update.message.reply_text(
+            f"❌ Cliente com telefone {telefone} não encontrado.",
+            reply_markup=TECLADO_PRINCIPAL)
+        return
 
-        vencimento = datetime.strptime(cliente['vencimento'], '%Y-%m-%d')
+    vencimento = _parse_ymd(cliente['vencimento'])
 
-        mensagem = f"""👤 *Cliente Encontrado*
+    mensagem = f"""👤 *Cliente Encontrado*
 
 📝 *Nome:* {cliente['nome']}
 📱 *Telefone:* {cliente['telefone']}
@@ -2593,96 +3071,75 @@ async def buscar_cliente(update, context):
 📅 *Vencimento:* {vencimento.strftime('%d/%m/%Y')}
 🖥️ *Servidor:* {cliente['servidor']}"""
 
-        await update.message.reply_text(mensagem,
-                                        parse_mode='Markdown',
-                                        reply_markup=criar_teclado_principal())
+    await update.message.reply_text(mensagem,
+                                    parse_mode='Markdown',
+                                    reply_markup=TECLADO_PRINCIPAL)
+
+
+# Teclados fixos de /config, montados uma única vez no carregamento
+_MARKUP_CONFIG = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏢 Alterar Empresa", callback_data="config_empresa")],
+    [InlineKeyboardButton("💳 Alterar PIX", callback_data="config_pix")],
+    [InlineKeyboardButton("📞 Alterar Suporte", callback_data="config_suporte")],
+    [InlineKeyboardButton("🔄 Atualizar", callback_data="config_refresh")],
+])
+_MARKUP_CONFIG_INICIAL = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏢 Configurar Empresa",
+                          callback_data="config_empresa")],
+    [InlineKeyboardButton("💳 Configurar PIX", callback_data="config_pix")],
+    [InlineKeyboardButton("📞 Configurar Suporte",
+                          callback_data="config_suporte")],
+    [InlineKeyboardButton("📱 Status WhatsApp", callback_data="whatsapp_status")],
+    [InlineKeyboardButton("🧪 Testar WhatsApp", callback_data="whatsapp_test")],
+])
+# Versão do "🔄 Atualizar", que também traz os atalhos do WhatsApp
+_MARKUP_CONFIG_COMPLETO = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏢 Alterar Empresa", callback_data="config_empresa")],
+    [InlineKeyboardButton("💳 Alterar PIX", callback_data="config_pix")],
+    [InlineKeyboardButton("📞 Alterar Suporte", callback_data="config_suporte")],
+    [InlineKeyboardButton("📱 Status WhatsApp", callback_data="whatsapp_status")],
+    [InlineKeyboardButton("🧪 Testar WhatsApp", callback_data="whatsapp_test")],
+    [InlineKeyboardButton("⚙️ Gerenciar Instância",
+                          callback_data="whatsapp_instance")],
+    [InlineKeyboardButton("🔄 Atualizar", callback_data="config_refresh")],
+])
+
+
+_CONFIG_TMPL = """⚙️ <b>Configurações Atuais</b>
+
+🏢 <b>Empresa:</b> {empresa}
+💳 <b>PIX:</b> {pix_key}
+📞 <b>Suporte:</b> {suporte}"""
 
-    except Exception as e:
-        logger.error(f"Erro ao buscar cliente: {e}")
-        await update.message.reply_text("❌ Erro ao buscar cliente!",
-                                        reply_markup=criar_teclado_principal())
+
+def _texto_configuracoes(config):
+    """Tela de /config com os valores já escapados para HTML"""
+    return _CONFIG_TMPL.format(
+        empresa=escapar_html(config['empresa_nome']),
+        pix_key=escapar_html(config['pix_key']),
+        suporte=escapar_html(config['contato_suporte']))
 
 
 @verificar_admin
+@tratar_erros("❌ Erro ao carregar configurações!", TECLADO_PRINCIPAL)
 async def configuracoes_cmd(update, context):
     """Comando de configurações"""
-    try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        config = db.get_configuracoes()
-
-        if config:
-            # Escapar caracteres especiais para HTML
-            empresa = escapar_html(config['empresa_nome'])
-            pix_key = escapar_html(config['pix_key'])
-            suporte = escapar_html(config['contato_suporte'])
-
-            mensagem = f"""⚙️ <b>Configurações Atuais</b>
-
-🏢 <b>Empresa:</b> {empresa}
-💳 <b>PIX:</b> {pix_key}
-📞 <b>Suporte:</b> {suporte}"""
+    config = await db_call(obter_configuracoes_cache)
 
-            # Criar botões inline para editar configurações
-            keyboard = [
-                [
-                    InlineKeyboardButton("🏢 Alterar Empresa",
-                                         callback_data="config_empresa")
-                ],
-                [
-                    InlineKeyboardButton("💳 Alterar PIX",
-                                         callback_data="config_pix")
-                ],
-                [
-                    InlineKeyboardButton("📞 Alterar Suporte",
-                                         callback_data="config_suporte")
-                ],
-                [
-                    InlineKeyboardButton("🔄 Atualizar",
-                                         callback_data="config_refresh")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+    if config:
+        mensagem = _texto_configuracoes(config)
+        reply_markup = _MARKUP_CONFIG
 
-        else:
-            mensagem = """⚙️ <b>Configurações</b>
+    else:
+        mensagem = """⚙️ <b>Configurações</b>
 
 Nenhuma configuração encontrada.
 Configure sua empresa para personalizar as mensagens do bot."""
+        reply_markup = _MARKUP_CONFIG_INICIAL
 
-            # Botões para configuração inicial
-            keyboard = [
-                [
-                    InlineKeyboardButton("🏢 Configurar Empresa",
-                                         callback_data="config_empresa")
-                ],
-                [
-                    InlineKeyboardButton("💳 Configurar PIX",
-                                         callback_data="config_pix")
-                ],
-                [
-                    InlineKeyboardButton("📞 Configurar Suporte",
-                                         callback_data="config_suporte")
-                ],
-                [
-                    InlineKeyboardButton("📱 Status WhatsApp",
-                                         callback_data="whatsapp_status")
-                ],
-                [
-                    InlineKeyboardButton("🧪 Testar WhatsApp",
-                                         callback_data="whatsapp_test")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await update.message.reply_text(mensagem,
-                                        parse_mode='HTML',
-                                      reply_markup=reply_markup)
-
-    except Exception as e:
-        logger.error(f"Erro nas configurações: {e}")
-        await update.message.reply_text("❌ Erro ao carregar configurações!",
-                                        reply_markup=criar_teclado_principal())
+    await update.message.reply_text(mensagem,
+                                    parse_mode='HTML',
+                                    reply_markup=reply_markup)
 
 
 # Funções de callback para configurações
@@ -2693,59 +3150,18 @@ async def config_callback(update, context):
 
     data = query.data
 
-    if data == "config_refresh":
-        # Atualizar as configurações
+    if data in ("config_refresh", "config_cancel"):
+        # "Atualizar" e o cancelar das telas de edição redesenham /config;
+        # só o "Atualizar" relê do banco (alterações feitas fora do bot)
+        if data == "config_refresh":
+            invalidar_cache_configuracoes()
         try:
-            from database import DatabaseManager
-            db = DatabaseManager()
-            config = db.get_configuracoes()
+            config = await db_call(obter_configuracoes_cache)
 
             if config:
-                empresa = escapar_html(config['empresa_nome'])
-                pix_key = escapar_html(config['pix_key'])
-                suporte = escapar_html(config['contato_suporte'])
-
-                mensagem = f"""⚙️ <b>Configurações Atuais</b>
-
-🏢 <b>Empresa:</b> {empresa}
-💳 <b>PIX:</b> {pix_key}
-📞 <b>Suporte:</b> {suporte}"""
-
-                keyboard = [
-                    [
-                        InlineKeyboardButton("🏢 Alterar Empresa",
-                                             callback_data="config_empresa")
-                    ],
-                    [
-                        InlineKeyboardButton("💳 Alterar PIX",
-                                             callback_data="config_pix")
-                    ],
-                    [
-                        InlineKeyboardButton("📞 Alterar Suporte",
-                                             callback_data="config_suporte")
-                    ],
-                    [
-                        InlineKeyboardButton("📱 Status WhatsApp",
-                                             callback_data="whatsapp_status")
-                    ],
-                    [
-                        InlineKeyboardButton("🧪 Testar WhatsApp",
-                                             callback_data="whatsapp_test")
-                    ],
-                    [
-                        InlineKeyboardButton("⚙️ Gerenciar Instância",
-                                             callback_data="whatsapp_instance")
-                    ],
-                    [
-                        InlineKeyboardButton("🔄 Atualizar",
-                                             callback_data="config_refresh")
-                    ]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-
-                await query.edit_message_text(text=mensagem,
+                await query.edit_message_text(text=_texto_configuracoes(config),
                                               parse_mode='HTML',
-                                              reply_markup=reply_markup)
+                                              reply_markup=_MARKUP_CONFIG_COMPLETO)
             else:
                 await query.edit_message_text("❌ Nenhuma configuração encontrada!")
 
@@ -2759,6 +3175,16 @@ async def config_callback(update, context):
                 await context.bot.send_message(
                     chat_id=query.message.chat_id,
                     text="❌ Erro ao carregar configurações!")
+        # Encerra a conversa aberta por iniciar_config_* (cancelar inline)
+        return ConversationHandler.END
+
+    # Callbacks de templates com id: um único match já separa ação e id
+    m = _CONFIG_TEMPLATE_ID_RE.fullmatch(data)
+    if m:
+        handler = _CONFIG_TEMPLATE_ID[m['acao']]
+        if isinstance(handler, str):
+            handler = getattr(_modulo_callbacks_templates(), handler)
+        await handler(query, context, int(m['id']))
 
     elif data == "config_empresa":
         return await iniciar_config_empresa(query, context)
@@ -2785,36 +3211,19 @@ async def config_callback(update, context):
 
     # Templates System callbacks
     elif data == "templates_listar":
-        from callbacks_templates import callback_templates_listar
-        await callback_templates_listar(query, context)
+        await _modulo_callbacks_templates().callback_templates_listar(
+            query, context)
     elif data == "templates_editar":
-        from callbacks_templates import callback_templates_editar
-        await callback_templates_editar(query, context)
+        await _modulo_callbacks_templates().callback_templates_editar(
+            query, context)
     elif data == "templates_testar":
-        from callbacks_templates import callback_templates_testar
-        await callback_templates_testar(query, context)
+        await _modulo_callbacks_templates().callback_templates_testar(
+            query, context)
     elif data == "template_ver":
-        from callbacks_templates import callback_templates_ver
-        await callback_templates_ver(query, context)
-    elif data.startswith("template_mostrar_"):
-        template_id = int(data.split("_")[2])
-        from callbacks_templates import callback_template_mostrar
-        await callback_template_mostrar(query, context, template_id)
-    elif data.startswith("template_testar_"):
-        template_id = int(data.split("_")[2])
-        from callbacks_templates import callback_template_testar
-        await callback_template_testar(query, context, template_id)
+        await _modulo_callbacks_templates().callback_templates_ver(
+            query, context)
     elif data == "template_criar":
         await callback_template_criar(query, context)
-    elif data.startswith("template_toggle_"):
-        template_id = int(data.split("_")[2])
-        await callback_template_toggle(query, context, template_id)
-    elif data.startswith("template_excluir_"):
-        template_id = int(data.split("_")[2])
-        await callback_template_excluir(query, context, template_id)
-    elif data.startswith("confirmar_excluir_template_"):
-        template_id = int(data.split("_")[3])
-        await callback_confirmar_excluir_template(query, context, template_id)
     elif data == "template_excluir_escolher":
         await callback_template_excluir_escolher(query, context)
     elif data == "template_editar_escolher":
@@ -2824,14 +3233,28 @@ async def config_callback(update, context):
 
     # Scheduler System callbacks
     elif data == "agendador_executar":
-        from callbacks_templates import callback_agendador_executar
-        await callback_agendador_executar(query, context)
+        await _modulo_callbacks_templates().callback_agendador_executar(
+            query, context)
     elif data == "agendador_stats":
-        from callbacks_templates import callback_agendador_stats
-        await callback_agendador_stats(query, context)
+        await _modulo_callbacks_templates().callback_agendador_stats(
+            query, context)
     elif data == "agendador_config":
-        from callbacks_templates import callback_agendador_config
-        await callback_agendador_config(query, context)
+        await _modulo_callbacks_templates().callback_agendador_config(
+            query, context)
+
+
+# Cancelar inline das telas de configuração (volta para /config)
+_MARKUP_CONFIG_CANCELAR = InlineKeyboardMarkup([[
+    InlineKeyboardButton("❌ Cancelar", callback_data="config_cancel")
+]])
+
+
+async def _pedir_config(query, mensagem):
+    """Troca a tela de configurações pelo pedido do novo valor"""
+    # Uma única edição em vez de apagar a mensagem e enviar outra
+    await query.edit_message_text(text=mensagem,
+                                  parse_mode='HTML',
+                                  reply_markup=_MARKUP_CONFIG_CANCELAR)
 
 
 async def iniciar_config_empresa(query, context):
@@ -2841,16 +3264,7 @@ async def iniciar_config_empresa(query, context):
 Digite o nome da sua empresa:
 <i>Ex: IPTV Premium Brasil</i>"""
 
-    keyboard = [[KeyboardButton("❌ Cancelar")]]
-    reply_markup = ReplyKeyboardMarkup(keyboard,
-                                       resize_keyboard=True,
-                                       one_time_keyboard=True)
-
-    await query.delete_message()
-    await context.bot.send_message(chat_id=query.message.chat_id,
-                                   text=mensagem,
-                                   parse_mode='HTML',
-                                   reply_markup=reply_markup)
+    await _pedir_config(query, mensagem)
 
     return CONFIG_EMPRESA
 
@@ -2862,16 +3276,7 @@ async def iniciar_config_pix(query, context):
 Digite sua chave PIX:
 <i>Ex: empresa@email.com ou 11999887766</i>"""
 
-    keyboard = [[KeyboardButton("❌ Cancelar")]]
-    reply_markup = ReplyKeyboardMarkup(keyboard,
-                                       resize_keyboard=True,
-                                       one_time_keyboard=True)
-
-    await query.delete_message()
-    await context.bot.send_message(chat_id=query.message.chat_id,
-                                   text=mensagem,
-                                   parse_mode='HTML',
-                                   reply_markup=reply_markup)
+    await _pedir_config(query, mensagem)
 
     return CONFIG_PIX
 
@@ -2883,115 +3288,85 @@ async def iniciar_config_suporte(query, context):
 Digite o contato para suporte:
 <i>Ex: @seu_usuario ou 11999887766</i>"""
 
-    keyboard = [[KeyboardButton("❌ Cancelar")]]
-    reply_markup = ReplyKeyboardMarkup(keyboard,
-                                       resize_keyboard=True,
-                                       one_time_keyboard=True)
-
-    await query.delete_message()
-    await context.bot.send_message(chat_id=query.message.chat_id,
-                                   text=mensagem,
-                                   parse_mode='HTML',
-                                   reply_markup=reply_markup)
+    await _pedir_config(query, mensagem)
 
     return CONFIG_SUPORTE
 
 
 # === CALLBACKS DE TEMPLATES ===
 
+
+@tratar_erros("❌ Erro ao mostrar instruções de criação",
+              _MARKUP_VOLTAR_TEMPLATES)
 async def callback_template_criar(query, context):
     """Callback para criar novo template"""
-    try:
-        from callbacks_templates import callback_templates_criar
-        await callback_templates_criar(query, context)
-    except Exception as e:
-        logger.error(f"Erro no callback criar template: {e}")
-        await query.edit_message_text(
-            "❌ Erro ao mostrar instruções de criação",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
-            ]])
-        )
+    await _callbacks_templates()["template_criar"](query, context)
 
+
+@tratar_erros("❌ Erro ao alterar status do template!",
+              _MARKUP_VOLTAR_TEMPLATE_VER)
 async def callback_template_toggle(query, context, template_id):
     """Callback para ativar/desativar template"""
-    try:
-        from database import DatabaseManager
-        db = DatabaseManager()
+    db = get_db()
 
-        # Buscar template no banco de dados
-        templates = db.listar_templates(apenas_ativos=False)
-        template = next((t for t in templates if t['id'] == template_id), None)
+    # Buscar template no banco de dados
+    template = await db_call(obter_template_cache, template_id)
 
-        if not template:
-            await query.edit_message_text(
-                "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
-                "O template pode ter sido excluído.",
-                parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
-                ]])
-            )
-            return
+    if not template:
+        await query.edit_message_text(
+            "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
+            "O template pode ter sido excluído.",
+            parse_mode='Markdown',
+            reply_markup=_MARKUP_MENU_TEMPLATES
+        )
+        return
 
-        # Inverter status
-        novo_status = 0 if template['ativo'] == 1 else 1
+    # Inverter status
+    novo_status = 0 if template['ativo'] == 1 else 1
 
-        try:
-            db.atualizar_template(template_id, ativo=novo_status)
-            status_text = "ativado" if novo_status else "desativado"
-            mensagem = f"""✅ **Template {status_text.title()}!**
+    try:
+        await db_call(db.atualizar_template, template_id, ativo=novo_status)
+        invalidar_cache_templates()
+        status_text = "ativado" if novo_status else "desativado"
+        mensagem = f"""✅ **Template {status_text.title()}!**
 
 📝 **Template:** {template['nome']}
 🆔 **ID:** {template_id}
 📊 **Novo Status:** {"✅ Ativo" if novo_status else "❌ Inativo"}"""
-        except Exception as e:
-            logger.error(f"Erro ao alterar status do template: {e}")
-            mensagem = "❌ Erro ao alterar status do template."
-
-        keyboard = [[
-            InlineKeyboardButton("👁️ Ver Template", callback_data=f"template_mostrar_{template_id}"),
-            InlineKeyboardButton("⬅️ Voltar", callback_data="template_ver")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await query.edit_message_text(
-            text=mensagem,
-            parse_mode='HTML',
-            reply_markup=reply_markup
-        )
-
     except Exception as e:
         logger.error(f"Erro ao alterar status do template: {e}")
-        await query.edit_message_text(
-            "❌ Erro ao alterar status do template!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Voltar", callback_data="template_ver")
-            ]])
-        )
+        mensagem = "❌ Erro ao alterar status do template."
 
-async def callback_template_excluir(query, context, template_id):
-    """Callback para confirmar exclusão de template"""
-    try:
-        from database import DatabaseManager
-        db = DatabaseManager()
+    keyboard = [[
+        InlineKeyboardButton("👁️ Ver Template", callback_data=f"template_mostrar_{template_id}"),
+        InlineKeyboardButton("⬅️ Voltar", callback_data="template_ver")
+    ]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-        # Buscar template no banco de dados
-        templates = db.listar_templates(apenas_ativos=False)
-        template = next((t for t in templates if t['id'] == template_id), None)
+    await query.edit_message_text(
+        text=mensagem,
+        parse_mode='HTML',
+        reply_markup=reply_markup
+    )
 
-        if not template:
-            await query.edit_message_text(
-                "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
-                "O template pode ter sido excluído.",
-                parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
-                ]])
-            )
-            return
 
-        mensagem = f"""🗑️ **EXCLUIR TEMPLATE**
+@tratar_erros("❌ Erro ao preparar exclusão do template!",
+              _MARKUP_VOLTAR_TEMPLATE_VER)
+async def callback_template_excluir(query, context, template_id):
+    """Callback para confirmar exclusão de template"""
+    # Buscar template (cache curto indexado por id)
+    template = await db_call(obter_template_cache, template_id)
+
+    if not template:
+        await query.edit_message_text(
+            "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
+            "O template pode ter sido excluído.",
+            parse_mode='Markdown',
+            reply_markup=_MARKUP_MENU_TEMPLATES
+        )
+        return
+
+    mensagem = f"""🗑️ **EXCLUIR TEMPLATE**
 
 ⚠️ **ATENÇÃO: Esta ação não pode ser desfeita!**
 
@@ -3002,209 +3377,153 @@ async def callback_template_excluir(query, context, template_id):
 
 Tem certeza que deseja excluir este template permanentemente?"""
 
-        keyboard = [[
-            InlineKeyboardButton("🗑️ SIM, EXCLUIR", callback_data=f"confirmar_excluir_template_{template_id}"),
-            InlineKeyboardButton("❌ Cancelar", callback_data=f"template_mostrar_{template_id}")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    keyboard = [[
+        InlineKeyboardButton("🗑️ SIM, EXCLUIR", callback_data=f"confirmar_excluir_template_{template_id}"),
+        InlineKeyboardButton("❌ Cancelar", callback_data=f"template_mostrar_{template_id}")
+    ]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(
-            text=mensagem,
-            parse_mode='HTML',
-            reply_markup=reply_markup
-        )
+    await query.edit_message_text(
+        text=mensagem,
+        parse_mode='HTML',
+        reply_markup=reply_markup
+    )
 
-    except Exception as e:
-        logger.error(f"Erro ao preparar exclusão: {e}")
-        await query.edit_message_text(
-            "❌ Erro ao preparar exclusão do template!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Voltar", callback_data="template_ver")
-            ]])
-        )
 
+@tratar_erros("❌ Erro interno ao excluir template!", _MARKUP_VER_TEMPLATES)
 async def callback_confirmar_excluir_template(query, context, template_id):
     """Callback para confirmar e executar exclusão de template"""
-    try:
-        from database import DatabaseManager
-        db = DatabaseManager()
+    db = get_db()
 
-        # Buscar template no banco
-        templates = db.listar_templates(apenas_ativos=False)
-        template = next((t for t in templates if t['id'] == template_id), None)
+    # Buscar template no banco
+    template = await db_call(obter_template_cache, template_id)
 
-        if not template:
-            await query.edit_message_text(
-                "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
-                "O template pode ter sido excluído.",
-                parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
-                ]])
-            )
-            return
+    if not template:
+        await query.edit_message_text(
+            "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
+            "O template pode ter sido excluído.",
+            parse_mode='Markdown',
+            reply_markup=_MARKUP_MENU_TEMPLATES
+        )
+        return
 
-        nome_template = template['nome']
+    nome_template = template['nome']
 
-        # Executar exclusão
-        try:
-            db.excluir_template(template_id)
-            sucesso = True
-        except Exception as e:
-            logger.error(f"Erro ao excluir template: {e}")
-            sucesso = False
+    # Executar exclusão
+    try:
+        await db_call(db.excluir_template, template_id)
+        invalidar_cache_templates()
+        sucesso = True
+    except Exception as e:
+        logger.error(f"Erro ao excluir template: {e}")
+        sucesso = False
 
-        if sucesso:
-            mensagem = f"""✅ <b>TEMPLATE EXCLUÍDO</b>
+    if sucesso:
+        mensagem = f"""✅ <b>TEMPLATE EXCLUÍDO</b>
 
 📝 <b>Template:</b> {nome_template}
 🆔 <b>ID:</b> {template_id}
 🗑️ <b>Excluído em:</b> {agora_br().strftime('%d/%m/%Y às %H:%M')}
 
 O template foi permanentemente removido do sistema."""
-        else:
-            mensagem = f"""❌ <b>ERRO AO EXCLUIR</b>
+    else:
+        mensagem = f"""❌ <b>ERRO AO EXCLUIR</b>
 
 Não foi possível excluir o template {nome_template}.
 Tente novamente mais tarde."""
 
-        keyboard = [[
-            InlineKeyboardButton("📋 Ver Templates", callback_data="templates_listar"),
-            InlineKeyboardButton("⬅️ Menu Templates", callback_data="menu_principal")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    keyboard = [[
+        InlineKeyboardButton("📋 Ver Templates", callback_data="templates_listar"),
+        InlineKeyboardButton("⬅️ Menu Templates", callback_data="menu_principal")
+    ]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await query.edit_message_text(
-            text=mensagem,
-            parse_mode='HTML',
-            reply_markup=reply_markup
-        )
+    await query.edit_message_text(
+        text=mensagem,
+        parse_mode='HTML',
+        reply_markup=reply_markup
+    )
 
-    except Exception as e:
-        logger.error(f"Erro ao excluir template: {e}")
-        await query.edit_message_text(
-            "❌ Erro interno ao excluir template!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("📋 Ver Templates", callback_data="templates_listar")
-            ]])
-        )
 
+@tratar_erros("❌ Erro ao carregar templates para exclusão",
+              _MARKUP_VOLTAR_TEMPLATES)
 async def callback_template_excluir_escolher(query, context):
     """Callback para escolher template para excluir"""
-    try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        templates = db.listar_templates(apenas_ativos=False)
+    templates = await db_call(listar_templates_cache, apenas_ativos=False)
 
-        if not templates:
-            await query.edit_message_text(
-                "❌ Nenhum template encontrado para excluir.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
-                ]])
-            )
-            return
+    if not templates:
+        await query.edit_message_text(
+            "❌ Nenhum template encontrado para excluir.",
+            reply_markup=_MARKUP_VOLTAR_TEMPLATES
+        )
+        return
 
-        mensagem = """🗑️ <b>EXCLUIR TEMPLATE</b>
+    mensagem = """🗑️ <b>EXCLUIR TEMPLATE</b>
 
 Escolha um template para excluir:
 
 ⚠️ <b>ATENÇÃO:</b> Esta ação é permanente!"""
 
-        keyboard = []
-        for template in templates[:10]:
-            status_icon = "✅" if template['ativo'] else "❌"
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"{status_icon} {template['nome']}",
-                    callback_data=f"template_excluir_{template['id']}"
-                )
-            ])
-
+    keyboard = []
+    for template in templates[:10]:
+        status_icon = "✅" if template['ativo'] else "❌"
         keyboard.append([
-            InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
+            InlineKeyboardButton(
+                f"{status_icon} {template['nome']}",
+                callback_data=f"template_excluir_{template['id']}"
+            )
         ])
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    keyboard.append([
+        InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
+    ])
 
-        await query.edit_message_text(
-            text=mensagem,
-            parse_mode='HTML',
-            reply_markup=reply_markup
-        )
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    except Exception as e:
-        logger.error(f"Erro ao mostrar lista de exclusão: {e}")
-        await query.edit_message_text(
-            "❌ Erro ao carregar templates para exclusão",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
-            ]])
-        )
+    await query.edit_message_text(
+        text=mensagem,
+        parse_mode='HTML',
+        reply_markup=reply_markup
+    )
 
+
+@tratar_erros("❌ Erro ao carregar opções de edição", _MARKUP_VOLTAR_TEMPLATES)
 async def callback_template_editar_escolher(query, context):
     """Callback para escolher template para editar"""
-    try:
-        mensagem = """✏️ <b>EDITAR TEMPLATES</b>
-
-Para editar templates, use os comandos:
+    await _TELA_EDITAR_TEMPLATES.mostrar(query)
 
-<code>/template_editar [ID] [campo] [novo_valor]</code>
-
-<b>Campos disponíveis:</b>
-• <code>titulo</code> - Título do template
-• <code>conteudo</code> - Conteúdo do template
-• <code>tipo</code> - Tipo do template
-• <code>descricao</code> - Descrição do template
-• <code>ativo</code> - true/false para ativar/desativar
 
-<b>Exemplo:</b>
-<code>/template_editar 1 titulo "Novo Título"</code>
-
-Ou use os botões de visualização para editar templates específicos."""
-
-        keyboard = [[
-            InlineKeyboardButton("👁️ Ver Templates", callback_data="template_ver"),
-            InlineKeyboardButton("📋 Listar Todos", callback_data="templates_listar")
-        ], [
-            InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
-        ]]
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
+# Callbacks "<acao>_<template_id>" do config_callback; nomes em texto são
+# resolvidos no módulo callbacks_templates
+_CONFIG_TEMPLATE_ID_RE = re.compile(
+    r'(?P<acao>template_(?:mostrar|testar|toggle|excluir)'
+    r'|confirmar_excluir_template)_(?P<id>\d+)')
+_CONFIG_TEMPLATE_ID = {
+    "template_mostrar": "callback_template_mostrar",
+    "template_testar": "callback_template_testar",
+    "template_toggle": callback_template_toggle,
+    "template_excluir": callback_template_excluir,
+    "confirmar_excluir_template": callback_confirmar_excluir_template,
+}
 
-        await query.edit_message_text(
-            text=mensagem,
-            parse_mode='HTML',
-            reply_markup=reply_markup
-        )
+# Callbacks que só o config_callback trata (os demais já têm handler antes)
+_PADRAO_CONFIG_CALLBACK = (
+    r'^(?:whatsapp_|instance_|show_qrcode$|templates_(?:editar|testar)$'
+    r'|menu_principal$|template_toggle_\d+$|confirmar_excluir_template_\d+$)')
 
-    except Exception as e:
-        logger.error(f"Erro ao mostrar opções de edição: {e}")
-        await query.edit_message_text(
-            "❌ Erro ao carregar opções de edição",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Voltar", callback_data="templates_listar")
-            ]])
-        )
 
 async def iniciar_edicao_template_db(query, context, template_id):
     """Inicia edição interativa de template do banco de dados"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-
-        # Buscar template no banco
-        templates = db.listar_templates(apenas_ativos=False)
-        template = next((t for t in templates if t['id'] == template_id), None)
+        # Buscar template (cache curto indexado por id)
+        template = await db_call(obter_template_cache, template_id)
 
         if not template:
             await query.edit_message_text(
                 "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
                 "O template pode ter sido excluído.",
                 parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
-                ]])
+                reply_markup=_MARKUP_MENU_TEMPLATES
             )
             return
 
@@ -3247,25 +3566,19 @@ async def iniciar_edicao_template_db(query, context, template_id):
         logger.error(f"Erro ao iniciar edição de template {template_id}: {e}")
         await query.edit_message_text(
             "❌ Erro ao iniciar edição!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
-            ]])
+            reply_markup=_MARKUP_MENU_TEMPLATES
         )
 
 # Funções básicas para templates
 async def mostrar_template_individual_basic(query, context, template_id):
     """Mostra template individual de forma básica"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        template = db.obter_template(template_id)
+        template = await db_call(obter_template_cache, template_id)
         
         if not template:
             await query.edit_message_text(
                 "❌ Template não encontrado",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_templates")
-                ]])
+                reply_markup=_MARKUP_VOLTAR_MENU_TEMPLATES
             )
             return
         
@@ -3303,9 +3616,7 @@ async def mostrar_template_individual_basic(query, context, template_id):
 async def callback_template_editar_basic(query, context, template_id):
     """Callback básico para editar template"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-        template = db.obter_template(template_id)
+        template = await db_call(obter_template_cache, template_id)
         
         if not template:
             await query.edit_message_text("❌ Template não encontrado")
@@ -3349,60 +3660,17 @@ Para editar este template, use os comandos:
 async def callback_template_criar_basic(query, context):
     """Callback básico para criar template"""
     try:
-        mensagem = """➕ **CRIAR NOVO TEMPLATE**
-
-Para criar um template, use o comando:
-
-`/template_novo "Nome" tipo "Descrição"`
-
-**Tipos disponíveis:**
-• `boas_vindas` - Mensagem de boas-vindas
-• `aviso_vencimento` - Avisos de vencimento  
-• `renovacao` - Confirmação de renovação
-• `cobranca` - Cobrança de vencidos
-• `sistema` - Templates do sistema
-
-**Exemplo:**
-`/template_novo "Lembrete Vencimento" aviso_vencimento "Template para avisar sobre vencimento"`
-
-**Variáveis disponíveis:**
-• `{nome}` - Nome do cliente
-• `{telefone}` - Telefone do cliente  
-• `{pacote}` - Pacote/plano do cliente
-• `{valor}` - Valor do plano
-• `{servidor}` - Servidor/login
-• `{vencimento}` - Data de vencimento"""
-
-        keyboard = [[
-            InlineKeyboardButton("📋 Ver Templates", callback_data="voltar_templates"),
-            InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_templates")
-        ]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await query.edit_message_text(
-            mensagem,
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
+        await _TELA_CRIAR_TEMPLATE.mostrar(query)
 
     except Exception as e:
         logger.error(f"Erro ao mostrar criação: {e}")
         await query.edit_message_text("❌ Erro ao carregar criação")
 
+
 async def callback_template_testar_basic(query, context):
     """Callback básico para testar template"""
-    await query.edit_message_text(
-        "🧪 **TESTAR TEMPLATE**\n\n"
-        "Para testar um template, use:\n"
-        "`/template_testar [ID]`\n\n"
-        "**Exemplo:**\n"
-        "`/template_testar 1`\n\n"
-        "O teste será feito com dados de exemplo.",
-        parse_mode='Markdown',
-        reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton("⬅️ Voltar", callback_data="voltar_templates")
-        ]])
-    )
+    await _TELA_TESTAR_TEMPLATE_ID.mostrar(query)
+
 
 async def callback_templates_handler(update, context):
     """Handler para callbacks de templates"""
@@ -3412,66 +3680,58 @@ async def callback_templates_handler(update, context):
     try:
         data = query.data
 
-        if data == "template_novo":
-            await callback_template_criar_basic(query, context)
+        handler = _CALLBACKS_TEMPLATES_EXATOS.get(data)
+        if handler is not None:
+            await handler(query, context)
+            return
 
-        elif data == "template_testar":
-            await query.edit_message_text(
-                "🧪 *TESTAR TEMPLATE*\n\n"
-                "Para testar um template, use:\n"
-                "`/template_testar nome_template`\n\n"
-                "*Exemplo:*\n"
-                "`/template_testar boas_vindas`\n\n"
-                "O teste será feito com dados de exemplo.",
-                parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
-                ]])
-            )
+        # Callbacks "<prefixo>_<parâmetro>": um único match separa os dois
+        m = _CALLBACKS_TEMPLATES_RE.fullmatch(data)
+        if m is None:
+            return
+        prefixo, parametro = m.groups()
+        entrada = _CALLBACKS_TEMPLATES_PREFIXO[prefixo]
+        if entrada is None:
+            # template_editar_ é capturado pelo ConversationHandler
+            # template_edit_handler
+            return
+        handler, converter = entrada
+        await handler(query, context, converter(parametro))
 
-        elif data.startswith("template_ver_db_"):
-            # Visualizar template do banco de dados
-            template_id = int(data.split("_")[2])
-            await mostrar_template_db(query, context, template_id)
+    except Exception as e:
+        logger.error(f"Erro no callback de templates: {e}")
+        await query.edit_message_text("❌ Erro ao processar template!")
 
-        elif data.startswith("template_ver_"):
-            nome_template = data.replace("template_ver_", "")
-            await mostrar_template(query, context, nome_template)
 
-        elif data.startswith("template_teste_"):
-            nome_template = data.replace("template_teste_", "")
-            await testar_template(query, context, nome_template)
+async def _instrucoes_testar_template(query, context):
+    """Instruções do comando /template_testar"""
+    await _TELA_TESTAR_TEMPLATE.mostrar(query)
 
-        elif data.startswith("template_editar_db_"):
-            # Editar template do banco de dados - CORREÇÃO FINAL
-            template_id = int(data.split("_")[2])
 
-            # Buscar template no banco
-            from database import DatabaseManager
-            db = DatabaseManager()
-            template = db.obter_template(template_id)
+async def _editar_template_db(query, context, template_id):
+    """Coloca um template do banco em modo de edição (template_editar_db_<id>)"""
+    # Buscar template no banco
+    template = await db_call(obter_template_cache, template_id)
 
-            if not template:
-                await query.edit_message_text(
-                    "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
-                    f"Template com ID {template_id} não existe no banco de dados.",
-                    parse_mode='Markdown',
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
-                    ]])
-                )
-                return
+    if not template:
+        await query.edit_message_text(
+            "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
+            f"Template com ID {template_id} não existe no banco de dados.",
+            parse_mode='Markdown',
+            reply_markup=_MARKUP_MENU_TEMPLATES
+        )
+        return
 
-            # SOLUÇÃO: Salvar no contexto com chave específica para usuário
-            user_id = query.from_user.id
-            context.user_data[f'editando_template_id_{user_id}'] = template_id
-            context.user_data[f'template_original_{user_id}'] = template
-            context.user_data['aguardando_edicao'] = True
+    # SOLUÇÃO: Salvar no contexto com chave específica para usuário
+    user_id = query.from_user.id
+    context.user_data[f'editando_template_id_{user_id}'] = template_id
+    context.user_data[f'template_original_{user_id}'] = template
+    context.user_data['aguardando_edicao'] = True
 
-            # Conteúdo truncado para exibição
-            conteudo_preview = template['conteudo'][:200] + "..." if len(template['conteudo']) > 200 else template['conteudo']
+    # Conteúdo truncado para exibição
+    conteudo_preview = template['conteudo'][:200] + "..." if len(template['conteudo']) > 200 else template['conteudo']
 
-            mensagem = f"""✏️ **MODO EDIÇÃO ATIVO**
+    mensagem = f"""✏️ **MODO EDIÇÃO ATIVO**
 
 📝 **Template:** {template['nome']}
 🆔 **ID:** {template['id']}
@@ -3490,111 +3750,18 @@ async def callback_templates_handler(update, context):
 
 **Digite /cancel para cancelar a edição**"""
 
-            await query.edit_message_text(
-                mensagem,
-                parse_mode='Markdown'
-            )
-            return
-
-        elif data.startswith("template_editar_"):
-            # Esta função é capturada pelo ConversationHandler template_edit_handler
-            pass
-
-        elif data.startswith("template_excluir_"):
-            nome_template = data.replace("template_excluir_", "")
-            await confirmar_exclusao_template(query, context, nome_template)
-
-        elif data.startswith("template_confirmar_exclusao_"):
-            nome_template = data.replace("template_confirmar_exclusao_", "")
-            await executar_exclusao_template(query, context, nome_template)
-
-        elif data.startswith("template_duplicar_"):
-            nome_template = data.replace("template_duplicar_", "")
-            await duplicar_template(query, context, nome_template)
-
-        elif data == "voltar_menu":
-            # Voltar ao menu principal do bot
-            await query.edit_message_text(
-                "🤖 *BOT DE GESTÃO DE CLIENTES*\n\n"
-                "Escolha uma opção abaixo:",
-                parse_mode='Markdown',
-                reply_markup=criar_teclado_principal()
-            )
-
-        elif data == "voltar_templates":
-            # Recarregar templates do banco de dados
-            from database import DatabaseManager
-            db = DatabaseManager()
-            templates = db.listar_templates(apenas_ativos=True)
-
-            mensagem = f"📄 *SISTEMA DE TEMPLATES*\n\n"
-            mensagem += f"📊 Templates disponíveis: {len(templates)}\n\n"
-
-            keyboard = []
-
-            for template in templates:
-                template_id = template['id']
-                nome_display = template['nome'][:20] + ('...' if len(template['nome']) > 20 else '')
-
-                keyboard.append([
-                    InlineKeyboardButton(f"📝 {nome_display}",
-                                       callback_data=f"template_mostrar_{template_id}"),
-                    InlineKeyboardButton("✏️ Editar",
-                                       callback_data=f"template_editar_{template_id}")
-                ])
-
-            keyboard.append([
-                InlineKeyboardButton("➕ Novo Template", callback_data="template_criar"),
-                InlineKeyboardButton("🧪 Testar Template", callback_data="template_testar")
-            ])
-            keyboard.append([
-                InlineKeyboardButton("⬅️ Menu Principal", callback_data="voltar_menu")
-            ])
-
-            if not templates:
-                mensagem += "📭 **Nenhum template encontrado**\n\n"
-                mensagem += "Crie seu primeiro template."
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await query.edit_message_text(
-                mensagem,
-                parse_mode='Markdown',
-                reply_markup=reply_markup
-            )
-
-    except Exception as e:
-        logger.error(f"Erro no callback de templates: {e}")
-        await query.edit_message_text("❌ Erro ao processar template!")
+    await query.edit_message_text(
+        mensagem,
+        parse_mode='Markdown'
+    )
 
 
 async def mostrar_template(query, context, nome_template):
     """Mostra detalhes de um template específico"""
     try:
-        # Templates padrão
-        templates_padrao = {
-            'boas_vindas': {
-                'titulo': 'Mensagem de Boas-vindas',
-                'conteudo': 'Olá {nome}! 👋\n\nSeja bem-vindo ao nosso serviço!\n\n📦 Seu pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nQualquer dúvida, estamos aqui para ajudar!',
-                'tipo': 'Padrão'
-            },
-            'cobranca': {
-                'titulo': 'Cobrança de Renovação',
-                'conteudo': '⚠️ ATENÇÃO {nome}!\n\nSeu plano vence em breve:\n\n📦 Pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nRenove agora para não perder o acesso!',
-                'tipo': 'Padrão'
-            },
-            'vencido': {
-                'titulo': 'Plano Vencido',
-                'conteudo': '🔴 PLANO VENCIDO - {nome}\n\nSeu plano venceu em {vencimento}.\n\n📦 Pacote: {pacote}\n💰 Valor para renovação: R$ {valor}\n\nRenove urgentemente para reativar o serviço!',
-                'tipo': 'Padrão'
-            }
-        }
-
-        # Buscar template no banco de dados
-        from database import DatabaseManager
-        db = DatabaseManager()
-        templates = db.listar_templates(apenas_ativos=False)
-        template_db = next((t for t in templates if t['nome'].lower() == nome_template.lower()), None)
+        # Buscar template no banco de dados (índice por nome do cache)
+        template_db = await db_call(obter_template_por_nome_cache,
+                                    nome_template)
 
         if template_db:
             template = {
@@ -3602,16 +3769,14 @@ async def mostrar_template(query, context, nome_template):
                 'conteudo': template_db['conteudo'],
                 'tipo': 'Banco de Dados'
             }
-        elif nome_template in templates_padrao:
-            template = templates_padrao[nome_template]
+        elif nome_template in _TEMPLATES_PADRAO:
+            template = _TEMPLATES_PADRAO[nome_template]
         else:
             await query.edit_message_text(
                 "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
                 "Verifique se o nome está correto.",
                 parse_mode='Markdown',
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Menu Templates", callback_data="voltar_templates")
-                ]])
+                reply_markup=_MARKUP_MENU_TEMPLATES
             )
             return
 
@@ -3635,15 +3800,12 @@ async def mostrar_template(query, context, nome_template):
             keyboard = [
                 [InlineKeyboardButton("✏️ Editar", callback_data=f"template_editar_{nome_template}"),
                  InlineKeyboardButton("🧪 Testar", callback_data=f"template_teste_{nome_template}")],
-                [InlineKeyboardButton("📋 Duplicar", callback_data=f"template_duplicar_{nome_template}")],
                 [InlineKeyboardButton("⬅️ Voltar Templates", callback_data="voltar_templates")]
             ]
         else:
             keyboard = [
                 [InlineKeyboardButton("✏️ Editar", callback_data=f"template_editar_{nome_template}"),
                  InlineKeyboardButton("🧪 Testar", callback_data=f"template_teste_{nome_template}")],
-                [InlineKeyboardButton("📋 Duplicar", callback_data=f"template_duplicar_{nome_template}"),
-                 InlineKeyboardButton("🗑️ Excluir", callback_data=f"template_excluir_{nome_template}")],
                 [InlineKeyboardButton("⬅️ Voltar Templates", callback_data="voltar_templates")]
             ]
 
@@ -3661,16 +3823,9 @@ async def mostrar_template(query, context, nome_template):
 async def testar_template(query, context, nome_template):
     """Testa um template com dados de exemplo"""
     try:
-        # Templates padrão
-        templates_padrao = {
-            'boas_vindas': 'Olá {nome}! 👋\n\nSeja bem-vindo ao nosso serviço!\n\n📦 Seu pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nQualquer dúvida, estamos aqui para ajudar!',
-            'cobranca': '⚠️ ATENÇÃO {nome}!\n\nSeu plano vence em breve:\n\n📦 Pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nRenove agora para não perder o acesso!',
-            'vencido': '🔴 PLANO VENCIDO - {nome}\n\nSeu plano venceu em {vencimento}.\n\n📦 Pacote: {pacote}\n💰 Valor para renovação: R$ {valor}\n\nRenove urgentemente para reativar o serviço!'
-        }
-
         # Verificar se é template padrão ou
-        if nome_template in templates_padrao:
-            template_conteudo = templates_padrao[nome_template]
+        if nome_template in _TEMPLATES_PADRAO:
+            template_conteudo = _TEMPLATES_PADRAO[nome_template]['conteudo']
         elif nome_template in templates_personalizados:
             template_conteudo = templates_personalizados[nome_template]['conteudo']
         else:
@@ -3702,9 +3857,7 @@ async def testar_template(query, context, nome_template):
         mensagem += f"• Servidor: {dados_exemplo['servidor']}"
 
         keyboard = [
-            [InlineKeyboardButton("✏️ Editar Template", callback_data=f"template_editar_{nome_template}"),
-             InlineKeyboardButton("📋 Duplicar", callback_data=f"template_duplicar_{nome_template}")],
-            [InlineKeyboardButton("🗑️ Excluir Template", callback_data=f"template_excluir_{nome_template}")],
+            [InlineKeyboardButton("✏️ Editar Template", callback_data=f"template_editar_{nome_template}")],
             [InlineKeyboardButton("⬅️ Voltar", callback_data=f"template_ver_{nome_template}")]
         ]
 
@@ -3719,25 +3872,31 @@ async def testar_template(query, context, nome_template):
         await query.edit_message_text("❌ Erro ao testar template!")
 
 
+# Callbacks de templates do callback_templates_handler sem parâmetros
+_CALLBACKS_TEMPLATES_EXATOS = {
+    "template_novo": callback_template_criar_basic,
+    "template_testar": _instrucoes_testar_template,
+    "voltar_menu": _voltar_menu,
+    "voltar_templates": _voltar_templates,
+}
+
+# Callbacks "<prefixo>_<parâmetro>" -> (handler, conversão do parâmetro)
+_CALLBACKS_TEMPLATES_PREFIXO = {
+    "template_ver": (mostrar_template, str),
+    "template_teste": (testar_template, str),
+    "template_editar_db": (_editar_template_db, int),
+    "template_editar": None,
+}
+# Prefixos mais longos primeiro (template_editar_db antes de template_editar)
+_CALLBACKS_TEMPLATES_RE = re.compile(
+    "(" + "|".join(sorted(_CALLBACKS_TEMPLATES_PREFIXO, key=len, reverse=True))
+    + ")_(.*)", re.DOTALL)
+
+
 async def iniciar_edicao_template(query, context, nome_template):
     """Inicia processo de edição de template"""
     try:
-        templates = {
-            'boas_vindas': {
-                'titulo': 'Mensagem de Boas-vindas',
-                'conteudo': 'Olá {nome}! 👋\n\nSeja bem-vindo ao nosso serviço!\n\n📦 Seu pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nQualquer dúvida, estamos aqui para ajudar!'
-            },
-            'cobranca': {
-                'titulo': 'Cobrança de Renovação',
-                'conteudo': '⚠️ ATENÇÃO {nome}!\n\nSeu plano vence em breve:\n\n📦 Pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nRenove agora para não perder o acesso!'
-            },
-            'vencido': {
-                'titulo': 'Plano Vencido',
-                'conteudo': '🔴 PLANO VENCIDO - {nome}\n\nSeu plano venceu em {vencimento}.\n\n📦 Pacote: {pacote}\n💰 Valor para renovação: R$ {valor}\n\nRenove urgentemente para reativar o serviço!'
-            }
-        }
-
-        template = templates.get(nome_template)
+        template = _TEMPLATES_PADRAO.get(nome_template)
         if not template:
             await query.edit_message_text("❌ Template não encontrado!")
             return
@@ -3754,8 +3913,7 @@ async def iniciar_edicao_template(query, context, nome_template):
         mensagem += "• `{valor}` • `{vencimento}` • `{servidor}`"
 
         keyboard = [
-            [InlineKeyboardButton("🧪 Testar Template", callback_data=f"template_teste_{nome_template}"),
-             InlineKeyboardButton("🗑️ Excluir Template", callback_data=f"template_excluir_{nome_template}")],
+            [InlineKeyboardButton("🧪 Testar Template", callback_data=f"template_teste_{nome_template}")],
             [InlineKeyboardButton("⬅️ Voltar", callback_data=f"template_ver_{nome_template}")]
         ]
 
@@ -3787,7 +3945,7 @@ async def processar_edicao_template(update, context):
         if not nome_template or not template_atual:
             await update.message.reply_text(
                 "❌ Erro: dados de edição perdidos.",
-                reply_markup=criar_teclado_principal()
+                reply_markup=TECLADO_PRINCIPAL
             )
             return ConversationHandler.END
 
@@ -3798,10 +3956,7 @@ async def processar_edicao_template(update, context):
             )
             return TEMPLATE_EDIT_CONTENT
 
-        # Templates padrão
-        templates_padrao = ['boas_vindas', 'cobranca', 'vencido']
-
-        if nome_template in templates_padrao:
+        if nome_template in _TEMPLATES_PADRAO:
             # Atualizar template padrão (simulado - em produção seria salvo no banco)
             mensagem_sucesso = f"✅ **TEMPLATE EDITADO COM SUCESSO**\n\n"
             mensagem_sucesso += f"**Template:** {template_atual['titulo']}\n"
@@ -3824,7 +3979,7 @@ async def processar_edicao_template(update, context):
             else:
                 await update.message.reply_text(
                     "❌ Template não encontrado!",
-                    reply_markup=criar_teclado_principal()
+                    reply_markup=TECLADO_PRINCIPAL
                 )
                 return ConversationHandler.END
 
@@ -3847,7 +4002,7 @@ async def processar_edicao_template(update, context):
         if not nome_template or not template_atual:
             await update.message.reply_text(
                 "❌ Erro: dados de edição perdidos.",
-                reply_markup=criar_teclado_principal()
+                reply_markup=TECLADO_PRINCIPAL
             )
             return ConversationHandler.END
 
@@ -3876,7 +4031,7 @@ async def processar_edicao_template(update, context):
         await update.message.reply_text(
             mensagem,
             parse_mode='Markdown',
-            reply_markup=criar_teclado_principal()
+            reply_markup=TECLADO_PRINCIPAL
         )
 
         # Limpar dados do contexto
@@ -3889,7 +4044,7 @@ async def processar_edicao_template(update, context):
         logger.error(f"Erro ao processar edição: {e}")
         await update.message.reply_text(
             "❌ Erro ao processar edição do template!",
-            reply_markup=criar_teclado_principal()
+            reply_markup=TECLADO_PRINCIPAL
         )
         return ConversationHandler.END
 
@@ -3902,7 +4057,7 @@ async def processar_edicao_template_db(update, context, novo_conteudo):
         if not template_id or not template_original:
             await update.message.reply_text(
                 "❌ Erro: dados da edição perdidos.",
-                reply_markup=criar_teclado_principal()
+                reply_markup=TECLADO_PRINCIPAL
             )
             return ConversationHandler.END
 
@@ -3914,10 +4069,11 @@ async def processar_edicao_template_db(update, context, novo_conteudo):
             return TEMPLATE_EDIT_CONTENT
 
         # Atualizar template no banco de dados
-        from database import DatabaseManager
-        db = DatabaseManager()
+        db = get_db()
 
-        sucesso = db.atualizar_template(template_id, conteudo=novo_conteudo)
+        sucesso = await db_call(db.atualizar_template, template_id,
+                                conteudo=novo_conteudo)
+        invalidar_cache_templates()
 
         if sucesso:
             # Contar variáveis no novo conteúdo
@@ -3966,7 +4122,7 @@ async def processar_edicao_template_db(update, context, novo_conteudo):
         logger.error(f"Erro ao processar edição de template DB: {e}")
         await update.message.reply_text(
             "❌ Erro interno. Tente novamente.",
-            reply_markup=criar_teclado_principal()
+            reply_markup=TECLADO_PRINCIPAL
         )
         return ConversationHandler.END
 
@@ -3979,22 +4135,21 @@ async def comando_editar_template_por_id(update, context):
                 "Uso: `/template_editar_id <ID>`\n"
                 "Exemplo: `/template_editar_id 1`",
                 parse_mode='Markdown',
-                reply_markup=criar_teclado_principal()
+                reply_markup=TECLADO_PRINCIPAL
             )
             return
 
         template_id = int(context.args[0])
 
-        from database import DatabaseManager
-        db = DatabaseManager()
-        template_data = db.buscar_template_por_id(template_id)
+        db = get_db()
+        template_data = await db_call(db.buscar_template_por_id, template_id)
 
         if not template_data:
             await update.message.reply_text(
                 "❌ **TEMPLATE NÃO ENCONTRADO**\n\n"
                 f"Não existe template com ID {template_id}.",
                 parse_mode='Markdown',
-                reply_markup=criar_teclado_principal()
+                reply_markup=TECLADO_PRINCIPAL
             )
             return
 
@@ -4030,48 +4185,32 @@ async def comando_editar_template_por_id(update, context):
             "❌ **ID INVÁLIDO**\n\n"
             "O ID deve ser um número.",
             parse_mode='Markdown',
-            reply_markup=criar_teclado_principal()
+            reply_markup=TECLADO_PRINCIPAL
         )
     except Exception as e:
         logger.error(f"Erro ao editar template por ID: {e}")
         await update.message.reply_text(
             "❌ Erro ao processar comando!",
-            reply_markup=criar_teclado_principal()
+            reply_markup=TECLADO_PRINCIPAL
         )
 
 def inicializar_templates_padrao():
     """Inicializa templates padrão no banco de dados se não existirem"""
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
-
-        templates_padrao_db = {
-            'boas_vindas': {
-                'conteudo': 'Olá {nome}! 👋\n\nSeja bem-vindo ao nosso serviço!\n\n📦 Seu pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nQualquer dúvida, estamos aqui para ajudar!',
-                'tipo': 'sistema'
-            },
-            'cobranca': {
-                'conteudo': '⚠️ ATENÇÃO {nome}!\n\nSeu plano vence em breve:\n\n📦 Pacote: {pacote}\n💰 Valor: R$ {valor}\n📅 Vencimento: {vencimento}\n\nRenove agora para não perder o acesso!',
-                'tipo': 'sistema'
-            },
-            'vencido': {
-                'conteudo': '🔴 PLANO VENCIDO - {nome}\n\nSeu plano venceu em {vencimento}.\n\n📦 Pacote: {pacote}\n💰 Valor para renovação: R$ {valor}\n\nRenove urgentemente para reativar o serviço!',
-                'tipo': 'sistema'
-            }
-        }
+        db = get_db()
 
         # Verificar quais templates já existem
         templates_existentes = db.listar_templates(apenas_ativos=False)
-        nomes_existentes = [t['nome'].lower() for t in templates_existentes]
+        nomes_existentes = {t['nome'].lower() for t in templates_existentes}
 
         templates_criados = 0
-        for nome, dados in templates_padrao_db.items():
+        for nome, dados in _TEMPLATES_PADRAO.items():
             if nome not in nomes_existentes:
                 try:
                     template_id = db.adicionar_template(
                         nome=nome,
                         conteudo=dados['conteudo'],
-                        tipo=dados['tipo']
+                        tipo='sistema'
                     )
                     logger.info(f"Template padrão criado: {nome} (ID: {template_id})")
                     templates_criados += 1
@@ -4087,8 +4226,31 @@ def inicializar_templates_padrao():
         logger.error(f"Erro ao inicializar templates padrão: {e}")
 
 
+async def _iniciar_servicos(application):
+    """Sobe a gravação de logs e o serviço de WhatsApp junto com o bot"""
+    _LOG_BUFFER.iniciar()
+    try:
+        await get_ws()
+        print("✅ WhatsApp Service OK")
+    except Exception as e:
+        print(f"⚠️ WhatsApp: {e}")
+
+
+async def _encerrar(application):
+    """Grava os logs pendentes e fecha a sessão do WhatsApp"""
+    await _LOG_BUFFER.flush()
+    close = getattr(_WS, 'close', None)
+    if close is not None:
+        await close()
+
+
 def main():
     """Função principal"""
+    # fromisoformat com sufixo "Z" (histórico) e outras APIs exigem 3.11+
+    if sys.version_info < (3, 11):
+        print("❌ Python 3.11 ou superior é necessário!")
+        sys.exit(1)
+
     # Verificar variáveis essenciais
     token = os.getenv('TELEGRAM_BOT_TOKEN')
     admin_id = os.getenv('ADMIN_CHAT_ID')
@@ -4105,8 +4267,7 @@ def main():
 
     # Testar componentes principais
     try:
-        from database import DatabaseManager
-        db = DatabaseManager()
+        get_db()
         print("✅ Banco de dados OK")
         
         # Inicializar agendador automático
@@ -4123,15 +4284,35 @@ def main():
     except Exception as e:
         print(f"⚠️ Database: {e}")
 
+    # Usar o event loop do uvloop quando disponível (não existe no Windows)
     try:
-        from whatsapp_hybrid_service import WhatsAppHybridService
-        ws = WhatsAppHybridService()
-        print("✅ WhatsApp Service OK")
-    except Exception as e:
-        print(f"⚠️ WhatsApp: {e}")
+        import uvloop
+        uvloop.install()
+        print("✅ uvloop ativado")
+    except ImportError:
+        pass
 
-    # Criar e configurar aplicação
-    app = Application.builder().token(token).build()
+    # Criar e configurar aplicação (pool HTTP/2 reaproveitado entre envios;
+    # o getUpdates tem conexão própria para não ocupar o pool das respostas)
+    app = (Application.builder()
+           .token(token)
+           .request(HTTPXRequest(connection_pool_size=256,
+                                 http_version="2",
+                                 read_timeout=20,
+                                 connect_timeout=10,
+                                 pool_timeout=1))
+           .get_updates_request(HTTPXRequest(http_version="2",
+                                             read_timeout=20,
+                                             connect_timeout=10))
+           # Limites do Telegram: 30 msg/s no total e 20 msg/min por grupo
+           .rate_limiter(AIORateLimiter(overall_max_rate=30,
+                                        overall_time_period=1,
+                                        group_max_rate=20,
+                                        group_time_period=60,
+                                        max_retries=3))
+           .post_init(_iniciar_servicos)
+           .post_shutdown(_encerrar)
+           .build())
 
     # ConversationHandler para cadastro escalonável
     cadastro_handler = ConversationHandler(
@@ -4196,6 +4377,7 @@ def main():
         ],
         states={},
         fallbacks=[
+            CallbackQueryHandler(config_callback, pattern="^config_cancel$"),
             CommandHandler("cancel", lambda u, c: ConversationHandler.END)
         ])
 
@@ -4229,8 +4411,8 @@ def main():
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("add", add_cliente))
     app.add_handler(CommandHandler("listar", listar_clientes))
-    app.add_handler(CommandHandler("relatorio", relatorio))
-    app.add_handler(CommandHandler("buscar", buscar_cliente))
+    app.add_handler(CommandHandler("relatorio", relatorio, block=False))
+    app.add_handler(CommandHandler("buscar", buscar_cliente, block=False))
     app.add_handler(CommandHandler("editar", editar_cliente_cmd))
     app.add_handler(CommandHandler("config", configuracoes_cmd))
     app.add_handler(CommandHandler("help", help_cmd))
@@ -4262,20 +4444,26 @@ def main():
     # Handler para callbacks dos botões inline - ordem importante!
     app.add_handler(CallbackQueryHandler(callback_templates_handler, pattern="^(template_|voltar_templates)"), group=0)
     app.add_handler(CallbackQueryHandler(callback_cliente), group=1)
-    app.add_handler(CallbackQueryHandler(config_callback), group=1)
+    # Grupo próprio: no grupo 1 o callback_cliente (sem pattern) pega tudo
+    app.add_handler(CallbackQueryHandler(config_callback,
+                                         pattern=_PADRAO_CONFIG_CALLBACK,
+                                         block=False),
+                    group=2)
 
     # Handler para os botões do teclado personalizado (prioridade mais baixa)
     # Criar um filtro específico para botões conhecidos
     botoes_filter = filters.Regex(
-        "^(👥 Listar Clientes|➕ Adicionar Cliente|📊 Relatórios|🔍 Buscar Cliente|🏢 Empresa|💳 PIX|📞 Suporte|📱 WhatsApp Status|🧪 Testar WhatsApp|📱 QR Code|⚙️ Gerenciar WhatsApp|📄 Templates|⏰ Agendador|📋 Fila de Mensagens|📜 Logs de Envios|❓ Ajuda)$"
-    )
-    app.add_handler(MessageHandler(botoes_filter, lidar_com_botoes), group=2)
+        "^(" + "|".join(map(re.escape, BOTOES_MENU)) + ")$")
+    app.add_handler(MessageHandler(botoes_filter, lidar_com_botoes,
+                                   block=False),
+                    group=2)
 
     # Adicionar handler de erro global
     async def error_handler(update, context):
         """Handler global de erros"""
         try:
-            logger.error(f"Erro não tratado: {context.error}")
+            logger.error(f"Erro não tratado: {context.error}",
+                         exc_info=context.error)
             logger.error(f"Update: {update}")
 
             if update and update.effective_chat:
@@ -4283,7 +4471,7 @@ def main():
                     await context.bot.send_message(
                         chat_id=update.effective_chat.id,
                         text="❌ Ocorreu um erro interno. Tente novamente em alguns segundos.",
-                        reply_markup=criar_teclado_principal()
+                        reply_markup=TECLADO_PRINCIPAL
                     )
                 except:
                     pass  # Evitar loops de erro
@@ -4308,9 +4496,21 @@ def main():
 
     print("🤖 Bot online e funcionando!")
 
-    # Executar o bot
+    # Executar o bot: webhook quando WEBHOOK_URL estiver configurada,
+    # senão long polling
+    webhook_url = os.getenv('WEBHOOK_URL')
     try:
-        app.run_polling(drop_pending_updates=True)
+        if webhook_url:
+            url_path = os.getenv('WEBHOOK_PATH', 'webhook')
+            print(f"🌐 Recebendo updates via webhook: {webhook_url}")
+            app.run_webhook(listen="0.0.0.0",
+                            port=int(os.getenv('PORT', '8443')),
+                            url_path=url_path,
+                            webhook_url=f"{webhook_url.rstrip('/')}/{url_path}",
+                            secret_token=os.getenv('WEBHOOK_SECRET'),
+                            drop_pending_updates=True)
+        else:
+            app.run_polling(drop_pending_updates=True)
     except KeyboardInterrupt:
         print("\n👋 Bot encerrado pelo usuário")
     except Exception as e: